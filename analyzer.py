@@ -0,0 +1,318 @@
+"""
+analyzer.py
+Analyses that don't block the caller, for programs built around an
+event loop.  Analyzer.submit starts a BetStrategy analysis of a game
+state and returns at once with an Analysis, a future for it: the
+simulation runs in chunks on the Analyzer's worker pool, and the
+Analysis can be waited on, given callbacks, cancelled, or started
+with a timeout.
+
+All the analyses submitted to one Analyzer share its pool.  Each
+keeps at most inflight chunks queued in it at a time and queues the
+next one only when one of its own finishes, so the pool's queue
+interleaves concurrent analyses chunk by chunk: a long multiway
+analysis delays another by at most a chunk per worker, and a
+cancelled or timed out one stops after the chunks it already
+queued.
+
+Chunks finish in the pool's result thread, which only counts them
+and queues the next; callbacks (add_done_callback) run there too,
+or in the caller's thread if the analysis is already done, so an
+event loop should hand them over to its own thread (e.g. asyncio's
+loop.call_soon_threadsafe).  This is Python 2 code, so there is no
+asyncio here, only what an event loop needs to wrap.
+"""
+import threading
+import multiprocessing
+import gamestate
+from strategy import simulate_chunk, TARGET_CHUNKSIZE
+
+
+class Cancelled(Exception):
+    """
+    Raised by Analysis.result for a cancelled analysis.
+    """
+    pass
+
+
+class TimedOut(Cancelled):
+    """
+    Raised by Analysis.result for an analysis that ran out of time.
+    """
+    pass
+
+
+def _enumerate(state):
+    return state.enumerate_outcomes()
+
+
+def _estimate(task):
+    estimator, state, games, seed = task
+    return estimator(state, games, gamestate.numpy.random.RandomState(seed))
+
+
+def _call(task):
+    """
+    Runs function(argument) for task = (function, argument) in a
+    worker and returns (1, result), or (0, exception) if it raised:
+    Pool.apply_async has no error callback.
+    """
+    function, argument = task
+    try:
+        return 1, function(argument)
+    except Exception, error:
+        return 0, error
+
+
+class Analysis:
+    """
+    A running or finished analysis of gamestate (see the module
+    doc).  Once done, result() returns strategy, a copy of the
+    strategy it was submitted with holding the outcome in its
+    equity, interval, games, variance, enumerated and
+    recommended_bet.  Only the simulation runs in the pool (cache,
+    preflop table and exact and estimator runs as for
+    analyze_gamestate; an estimator given as a function must be
+    defined at module level so that it can be pickled).
+
+    While it runs, wins and games count the simulated games (won
+    or tied, and played) in the chunks finished so far.
+    """
+    def __init__(self, analyzer, strategy, gamestate):
+        self.strategy = strategy.copy()
+        self.gamestate = gamestate
+        self._analyzer = analyzer
+        self._lock = analyzer._lock
+        self._done = threading.Event()
+        self._callbacks = []
+        self._error = None
+        self._timer = None
+        self._tasks = []
+        self._queued = 0
+        self._counted = 0
+        self._results = {}
+        self.wins = self.games = 0
+
+    def done(self):
+        """
+        Returns 1 if the analysis has finished, failed or been
+        cancelled.
+        """
+        return int(self._done.is_set())
+
+    def cancelled(self):
+        """
+        Returns 1 if the analysis was cancelled or timed out.
+        """
+        return int(isinstance(self._error, Cancelled))
+
+    def cancel(self):
+        """
+        Stops the analysis, if it is still running, and returns 1 if
+        it was.  Chunks already queued still run, unused.
+        """
+        return self._finish(Cancelled("analysis cancelled"))
+
+    def result(self, timeout=None):
+        """
+        Waits for the analysis (at most timeout seconds, which
+        raises TimedOut without stopping it) and returns its
+        strategy, or raises what stopped it.
+        """
+        if not self._done.wait(timeout):
+            raise TimedOut("analysis still running after %s seconds" %
+                           timeout)
+        if self._error is not None:
+            raise self._error
+        return self.strategy
+
+    def add_done_callback(self, function):
+        """
+        Calls function(analysis) when the analysis is done, or now
+        if it is.
+        """
+        self._lock.acquire()
+        try:
+            if not self._done.is_set():
+                self._callbacks.append(function)
+                return
+        finally:
+            self._lock.release()
+        function(self)
+
+    def _start(self, timeout):
+        strategy = self.strategy
+        gs = self.gamestate
+        if timeout is not None:
+            self._timer = threading.Timer(timeout, self._finish, [TimedOut(
+                "analysis took over %s seconds" % timeout)])
+            self._timer.daemon = True
+            self._timer.start()
+        if strategy.cache is not None:
+            self._lock.acquire()
+            try:
+                cached = strategy.cache.get(strategy.cache_key(gs))
+            finally:
+                self._lock.release()
+            if cached is not None:
+                (strategy.equity, strategy.interval, strategy.games,
+                 strategy.enumerated, strategy.variance) = cached
+                return self._finish()
+        if strategy.lookup_preflop(gs):
+            return self._finish()
+        strategy.enumerated = strategy.use_exact(strategy.accuracy, gs)
+        if strategy.enumerated:
+            self._tasks = [(_enumerate, gs)]
+        elif strategy.estimator is not None:
+            self._tasks = [(_estimate, (strategy.estimator, gs,
+                                        strategy.accuracy, strategy.seed))]
+        else:
+            self._tasks = [(simulate_chunk, task) for task in
+                           strategy.chunk_tasks(strategy.accuracy, gs,
+                                                 self._analyzer.chunksize)]
+        self._lock.acquire()
+        try:
+            self._queue(self._analyzer.inflight)
+        finally:
+            self._lock.release()
+
+    def _queue(self, count):
+        """
+        Queues up to count more of self._tasks in the pool.  Called
+        holding the lock.
+        """
+        while count > 0 and self._queued < len(self._tasks):
+            self._analyzer._apply(self._tasks[self._queued],
+                                  self._task_done, self._queued)
+            self._queued += 1
+            count -= 1
+
+    def _task_done(self, number, outcome):
+        ok, result = outcome
+        self._lock.acquire()
+        try:
+            if self._done.is_set():
+                return
+            if not ok:
+                error = result
+            else:
+                error = None
+                self._results[number] = result
+                self._count()
+            if error is None and self._counted < len(self._tasks):
+                self._queue(1)
+                return
+        finally:
+            self._lock.release()
+        self._finish(error)
+
+    def _count(self):
+        """
+        Adds in the results of the chunks finished in order, and
+        sets the strategy's outcome once the last (or, with a
+        target, the one that reaches it) is in.  Called holding the
+        lock.
+        """
+        strategy = self.strategy
+        while self._counted in self._results:
+            result = self._results.pop(self._counted)
+            self._counted += 1
+            if strategy.enumerated:
+                wins, ties, runouts = result
+                strategy.set_enumerated(wins + ties, runouts)
+            elif strategy.estimator is not None:
+                strategy.set_estimated(*result)
+            else:
+                self.wins += result[0] + result[1]
+                self.games += self._tasks[self._counted - 1][1][1]
+                strategy.set_simulated(self.wins, self.games)
+                if strategy.target is not None:
+                    low, high = strategy.interval
+                    if (high - low) / 2 <= strategy.target:
+                        self._counted = len(self._tasks)
+
+    def _finish(self, error=None):
+        """
+        Ends the analysis, with error if not None, and runs the
+        callbacks.  Returns 0 if it had already ended.
+        """
+        strategy = self.strategy
+        self._lock.acquire()
+        try:
+            if self._done.is_set():
+                return 0
+            self._error = error
+            if error is None:
+                strategy.recommended_bet = strategy.equity * self.gamestate.pot
+                if strategy.cache is not None:
+                    strategy.cache.put(strategy.cache_key(self.gamestate),
+                                       strategy.cache_entry())
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+            self._analyzer._running.discard(self)
+        finally:
+            self._lock.release()
+        if self._timer is not None:
+            self._timer.cancel()
+        for function in callbacks:
+            function(self)
+        return 1
+
+
+class Analyzer:
+    """
+    Runs Analyses on a pool of workers processes (by default one
+    per CPU), started on first use.  Each analysis simulates in
+    chunks of chunksize games and keeps at most inflight of them
+    (by default workers) queued in the pool.
+    """
+    def __init__(self, workers=None, chunksize=TARGET_CHUNKSIZE,
+                 inflight=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self.inflight = inflight or self.workers
+        self._pool = None
+        self._lock = threading.RLock()
+        self._running = set()
+
+    def submit(self, strategy, gamestate, timeout=None):
+        """
+        Starts analyzing gamestate with the settings of strategy (a
+        BetStrategy, which is copied, not changed; its store isn't
+        used) and returns the Analysis.  After timeout seconds an
+        unfinished analysis stops with TimedOut.
+        """
+        analysis = Analysis(self, strategy, gamestate)
+        self._lock.acquire()
+        try:
+            self._running.add(analysis)
+        finally:
+            self._lock.release()
+        try:
+            analysis._start(timeout)
+        except Exception, error:
+            analysis._finish(error)
+        return analysis
+
+    def _apply(self, task, callback, number):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+        self._pool.apply_async(_call, (task,),
+                               callback=lambda result: callback(number,
+                                                                result))
+
+    def close(self):
+        """
+        Cancels the running analyses and shuts down the pool.
+        """
+        self._lock.acquire()
+        try:
+            running = list(self._running)
+        finally:
+            self._lock.release()
+        for analysis in running:
+            analysis.cancel()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
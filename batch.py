@@ -0,0 +1,266 @@
+"""
+batch.py
+Evaluates streams of game states, for bulk work such as hand
+history analysis.  Input and output are streamed: records are read,
+evaluated and written a window at a time, so memory use doesn't
+grow with the size of the input.
+
+Two record formats are read and written:
+
+- JSONL, one object per line:
+
+      {"pcards": ["12h", "11h"], "opponents": 2, "board": ["2c"],
+       "pot": 100, "minbet": 1, "ranges": [null, "JJ+, AK"],
+       "id": "anything"}
+
+  board, ranges and id are optional; id is copied to the result.
+  Results are lines of {"id", "equity", "low", "high", "games",
+  "bet"} (the interval is the strategy's, bet its recommended bet).
+
+- binary: a header (BINARY_MAGIC, version) then fixed size records
+  of the hole and board card indexes (255 for no card), opponents,
+  pot and minbet (see _STATE).  Ranges can't be given.  Results are
+  a header (RESULT_MAGIC, version) and records of equity, low,
+  high, games and bet (see _RESULT).
+
+Every game state goes through one BetStrategy (with its cache,
+store and preflop table) or, with workers > 1, through one per
+worker process, each handling whole game states.
+"""
+import sys
+import json
+import struct
+import argparse
+import multiprocessing
+from itertools import islice
+from handrank import Card, CARDS
+from gamestate import GameState
+from strategy import BetStrategy
+from equitycache import EquityCache
+from resultstore import ResultStore
+
+BINARY_MAGIC = "PKGS"
+RESULT_MAGIC = "PKEQ"
+_VERSION = 1
+_HEADER = struct.Struct("<4sH")
+_STATE = struct.Struct("<2B5BBdd")
+_RESULT = struct.Struct("<fffId")
+_NOCARD = 255
+# Game states read ahead and evaluated together (across the
+# workers, if there are several).
+WINDOW = 1024
+
+
+def parse_record(record):
+    """
+    Returns (id, GameState) for a decoded JSON game state record.
+    Raises an Exception if the record repeats a card.
+    """
+    pcards = [Card(str(card)) for card in record["pcards"]]
+    board = [Card(str(card)) for card in record.get("board", [])]
+    if len(set(pcards + board)) < len(pcards + board):
+        raise Exception, "game state repeats a card"
+    gs = GameState(pcards, int(record["opponents"]), board,
+                   float(record["pot"]), float(record["minbet"]),
+                   record.get("ranges"))
+    return record.get("id"), gs
+
+
+def result_record(name, result):
+    """
+    Returns the JSON result record for id name and a strategy
+    result (see evaluate).
+    """
+    equity, low, high, games, bet = result
+    return {"id": name, "equity": equity, "low": low, "high": high,
+            "games": games, "bet": bet}
+
+
+def read_jsonl(stream):
+    """
+    Yields (id, GameState) for each non-blank line of a JSONL
+    stream.
+    """
+    for line in stream:
+        if line.strip():
+            yield parse_record(json.loads(line))
+
+
+def write_jsonl(stream, results):
+    """
+    Writes (id, strategy result) pairs (see evaluate) as JSONL.
+    """
+    for name, result in results:
+        stream.write(json.dumps(result_record(name, result)) + "\n")
+
+
+def read_binary(stream):
+    """
+    Yields (id, GameState) for each record of a binary game state
+    stream, id being the record's number.
+    """
+    magic, version = _HEADER.unpack(stream.read(_HEADER.size))
+    if magic != BINARY_MAGIC or version != _VERSION:
+        raise Exception, "not a binary game state stream"
+    number = 0
+    while True:
+        data = stream.read(_STATE.size)
+        if not data:
+            return
+        if len(data) < _STATE.size:
+            raise Exception, "truncated game state record %d" % number
+        fields = _STATE.unpack(data)
+        pcards = [CARDS[index] for index in fields[:2]]
+        board = [CARDS[index] for index in fields[2:7] if index != _NOCARD]
+        yield number, GameState(pcards, fields[7], board, fields[8],
+                                fields[9])
+        number += 1
+
+
+def write_binary(stream, gamestates):
+    """
+    Writes game states (without ranges) as a binary game state
+    stream.
+    """
+    stream.write(_HEADER.pack(BINARY_MAGIC, _VERSION))
+    for gs in gamestates:
+        if gs.ranges:
+            raise Exception, "binary records can't hold ranges"
+        board = [card.index for card in gs.board]
+        board += [_NOCARD] * (5 - len(board))
+        stream.write(_STATE.pack(*([card.index for card in gs.pcards] +
+                                   board + [gs.opponents, gs.pot,
+                                            gs.minbet])))
+
+
+def write_binary_results(stream, results):
+    """
+    Writes (id, strategy result) pairs as a binary result stream
+    (ids are implied by the order).
+    """
+    stream.write(_HEADER.pack(RESULT_MAGIC, _VERSION))
+    for name, result in results:
+        stream.write(_RESULT.pack(*result))
+
+
+def read_binary_results(stream):
+    """
+    Yields the (equity, low, high, games, bet) of each record of a
+    binary result stream.
+    """
+    magic, version = _HEADER.unpack(stream.read(_HEADER.size))
+    if magic != RESULT_MAGIC or version != _VERSION:
+        raise Exception, "not a binary result stream"
+    while True:
+        data = stream.read(_RESULT.size)
+        if len(data) < _RESULT.size:
+            return
+        yield _RESULT.unpack(data)
+
+
+def _result(strategy, gs):
+    """
+    Analyzes gs and returns (equity, low, high, games, bet).
+    """
+    strategy.analyze_gamestate(gs)
+    low, high = strategy.interval
+    return (strategy.equity, low, high, strategy.games,
+            strategy.recommended_bet)
+
+
+_worker_strategy = None
+
+
+def _start_worker(settings):
+    global _worker_strategy
+    _worker_strategy = make_strategy(settings)
+
+
+def _evaluate_in_worker(gs):
+    return _result(_worker_strategy, gs)
+
+
+def make_strategy(settings):
+    """
+    Returns the BetStrategy for a dict of BetStrategy keyword
+    arguments, with an EquityCache unless one is given.  A
+    store_path setting opens a ResultStore on that file.
+    """
+    settings = dict(settings)
+    settings.setdefault("cache", EquityCache())
+    path = settings.pop("store_path", None)
+    if path is not None:
+        settings["store"] = ResultStore(path)
+    return BetStrategy(**settings)
+
+
+def evaluate(records, workers=1, window=WINDOW, **settings):
+    """
+    Takes an iterable of (id, GameState) and yields (id, (equity,
+    low, high, games, bet)) for each, in order.  settings are
+    BetStrategy keyword arguments (by default with an EquityCache
+    shared by all the game states, per worker process), plus
+    store_path, the file of a ResultStore each process opens; with
+    workers > 1 game states are spread over that many processes.
+    At most window records are read ahead of the results yielded.
+    """
+    pool = strategy = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, _start_worker, (settings,))
+    else:
+        strategy = make_strategy(settings)
+    try:
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, window))
+            if not chunk:
+                return
+            states = [gs for name, gs in chunk]
+            if pool is not None:
+                results = pool.map(_evaluate_in_worker, states,
+                                   max(1, len(states) // (4 * workers)))
+            else:
+                results = [_result(strategy, gs) for gs in states]
+            for (name, gs), result in zip(chunk, results):
+                yield name, result
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if strategy is not None:
+            strategy.close()
+            if strategy.store is not None:
+                strategy.store.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Evaluate a stream of "
+                                     "game states.")
+    parser.add_argument("input", help="JSONL or binary game states, - "
+                        "for stdin")
+    parser.add_argument("output", help="results, - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "binary"],
+                        default="jsonl")
+    parser.add_argument("--accuracy", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--store")
+    parser.add_argument("--estimator")
+    args = parser.parse_args(argv)
+    mode = "rb" if args.format == "binary" else "r"
+    source = sys.stdin if args.input == "-" else open(args.input, mode)
+    out = sys.stdout if args.output == "-" else open(args.output,
+                                                     mode.replace("r", "w"))
+    settings = dict(accuracy=args.accuracy, seed=args.seed,
+                    estimator=args.estimator, store_path=args.store)
+    if args.format == "binary":
+        results = evaluate(read_binary(source), args.workers, **settings)
+        write_binary_results(out, results)
+    else:
+        results = evaluate(read_jsonl(source), args.workers, **settings)
+        write_jsonl(out, results)
+    out.flush()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
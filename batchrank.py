@@ -0,0 +1,247 @@
+"""
+batchrank.py
+Vectorized hand evaluation with NumPy.  evaluate takes an (N, k)
+integer array of card indexes (Card.index, 5 <= k <= 7) and
+returns an (N,) array of strengths, identical to what
+evaluator.evaluate gives for each row, without a Python loop over
+the hands.
+
+The tables are the ones evaluator.py builds, laid out as arrays:
+the rank multiset keys go in an open addressing hash table
+(multiplicative hash, linear probing, load factor about 0.15) that
+is probed for all rows at once, and the flush table is indexed
+directly by the rank mask of the flush suit.  They are loaded the
+first time evaluate is called, from TABLE_PATH: the first process
+to need them builds them (about a second) and writes them there,
+and every later one memory maps the file, which costs next to
+nothing until the pages are touched.  The file's header carries
+a digest of evaluator.py's source, so tables written by another
+version of the evaluator are rebuilt rather than used.  If the
+file can't be written, each process builds its own.
+
+NumPy is only needed by this module (and what uses it), not by
+handrank or evaluator.
+"""
+import os
+import mmap
+import struct
+import hashlib
+import numpy
+import evaluator
+
+_SUITBITS = 16
+_CARDKEYS = numpy.array([(5 ** (index // 4) << _SUITBITS) |
+                         (1 << (4 * (index % 4))) for index in range(52)],
+                        dtype=numpy.int64)
+_RANKBITS = numpy.array([1 << (index // 4) for index in range(52)],
+                        dtype=numpy.int32)
+_HASHBITS = 19
+_HASHMULT = 0x9E3779B97F4A7C15
+_KEYS = None
+_VALUES = None
+_FLUSHES = None
+_FLUSHSUIT = None
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "batchrank.bin")
+_MAGIC = "PKBR"
+_VERSION = 2
+_HEADER = struct.Struct("<4sHH20s")
+# dtype and length of each table in the file, in the order of
+# load_tables' globals.
+_LAYOUT = [("<i8", 1 << _HASHBITS), ("<i4", 1 << _HASHBITS),
+           ("<i4", 1 << 13), ("<i1", 1 << _SUITBITS)]
+
+
+def evaluator_digest():
+    """
+    Returns the SHA-1 digest of evaluator.py's source (of its
+    compiled file if the source isn't there), which the tables
+    are built from.
+    """
+    path = evaluator.__file__
+    if path.endswith((".pyc", ".pyo")) and os.path.exists(path[:-1]):
+        path = path[:-1]
+    source = open(path, "rb")
+    try:
+        return hashlib.sha1(source.read()).digest()
+    finally:
+        source.close()
+
+
+def build_tables():
+    """
+    Returns the arrays (keys, values, flushes, flushsuit) built
+    from evaluator's tables.
+    """
+    ranks, flushes = evaluator.tables()
+    size = 1 << _HASHBITS
+    keys = [-1] * size
+    values = [0] * size
+    for key, strength in ranks.iteritems():
+        slot = ((key * _HASHMULT) & 0xFFFFFFFFFFFFFFFF) >> (64 - _HASHBITS)
+        while keys[slot] != -1:
+            slot = (slot + 1) & (size - 1)
+        keys[slot] = key
+        values[slot] = strength
+    return [numpy.array(table, dtype=dtype) for table, (dtype, length) in
+            zip([keys, values, flushes, evaluator.suit_table()], _LAYOUT)]
+
+
+def write_tables(path, tables):
+    """
+    Writes the arrays build_tables returns to a table file.  The
+    file is written next to path and renamed over it, so readers
+    never see a partial table.
+    """
+    partial = "%s.%d.partial" % (path, os.getpid())
+    out = open(partial, "wb")
+    out.write(_HEADER.pack(_MAGIC, _VERSION, _HASHBITS, evaluator_digest()))
+    for table, (dtype, length) in zip(tables, _LAYOUT):
+        out.write(numpy.asarray(table, dtype=dtype).tostring())
+    out.close()
+    os.rename(partial, path)
+
+
+def map_tables(path):
+    """
+    Returns the arrays of the table file at path, read only and
+    memory mapped, or None if there is no such file or it isn't a
+    complete table file of this version, built from this
+    evaluator.
+    """
+    size = _HEADER.size + sum([numpy.dtype(dtype).itemsize * length
+                               for dtype, length in _LAYOUT])
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        return None
+    table = open(path, "rb")
+    try:
+        data = mmap.mmap(table.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        table.close()
+    if (_HEADER.unpack_from(data) !=
+        (_MAGIC, _VERSION, _HASHBITS, evaluator_digest())):
+        data.close()
+        return None
+    tables = []
+    offset = _HEADER.size
+    for dtype, length in _LAYOUT:
+        tables.append(numpy.frombuffer(data, dtype, length, offset))
+        offset += numpy.dtype(dtype).itemsize * length
+    return tables
+
+
+def load_tables():
+    """
+    Loads the tables evaluate uses: maps the table file at
+    TABLE_PATH, or builds them and (if it can) writes the file.
+    Returns the arrays.
+    """
+    global _KEYS, _VALUES, _FLUSHES, _FLUSHSUIT
+    tables = map_tables(TABLE_PATH)
+    if tables is None:
+        tables = build_tables()
+        try:
+            write_tables(TABLE_PATH, tables)
+        except (IOError, OSError):
+            pass
+    _KEYS, _VALUES, _FLUSHES, _FLUSHSUIT = tables
+    return tables
+
+
+def _lookup(keys):
+    """
+    Returns the rank table strengths for an array of rank
+    multiset keys, probing the hash table for all of them at once
+    and then again for the (few) rows that collided.
+    """
+    hashed = keys.astype(numpy.uint64) * numpy.uint64(_HASHMULT)
+    slots = (hashed >> numpy.uint64(64 - _HASHBITS)).astype(numpy.intp)
+    missed = numpy.nonzero(_KEYS[slots] != keys)[0]
+    while len(missed):
+        slots[missed] = (slots[missed] + 1) & ((1 << _HASHBITS) - 1)
+        missed = missed[_KEYS[slots[missed]] != keys[missed]]
+    return _VALUES[slots]
+
+
+def _strengths(keys, parts):
+    """
+    Takes the summed card keys of N hands and a list of arrays
+    whose columns together are the hands' cards, and returns the
+    hands' strengths.  Suit masks are only built for the rows
+    whose suit counters show a flush.
+    """
+    strengths = _lookup(keys >> _SUITBITS)
+    suits = _FLUSHSUIT[keys & 65535]
+    rows = numpy.nonzero(suits >= 0)[0]
+    if len(rows):
+        cards = numpy.hstack([part[rows] for part in parts])
+        insuit = (cards & 3) == suits[rows, None]
+        masks = numpy.where(insuit, _RANKBITS[cards], 0).sum(axis=1)
+        strengths[rows] = numpy.maximum(strengths[rows], _FLUSHES[masks])
+    return strengths
+
+
+def _checked(cards, columns):
+    cards = numpy.asarray(cards, dtype=numpy.intp)
+    if cards.ndim != 2 or cards.shape[1] not in columns:
+        raise ValueError("cards must be an (N, k) array with k in " +
+                         str(list(columns)))
+    return cards
+
+
+def evaluate(cards):
+    """
+    Takes an (N, k) array-like of card indexes, 5 <= k <= 7, no
+    card repeated within a row, and returns an (N,) int32 array
+    of strengths (see evaluator.py).
+    """
+    if _KEYS is None:
+        load_tables()
+    cards = _checked(cards, range(5, 8))
+    return _strengths(_CARDKEYS[cards].sum(axis=1), [cards])
+
+
+def evaluate_holes(board, holes):
+    """
+    Takes an (N, b) array of board card indexes and a list of
+    (N, h) arrays of hole card indexes, 5 <= b + h <= 7, and
+    returns a list with the (N,) strengths of each hole array
+    played with the board.  The board's share of the work is done
+    once for all of them.
+    """
+    if _KEYS is None:
+        load_tables()
+    board = _checked(board, range(0, 8))
+    boardkeys = _CARDKEYS[board].sum(axis=1)
+    results = []
+    for hole in holes:
+        hole = _checked(hole, range(5 - board.shape[1], 8 - board.shape[1]))
+        keys = boardkeys + _CARDKEYS[hole].sum(axis=1)
+        results.append(_strengths(keys, [board, hole]))
+    return results
+
+
+def evaluate_board(board, holes):
+    """
+    evaluate_holes for a single board shared by every row: takes
+    a list of b board card indexes and an (N, h) array of hole
+    card indexes, 5 <= b + h <= 7, none on the board, and returns
+    the (N,) strengths.  The board's cards are summed once.
+    """
+    if _KEYS is None:
+        load_tables()
+    board = numpy.asarray(board, dtype=numpy.intp)
+    holes = _checked(holes, range(5 - len(board), 8 - len(board)))
+    keys = _CARDKEYS[board].sum() + _CARDKEYS[holes].sum(axis=1)
+    boards = numpy.broadcast_to(board, (len(holes), len(board)))
+    return _strengths(keys, [boards, holes])
+
+
+def from_cards(hands):
+    """
+    Takes a list of equal length lists of Cards and returns the
+    (N, k) array of their indexes, for use with evaluate.
+    """
+    return numpy.array([[card.index for card in cards] for cards in hands],
+                       dtype=numpy.intp).reshape(len(hands), -1)
@@ -0,0 +1,285 @@
+"""
+benchmark.py
+Throughput of the hot paths, so that every optimization is measured:
+
+- handtests.CATEGORY, bithandtests.CATEGORY: ranking a seven card
+  hand of each category through the test stack (ALLTESTS, or
+  BitHandTests' tests), in hands/s.
+- hand.cmp: Hand.__cmp__ on unranked hands (table evaluator),
+  ranking.lazy and ranking.lazy_bit: the same with Hand.lazy (tests
+  run only as far as the comparison needs), ranking.full: both
+  hands ranked by the whole test stack, then compared; in
+  comparisons/s.
+- deck.draw: Deck.draw between mark and rollback, in cards/s.
+- simulate_game.STREET.N, find_probability.STREET.N: scalar
+  GameState.simulate_game and BetStrategy.analyze_gamestate
+  (vectorized, never exact, without the preflop table) from each
+  street against N = 1-9 opponents, in trials/s.
+
+    python benchmark.py [--quick] [--only PREFIX] [--save FILE]
+                        [--compare FILE] [--threshold FRACTION]
+
+Each rate is the best of REPEATS timed runs, the one least disturbed
+by other load.  --save writes the rates as a JSON baseline; --compare
+reads one and flags every benchmark whose rate fell by more than
+threshold (a fraction of the baseline), exiting with status 1 if any
+did.  --quick runs a fifth of the work, for a rough check.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import evaluator
+from handrank import Card, CARDS, Deck, Hand, ALLTESTS, BitHandTests
+from gamestate import GameState
+from strategy import BetStrategy
+
+REPEATS = 3
+# Fraction of a baseline rate a benchmark may lose before compare
+# flags it.
+THRESHOLD = 0.1
+CATEGORIES = ["highcard", "pair", "twopair", "trips", "straight", "flush",
+              "boat", "quads", "sf", "rsf"]
+STREETS = [("preflop", []), ("flop", ["2c", "7d", "9s"]),
+           ("turn", ["2c", "7d", "9s", "10c"]),
+           ("river", ["2c", "7d", "9s", "10c", "3h"])]
+_VERSION = 1
+
+
+def _template(category, rng):
+    """
+    Returns cards that make the rarer categories likely once
+    filled up to seven at random.
+    """
+    suit = rng.randrange(4)
+    if category == evaluator.RSF:
+        return [Card(rank, suit) for rank in range(8, 13)]
+    if category == evaluator.SF:
+        high = rng.randrange(3, 12)
+        return [Card(rank % 13, suit) for rank in range(high - 4, high + 1)]
+    rank = rng.randrange(13)
+    if category == evaluator.QUADS:
+        return [Card(rank, each) for each in range(4)]
+    if category == evaluator.BOAT:
+        other = (rank + rng.randrange(1, 13)) % 13
+        return [Card(rank, each) for each in range(3)] + [Card(other, 0),
+                                                          Card(other, 1)]
+    if category == evaluator.FLUSH:
+        return [Card(rank, suit) for rank in rng.sample(range(13), 5)]
+    return []
+
+
+def hands_of(category, count, seed=0):
+    """
+    Returns count random seven card lists (of Cards) whose best
+    hand is of the given category (evaluator.HIGHCARD...).
+    """
+    rng = random.Random(seed)
+    hands = []
+    while len(hands) < count:
+        cards = _template(category, rng)
+        rest = [card for card in CARDS if card not in cards]
+        cards = cards + rng.sample(rest, 7 - len(cards))
+        if evaluator.category(evaluator.evaluate_cards(cards)) == category:
+            rng.shuffle(cards)
+            hands.append(cards)
+    return hands
+
+
+def _rank_through(tests, hand):
+    for test in tests:
+        passed, rank, kickers = test(hand)
+        if passed:
+            hand.rank = rank
+            hand.kickers = kickers
+            return
+
+
+def _random_hands(count, seed):
+    rng = random.Random(seed)
+    return [rng.sample(CARDS, 7) for x in range(count)]
+
+
+def _ranking(hands, tests):
+    def run():
+        for cards in hands:
+            _rank_through(tests, Hand(cards))
+    return len(hands), run
+
+
+def _comparing(pairs, lazy=0, testclass=None, tests=None):
+    def run():
+        savedlazy, savedclass = Hand.lazy, Hand.testclass
+        Hand.lazy, Hand.testclass = lazy, testclass
+        try:
+            for first, second in pairs:
+                first, second = Hand(first), Hand(second)
+                if tests is not None:
+                    _rank_through(tests, first)
+                    _rank_through(tests, second)
+                cmp(first, second)
+        finally:
+            Hand.lazy, Hand.testclass = savedlazy, savedclass
+    return len(pairs), run
+
+
+def _drawing(draws):
+    def run():
+        deck = Deck()
+        for x in range(draws // 7):
+            mark = deck.mark()
+            for y in range(7):
+                deck.draw()
+            deck.rollback(mark)
+    return draws // 7 * 7, run
+
+
+def _gamestate(board, opponents):
+    return GameState([Card("12h"), Card("11h")], opponents,
+                     [Card(card) for card in board], 100, 1)
+
+
+def _simulating(board, opponents, trials):
+    def run():
+        gs = _gamestate(board, opponents)
+        for x in range(trials):
+            gs.simulate_game()
+    return trials, run
+
+
+def _finding(board, opponents, trials):
+    def run():
+        strat = BetStrategy(accuracy=trials, vectorized=1, exact=0,
+                            preflop_table=0)
+        strat.analyze_gamestate(_gamestate(board, opponents))
+    return trials, run
+
+
+def benchmarks(scale=1.0):
+    """
+    Returns the list of (name, unit, make) of every benchmark;
+    make() sets one up and returns (count, run), run doing count
+    units of work.  scale multiplies the work.
+    """
+    def scaled(count):
+        return max(1, int(count * scale))
+    result = []
+    bittests = BitHandTests().alltests_inorder
+    for category, name in enumerate(CATEGORIES):
+        hands = hands_of(category, scaled(2000), category)
+        result.append(("handtests." + name, "hands/s",
+                       lambda hands=hands: _ranking(hands, ALLTESTS)))
+        result.append(("bithandtests." + name, "hands/s",
+                       lambda hands=hands: _ranking(hands, bittests)))
+    hands = _random_hands(2 * scaled(5000), 1)
+    pairs = zip(hands[::2], hands[1::2])
+    result += [
+        ("hand.cmp", "comparisons/s", lambda: _comparing(pairs)),
+        ("ranking.lazy", "comparisons/s", lambda: _comparing(pairs, 1)),
+        ("ranking.lazy_bit", "comparisons/s",
+         lambda: _comparing(pairs, 1, BitHandTests)),
+        ("ranking.full", "comparisons/s",
+         lambda: _comparing(pairs, 1, None, ALLTESTS)),
+        ("deck.draw", "cards/s", lambda: _drawing(scaled(100000)))]
+    for street, board in STREETS:
+        for opponents in range(1, 10):
+            suffix = "%s.%d" % (street, opponents)
+            result.append(("simulate_game." + suffix, "trials/s",
+                           lambda board=board, opponents=opponents:
+                           _simulating(board, opponents, scaled(2000))))
+            result.append(("find_probability." + suffix, "trials/s",
+                           lambda board=board, opponents=opponents:
+                           _finding(board, opponents, scaled(50000))))
+    return result
+
+
+def run_benchmarks(only=None, scale=1.0, repeats=REPEATS, out=None):
+    """
+    Runs the benchmarks whose names start with only (all of them
+    by default) and returns {name: {"rate": ..., "unit": ...}},
+    printing a line for each to out if given.
+    """
+    results = {}
+    for name, unit, make in benchmarks(scale):
+        if only is not None and not name.startswith(only):
+            continue
+        best = None
+        for x in range(repeats):
+            count, run = make()
+            start = time.time()
+            run()
+            elapsed = max(time.time() - start, 1e-9)
+            if best is None or elapsed < best:
+                best = elapsed
+        results[name] = {"rate": count / best, "unit": unit}
+        if out is not None:
+            out.write("%-32s %14.0f %s\n" % (name, count / best, unit))
+            out.flush()
+    return results
+
+
+def save(path, results):
+    """
+    Writes results (as run_benchmarks returns them) as a JSON
+    baseline file.
+    """
+    out = open(path, "w")
+    json.dump({"version": _VERSION, "python": sys.version.split()[0],
+               "results": results}, out, indent=1, sort_keys=True)
+    out.close()
+
+
+def load(path):
+    """
+    Returns the results of a JSON baseline file.
+    """
+    baseline = json.load(open(path))
+    if baseline.get("version") != _VERSION:
+        raise Exception, path + " is not a benchmark baseline"
+    return baseline["results"]
+
+
+def compare(baseline, results, threshold=THRESHOLD):
+    """
+    Returns (name, baseline rate, rate, change, regressed) for
+    every benchmark in both, change being the fractional change
+    in rate and regressed 1 if the rate fell by more than
+    threshold.
+    """
+    rows = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old = baseline[name]["rate"]
+        new = results[name]["rate"]
+        change = new / old - 1
+        rows.append((name, old, new, change, int(change < -threshold)))
+    return rows
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths.")
+    parser.add_argument("--only", help="run benchmarks starting with this")
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--save", help="write a JSON baseline")
+    parser.add_argument("--compare", help="compare with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args(argv)
+    results = run_benchmarks(args.only, 0.2 if args.quick else 1.0,
+                             out=sys.stdout)
+    if args.save:
+        save(args.save, results)
+    if args.compare:
+        rows = compare(load(args.compare), results, args.threshold)
+        print
+        for name, old, new, change, regressed in rows:
+            print "%-32s %14.0f %14.0f %+7.1f%%%s" % (
+                name, old, new, 100 * change, "  REGRESSION" if regressed
+                else "")
+        if [row for row in rows if row[4]]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
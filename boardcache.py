@@ -0,0 +1,137 @@
+"""
+boardcache.py
+Per-board strengths of every hole card pair.  Once the five board
+cards are known, a hand's strength depends only on its two hole
+cards, so all 1326 of them can be evaluated in one go and each
+player's showdown value becomes a lookup by combination number
+(see COMBO_INDEX).  BoardCache keeps the arrays of the most
+recently used boards.
+
+Uses batchrank when NumPy is available, evaluator otherwise (the
+strengths are then kept in lists).  NumPy is imported, and the
+combination arrays built, the first time they are needed.
+"""
+from evaluator import evaluate
+from lazyimport import lazy_import
+
+numpy = lazy_import("numpy")
+batchrank = lazy_import("batchrank")
+
+# Every hole card pair (low index first), in combination number order.
+COMBOS = [(first, second) for first in range(52)
+          for second in range(first + 1, 52)]
+# COMBO_INDEX[a][b] is the combination number of cards a and b
+# (in either order), -1 if a == b.
+COMBO_INDEX = [[-1] * 52 for x in range(52)]
+for number, (first, second) in enumerate(COMBOS):
+    COMBO_INDEX[first][second] = COMBO_INDEX[second][first] = number
+_ARRAYS = None
+
+
+def combo_arrays():
+    """
+    Returns COMBOS and COMBO_INDEX as NumPy arrays, plus the array
+    of each pair's two card bits, (COMBOARRAY, COMBO_INDEXARRAY,
+    COMBOBITS), built on the first call.
+    """
+    global _ARRAYS
+    if _ARRAYS is None:
+        combos = numpy.array(COMBOS, dtype=numpy.intp)
+        bits = (numpy.left_shift(1, combos[:, 0].astype(numpy.int64)) |
+                numpy.left_shift(1, combos[:, 1].astype(numpy.int64)))
+        _ARRAYS = (combos, numpy.array(COMBO_INDEX, dtype=numpy.intp), bits)
+    return _ARRAYS
+
+
+class BoardCache:
+    """
+    A least recently used cache of the 1326 hole card strengths of
+    up to maxboards five card boards.  hits, misses and evictions
+    count lookups that found the board, lookups that didn't, and
+    boards dropped to make room.
+
+    A lookup is on the hot path of every scalar trial, so instead
+    of reordering a list on each hit, boards carry the time they
+    were last used and, when the cache is full, the least recently
+    used quarter of them is dropped at once.
+    """
+    def __init__(self, maxboards=4096):
+        self.maxboards = maxboards
+        self.boards = {}
+        self.used = {}
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.boards)
+
+    def strengths(self, board):
+        """
+        Takes five board card indexes and returns, by combination
+        number, the strength of each hole card pair played with
+        them (-1 for pairs holding a board card).
+        """
+        key = tuple(sorted(board))
+        self.clock += 1
+        self.used[key] = self.clock
+        strengths = self.boards.get(key)
+        if strengths is not None:
+            self.hits += 1
+            return strengths
+        self.misses += 1
+        if len(self.boards) >= self.maxboards:
+            self._evict()
+        strengths = self.boards[key] = compute_board_strengths(key)
+        return strengths
+
+    def _evict(self):
+        oldest = sorted(self.boards, key=self.used.get)
+        for key in oldest[:max(1, len(oldest) // 4)]:
+            del self.boards[key]
+            del self.used[key]
+            self.evictions += 1
+
+    def clear(self):
+        self.boards.clear()
+        self.used.clear()
+
+
+def compute_board_strengths(board):
+    """
+    BoardCache.strengths without a cache: scores every hole card
+    pair with the five board card indexes board.
+    """
+    if len(board) != 5:
+        raise Exception, "board strengths need a complete board"
+    if numpy is None:
+        return [evaluate([first, second] + list(board))
+                if first not in board and second not in board else -1
+                for first, second in COMBOS]
+    combos, index, combobits = combo_arrays()
+    strengths = numpy.empty(len(COMBOS), dtype=numpy.int32)
+    strengths.fill(-1)
+    boardbits = 0
+    for card in board:
+        boardbits |= 1 << card
+    free = (combobits & boardbits) == 0
+    strengths[free] = batchrank.evaluate_board(board, combos[free])
+    return strengths
+
+
+_default = BoardCache()
+
+
+def board_strengths(board):
+    """
+    BoardCache.strengths through a cache shared by the process.
+    """
+    return _default.strengths(board)
+
+
+def default_cache():
+    """
+    Returns the BoardCache board_strengths uses.
+    """
+    return _default
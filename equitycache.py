@@ -0,0 +1,127 @@
+"""
+equitycache.py
+Suit-isomorphism canonicalization of game states, and a bounded
+LRU cache for equity results keyed by it.
+
+Suits are interchangeable in holdem, so two game states that differ
+only by a permutation of suits (AhKh on 2c7d9s, AsKs on 2d7c9h) have
+the same equity.  canonical_key maps all of them to one key.
+"""
+import sys
+from collections import OrderedDict
+
+
+def canonical_key(gamestate):
+    """
+    Returns a hashable key for gamestate that is the same for every
+    game state equal to it up to a permutation of suits, and up to
+    the order of the player's cards and of the board cards.  Only
+    pcards, board and opponents go into it (not pot or minbet).
+
+    Each suit gets a signature, the ranks it holds in the hole and
+    on the board, and suits are relabeled in order of signature.
+    Equivalent game states have the same signatures, so they get
+    the same labels (suits with equal signatures can be swapped
+    without changing anything).
+
+    Opponent ranges (see GameState.ranges) go into the key as
+    their text; if one names exact cards, suits are not relabeled.
+    """
+    signatures = [([], [], suit) for suit in range(4)]
+    for card in gamestate.pcards:
+        signatures[card.suit][0].append(card.rank)
+    for card in gamestate.board:
+        signatures[card.suit][1].append(card.rank)
+    for hole, board, suit in signatures:
+        hole.sort()
+        board.sort()
+    signatures.sort()
+    labels = [0] * 4
+    for label in range(4):
+        labels[signatures[label][2]] = label
+    ranges = None
+    if gamestate.ranges:
+        ranges = tuple([handrange and handrange.text
+                        for handrange in gamestate.ranges])
+        if not all([handrange.symmetric for handrange
+                    in gamestate.ranges if handrange]):
+            labels = range(4)
+    hole = tuple(sorted([card.rank * 4 + labels[card.suit]
+                         for card in gamestate.pcards]))
+    board = tuple(sorted([card.rank * 4 + labels[card.suit]
+                          for card in gamestate.board]))
+    if ranges:
+        return hole, board, gamestate.opponents, ranges
+    return hole, board, gamestate.opponents
+
+
+def _sizeof(obj):
+    """
+    Rough size in bytes of obj, following tuples and lists.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        for item in obj:
+            size += _sizeof(item)
+    return size
+
+
+class EquityCache:
+    """
+    A least recently used cache of equity results.  It holds at
+    most maxentries entries and roughly maxbytes bytes of keys and
+    values (either limit may be None), evicting the least recently
+    used entries to stay within them.
+
+    hits, misses and evictions count lookups that found an entry,
+    lookups that didn't, and entries dropped to make room.
+    """
+    def __init__(self, maxentries=100000, maxbytes=None):
+        self.maxentries = maxentries
+        self.maxbytes = maxbytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Returns the value stored for key, marking it most recently
+        used, or None.
+        """
+        try:
+            value, size = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries[key] = (value, size)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Stores value for key, then evicts least recently used
+        entries until the cache is within its limits.
+        """
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        size = _sizeof(key) + _sizeof(value)
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.entries and (
+            (self.maxentries is not None and
+             len(self.entries) > self.maxentries) or
+            (self.maxbytes is not None and self.bytes > self.maxbytes)):
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry (the counters are kept).
+        """
+        self.entries.clear()
+        self.bytes = 0
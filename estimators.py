@@ -0,0 +1,383 @@
+"""
+estimators.py
+Variance-reduced estimates of the probability of win (winning or
+tying for the best hand).  Every estimator is a function
+
+    estimator(gamestate, trials, rng) -> (equity, variance, games)
+
+that plays about trials games with the numpy.random.RandomState rng
+and returns the estimate, the estimated variance of that estimate
+and the number of games it played.  iid is plain sampling, the
+others reach the same variance in fewer games:
+
+    stratified_by_card  the next board card is a stratum; each card
+                        gets an equal share of the games.
+    stratified_by_class the hand class (preflop.hand_class) of the
+                        first opponent dealt is a stratum; classes
+                        get games in proportion to their probability.
+    antithetic          runouts come in complementary pairs dealt
+                        from one shuffle, sharing no card.
+    control_variate     regresses the outcome on quantities whose
+                        mean is known exactly: each opponent's
+                        preflop equity before the flop, whether it
+                        is ahead of the player now after it.
+    quasi_monte_carlo   deals from scrambled Sobol' points (see qmc)
+                        instead of random numbers, in independent
+                        replicates.
+
+ESTIMATORS maps the names BetStrategy accepts to them, and
+UNRANGED holds the names of those that can't play ranged opponents
+(see GameState.ranges).  Needs NumPy.
+"""
+from itertools import combinations
+import numpy
+import batchrank
+import preflop
+import qmc
+from evaluator import category
+from gamestate import GameState, BATCHSIZE, choose
+from boardcache import board_strengths, compute_board_strengths
+from boardcache import COMBO_INDEX, combo_arrays
+
+COMBOARRAY, COMBO_INDEXARRAY, _COMBOBITS = combo_arrays()
+
+# Board completions control_variate scores every opponent hand on
+# to find its control value.
+CONTROL_RUNOUTS = 64
+# Board completions over which control_variate finds the odds of
+# each of the player's final hand ranks (every one from the flop
+# on).
+CATEGORY_COMPLETIONS = 1 << 12
+# Independently scrambled point sets quasi_monte_carlo splits its
+# games between; their spread gives its variance.
+QMC_REPLICATES = 8
+
+
+def _batches(trials):
+    """
+    Returns the sizes of the batches of at most BATCHSIZE that
+    trials games are played in.
+    """
+    return [min(BATCHSIZE, trials - start)
+            for start in range(0, trials, BATCHSIZE)]
+
+
+def _outcomes(gamestate, board, holes):
+    """
+    Returns a (trials,) float array, 1 where the player wins or
+    ties a runout dealt by GameState.deal_runouts and 0 elsewhere.
+    """
+    player, best = gamestate.showdown(board, holes)
+    return (player >= best).astype(numpy.float64)
+
+
+def _bernoulli_variance(successes, games):
+    """
+    Returns the estimated variance of the mean of games 0/1
+    outcomes, successes of them 1 (arrays work too).
+    """
+    p = numpy.true_divide(successes, games)
+    return p * (1 - p) / numpy.maximum(games - 1, 1)
+
+
+def _free_combos(gamestate):
+    """
+    Returns a (1326,) boolean array of the hole card combinations
+    (see boardcache.COMBOS) that hold no known card.
+    """
+    known = 0
+    for card in gamestate.pcards + gamestate.board:
+        known |= 1 << card.index
+    return (_COMBOBITS & known) == 0
+
+
+def iid(gamestate, trials, rng):
+    """
+    Plain sampling: the fraction of trials independent games won.
+    """
+    wins, ties = gamestate.count_outcomes(trials, rng)
+    return (float(wins + ties) / trials,
+            float(_bernoulli_variance(wins + ties, trials)), trials)
+
+
+def stratified_by_card(gamestate, trials, rng):
+    """
+    Stratifies on the next board card: every card left is equally
+    likely to come next, so each gets trials / (cards left) games
+    (at least 2, to estimate its variance) played on the board
+    with it added, and the equity is the mean of their equities.
+    Falls back to iid on the river; can't stratify ranged
+    opponents, whose hands change the next card's odds.
+    """
+    if gamestate.ranges:
+        raise Exception, "can't stratify ranged opponents by board card"
+    if len(gamestate.board) == 5:
+        return iid(gamestate, trials, rng)
+    cards = gamestate.deck.remaining()
+    share, extra = divmod(trials, len(cards))
+    equity = variance = 0.0
+    games = 0
+    for number, card in enumerate(cards):
+        size = max(2, share + int(number < extra))
+        stratum = GameState(gamestate.pcards, gamestate.opponents,
+                            gamestate.board + [card], 0, 0)
+        wins, ties = stratum.count_outcomes(size, rng)
+        equity += float(wins + ties) / size
+        variance += _bernoulli_variance(wins + ties, size)
+        games += size
+    return (equity / len(cards), float(variance) / len(cards) ** 2, games)
+
+
+def _combo_classes():
+    """
+    Returns the (1326,) array of the preflop.hand_class of every
+    hole card combination.
+    """
+    ranks = COMBOARRAY >> 2
+    high = ranks.max(axis=1)
+    low = ranks.min(axis=1)
+    suited = (COMBOARRAY[:, 0] & 3) == (COMBOARRAY[:, 1] & 3)
+    return numpy.where(suited, high * 13 + low, low * 13 + high)
+
+_CLASSES = _combo_classes()
+
+
+def stratified_by_class(gamestate, trials, rng):
+    """
+    Stratifies on the hand class of the opponent dealt first (the
+    first ranged one, if any, else the first).  A class's weight
+    is the probability of that opponent's hand falling in it, from
+    the combinations left (weighted by its range); it gets that
+    share of the games (at least 2), each with a combination drawn
+    from the class by weight and the rest of the game dealt
+    around it.
+    """
+    if not gamestate.opponents:
+        return iid(gamestate, trials, rng)
+    first = 0
+    weights = numpy.zeros(len(COMBOARRAY))
+    if gamestate.ranges:
+        first = [k for k, handrange in enumerate(gamestate.ranges)
+                 if handrange is not None][0]
+        handrange = gamestate.ranges[first]
+        numbers = COMBO_INDEXARRAY[handrange.comboarray[:, 0],
+                                   handrange.comboarray[:, 1]]
+        weights[numbers] = handrange.weights
+    else:
+        weights[_free_combos(gamestate)] = 1.0
+    weights /= weights.sum()
+    classweights = numpy.bincount(_CLASSES, weights, preflop.CLASSES)
+    classes = numpy.flatnonzero(classweights)
+    sizes = numpy.maximum(2, numpy.round(trials * classweights[classes])
+                          ).astype(numpy.intp)
+    dealt = []
+    for handclass, size in zip(classes, sizes):
+        numbers = numpy.flatnonzero((_CLASSES == handclass) & (weights > 0))
+        inclass = weights[numbers]
+        dealt.append(rng.choice(numbers, size, p=inclass / inclass.sum()))
+    dealt = numpy.concatenate(dealt)
+    strata = numpy.repeat(numpy.arange(len(classes)), sizes)
+    successes = numpy.zeros(len(classes))
+    start = 0
+    for size in _batches(len(dealt)):
+        preset = [None] * gamestate.opponents
+        preset[first] = COMBOARRAY[dealt[start:start + size]]
+        board, holes = gamestate.deal_runouts(size, rng, preset)
+        successes += numpy.bincount(strata[start:start + size],
+                                    _outcomes(gamestate, board, holes),
+                                    len(classes))
+        start += size
+    shares = classweights[classes]
+    equity = (shares * successes / sizes).sum()
+    variance = (shares ** 2 * _bernoulli_variance(successes, sizes)).sum()
+    return float(equity), float(variance), len(dealt)
+
+
+def antithetic(gamestate, trials, rng):
+    """
+    Plays trials / 2 pairs of complementary runouts (see
+    GameState.deal_complementary_runouts) and averages each pair:
+    cards that go to one runout can't go to the other, so their
+    outcomes are negatively correlated.  Falls back to iid when
+    too few cards are left for two runouts.
+    """
+    needed = 5 - len(gamestate.board) + 2 * gamestate.opponents
+    if gamestate.ranges:
+        raise Exception, "can't deal ranged opponents complementary runouts"
+    if 2 * needed > len(gamestate.deck):
+        return iid(gamestate, trials, rng)
+    pairs = max(2, trials // 2)
+    total = squares = 0.0
+    for size in _batches(pairs):
+        first, second = gamestate.deal_complementary_runouts(size, rng)
+        means = (_outcomes(gamestate, *first) +
+                 _outcomes(gamestate, *second)) / 2
+        total += means.sum()
+        squares += (means * means).sum()
+    equity = total / pairs
+    variance = (squares - pairs * equity * equity) / (pairs - 1) / pairs
+    return equity, max(0.0, variance), 2 * pairs
+
+
+def _controls(gamestate, rng):
+    """
+    Returns a (1326, c) array of control values per opponent hole
+    card combination:
+
+    - the player's heads-up equity against it over CONTROL_RUNOUTS
+      board completions drawn once (all of them, if there are no
+      more), with every hand looked up in per-board strengths;
+    - before the flop, its equity against one opponent from the
+      preflop table, if there is one;
+    - after it, whether it is ahead of the player's hand on the
+      board so far.
+
+    The values of combinations holding a known card are unused.
+    """
+    known = [card.index for card in gamestate.board]
+    pcards = [card.index for card in gamestate.pcards]
+    deck = [card.index for card in gamestate.deck.remaining()]
+    dealt = 5 - len(known)
+    if choose(len(deck), dealt) <= CONTROL_RUNOUTS:
+        completions = [list(completion) for completion
+                       in combinations(deck, dealt)]
+        strengths = board_strengths
+    else:
+        completions = [list(rng.choice(deck, dealt, replace=False))
+                       for x in range(CONTROL_RUNOUTS)]
+        strengths = compute_board_strengths
+    beaten = numpy.zeros(len(COMBOARRAY))
+    counted = numpy.zeros(len(COMBOARRAY))
+    for completion in completions:
+        board = tuple(known + completion)
+        table = strengths(board)
+        free = table >= 0
+        beaten += free & (table <= table[COMBO_INDEX[pcards[0]][pcards[1]]])
+        counted += free
+    controls = [beaten / numpy.maximum(counted, 1)]
+    if not known:
+        table = preflop.default_table()
+        if table is not None:
+            equities = numpy.array([
+                table.lookup(preflop.class_cards(handclass), 1)
+                for handclass in range(preflop.CLASSES)])
+            controls.append(equities[_CLASSES])
+    else:
+        free = _free_combos(gamestate)
+        player = batchrank.evaluate_board(known, numpy.array([pcards]))[0]
+        current = numpy.zeros(len(COMBOARRAY))
+        current[free] = batchrank.evaluate_board(known, COMBOARRAY[free])
+        controls.append(current > player)
+    return numpy.column_stack(controls)
+
+
+def _player_categories(gamestate):
+    """
+    Returns the probability of each hand rank (evaluator.HIGHCARD
+    to RSF) the player's hand can end up as, over every board
+    completion, or None if there are more than
+    CATEGORY_COMPLETIONS completions (before the flop).
+    """
+    known = [card.index for card in gamestate.board]
+    pcards = [card.index for card in gamestate.pcards]
+    deck = [card.index for card in gamestate.deck.remaining()]
+    dealt = 5 - len(known)
+    if choose(len(deck), dealt) > CATEGORY_COMPLETIONS:
+        return None
+    boards = numpy.array(list(combinations(deck, dealt)),
+                         dtype=numpy.intp).reshape(-1, dealt)
+    hands = numpy.hstack((numpy.tile(pcards + known, (len(boards), 1)),
+                          boards))
+    categories = category(batchrank.evaluate(hands))
+    return numpy.bincount(categories, minlength=10) / float(len(boards))
+
+
+def control_variate(gamestate, trials, rng):
+    """
+    Regresses the outcome Y of each game on controls whose means
+    are known exactly and returns mean(Y) - beta (mean(X) - E[X]),
+    with beta the least squares coefficients (the intercept of the
+    regression on X - E[X]).  The controls are the sum over the
+    opponents of their control values (see _controls), whose mean
+    is the opponents times the mean over the combinations left,
+    and, once the flop is known, which hand rank the player ends
+    up with (see _player_categories).  The variance is that of the
+    regression's residuals over the games.  Can't be used with
+    ranged opponents, whose hands' means aren't known.
+    """
+    if gamestate.ranges:
+        raise Exception, "can't use control variates with ranges"
+    if not gamestate.opponents:
+        return iid(gamestate, trials, rng)
+    controls = _controls(gamestate, rng).astype(numpy.float64)
+    free = _free_combos(gamestate)
+    expected = gamestate.opponents * controls[free].mean(axis=0)
+    categories = _player_categories(gamestate)
+    if categories is not None:
+        expected = numpy.concatenate((expected, categories))
+    width = len(expected) + 1
+    moments = numpy.zeros((width + 1, width + 1))
+    for size in _batches(trials):
+        board, holes = gamestate.deal_runouts(size, rng)
+        player, best = gamestate.showdown(board, holes)
+        columns = numpy.zeros((size, width + 1))
+        columns[:, 0] = 1
+        for hole in holes:
+            columns[:, 1:controls.shape[1] + 1] += controls[
+                COMBO_INDEXARRAY[hole[:, 0], hole[:, 1]]]
+        if categories is not None:
+            columns[numpy.arange(size),
+                    controls.shape[1] + 1 + category(player)] = 1
+        columns[:, 1:width] -= expected
+        columns[:, width] = player >= best
+        moments += numpy.dot(columns.T, columns)
+    xx = moments[:width, :width]
+    xy = moments[:width, width]
+    inverse = numpy.linalg.pinv(xx)
+    coefficients = numpy.dot(inverse, xy)
+    residuals = moments[width, width] - numpy.dot(coefficients, xy)
+    variance = max(0.0, residuals) / max(trials - width, 1)
+    return (float(min(1.0, max(0.0, coefficients[0]))),
+            float(variance * inverse[0, 0]), trials)
+
+
+def quasi_monte_carlo(gamestate, trials, rng):
+    """
+    Splits the games between QMC_REPLICATES replicates, each
+    dealing its runouts from the points of its own scrambled Sobol'
+    sequence (see GameState.deal_runouts), one dimension per card
+    the shuffle deals, board cards first.  Each replicate's equity
+    is unbiased and they are independent, so the equity is their
+    mean and its variance their sample variance over the
+    replicates.  Ranged opponents are drawn at random as usual.
+    """
+    random_hands = len([k for k in range(gamestate.opponents)
+                        if not gamestate.ranges or
+                        gamestate.ranges[k] is None])
+    dimensions = 5 - len(gamestate.board) + 2 * random_hands
+    size = max(1, trials // QMC_REPLICATES)
+    equities = []
+    for replicate in range(QMC_REPLICATES):
+        sequence = qmc.SobolSequence(dimensions, rng)
+        successes = 0.0
+        start = 0
+        for batch in _batches(size):
+            board, holes = gamestate.deal_runouts(
+                batch, rng, points=sequence.points(start, batch))
+            successes += _outcomes(gamestate, board, holes).sum()
+            start += batch
+        equities.append(successes / size)
+    return (float(numpy.mean(equities)),
+            float(numpy.var(equities, ddof=1)) / QMC_REPLICATES,
+            size * QMC_REPLICATES)
+
+
+ESTIMATORS = {
+    "iid": iid,
+    "card": stratified_by_card,
+    "class": stratified_by_class,
+    "antithetic": antithetic,
+    "control": control_variate,
+    "qmc": quasi_monte_carlo,
+}
+UNRANGED = ("card", "antithetic", "control")
@@ -0,0 +1,294 @@
+"""
+evaluator.py
+Table-driven hand evaluation.  Maps a list of cards (given as
+Card.index ints, see handrank.Card), usually 5-7 of them, to a
+single int, the hand's strength, in a handful of table lookups.
+
+A strength orders hands exactly like Hand.__cmp__ orders
+(rank, kickers): the hand rank (0-9, highcard to royal straight
+flush) sits above bit 20, and below it the ranks of the five
+kickers, most significant first, four bits each (stored as
+rank + 1 so the low ace placeholder of a wheel, rank -1, fits).
+
+Two tables back it:
+- _FLUSHES maps a 13 bit mask of the ranks held in one suit to
+  the best flush/straight flush strength for that suit.  It is
+  built when the module is imported (8192 entries).
+- _RANKS maps a rank multiset (the sum of 5**rank over the cards)
+  to the best non-flush strength for those ranks.  There are
+  about 76000 multisets, which take around a second to build, so
+  entries are filled in the first time they are looked up; call
+  build_tables() to fill all of them ahead of time.
+A per-card key packs 5**rank above four bit per-suit counters,
+so one sum over the cards yields both the multiset key and the
+suit counts.
+"""
+
+(HIGHCARD, PAIR, TWOPAIR, TRIPS, STRAIGHT, FLUSH, BOAT, QUADS, SF,
+ RSF) = range(10)
+
+_KICKERBITS = 4
+_RANKSHIFT = 20
+_SUITBITS = 16
+
+_CARDKEYS = [(5 ** (index // 4) << _SUITBITS) | (1 << (4 * (index % 4)))
+             for index in range(52)]
+_RANKBITS = [1 << (index // 4) for index in range(52)]
+
+
+def _flush_suit(word):
+    for suit in range(4):
+        if (word >> (4 * suit)) & 15 >= 5:
+            return suit
+    return -1
+
+
+def _flush_suits():
+    """
+    Returns the list of suit counter word -> _flush_suit(word),
+    built a counter at a time from the highest, each one taking
+    over wherever it reaches 5 (so the lowest such suit wins).
+    """
+    table = [-1]
+    for suit in range(3, -1, -1):
+        table = [suit if count >= 5 else found
+                 for found in table for count in range(16)]
+    return table
+
+# Suit counter word -> suit holding five or more cards, or -1.
+_FLUSHSUIT = _flush_suits()
+
+
+def suit_table():
+    """
+    Returns the list of suit counter word (the low 16 bits of a
+    sum of card keys) -> suit holding five or more of the cards,
+    or -1.  Callers must not modify it.
+    """
+    return _FLUSHSUIT
+
+
+def flush_suit(cards):
+    """
+    Takes a list of card indexes (Card.index) and returns the suit
+    holding five or more of them, or -1.
+    """
+    key = 0
+    for card in cards:
+        key += _CARDKEYS[card]
+    return _FLUSHSUIT[key & 65535]
+
+
+def encode(rank, kickers):
+    """
+    Packs a hand rank and a list of (at most five) kicker ranks
+    into a strength int.  Missing kickers are encoded as rank -1.
+    """
+    strength = rank
+    for k in range(5):
+        strength <<= _KICKERBITS
+        if k < len(kickers):
+            strength |= kickers[k] + 1
+    return strength
+
+
+def decode(strength):
+    """
+    Inverse of encode: returns (rank, kickers) where kickers is
+    a list of card ranks.  Trailing empty kicker slots (hands of
+    fewer than five cards) are dropped.
+    """
+    rank = strength >> _RANKSHIFT
+    kickers = [((strength >> (_KICKERBITS * k)) & 15) - 1
+               for k in range(4, -1, -1)]
+    if rank != STRAIGHT and rank < SF:
+        while kickers and kickers[-1] == -1:
+            kickers.pop()
+    return rank, kickers
+
+
+def category(strength):
+    """
+    Returns the hand rank (0-9) of a strength.
+    """
+    return strength >> _RANKSHIFT
+
+
+def straight_high(mask):
+    """
+    Takes a 13 bit rank mask and returns the rank of the highest
+    card of the best straight in it (3 for a wheel), or -1.
+    """
+    for high in range(12, 3, -1):
+        run = 31 << (high - 4)
+        if mask & run == run:
+            return high
+    wheel = (1 << 12) | 15
+    if mask & wheel == wheel:
+        return 3
+    return -1
+
+
+def _straight_kickers(high):
+    return [high - k for k in range(5)]
+
+
+def _rank_strength(counts):
+    """
+    Returns the best non-flush strength for a list of 13 rank
+    counts.
+    """
+    byrank = [rank for rank in range(12, -1, -1) if counts[rank]]
+    mask = 0
+    for rank in byrank:
+        mask |= 1 << rank
+    for rank in byrank:
+        if counts[rank] == 4:
+            kickers = [rank] * 4
+            kickers += [r for r in byrank if r != rank][:1]
+            return encode(QUADS, kickers)
+    trips = [rank for rank in byrank if counts[rank] == 3]
+    pairs = [rank for rank in byrank if counts[rank] >= 2]
+    if trips:
+        others = [rank for rank in pairs if rank != trips[0]]
+        if others:
+            return encode(BOAT, [trips[0]] * 3 + [others[0]] * 2)
+    high = straight_high(mask)
+    if high >= 0:
+        return encode(STRAIGHT, _straight_kickers(high))
+    if trips:
+        rest = [rank for rank in byrank if rank != trips[0]]
+        return encode(TRIPS, [trips[0]] * 3 + rest[:2])
+    if len(pairs) >= 2:
+        rest = [rank for rank in byrank if rank not in pairs[:2]]
+        return encode(TWOPAIR, [pairs[0]] * 2 + [pairs[1]] * 2 + rest[:1])
+    if pairs:
+        rest = [rank for rank in byrank if rank != pairs[0]]
+        return encode(PAIR, [pairs[0]] * 2 + rest[:3])
+    return encode(HIGHCARD, byrank[:5])
+
+
+def _flush_strength(mask):
+    """
+    Returns the best flush strength for a 13 bit mask of the
+    ranks held in the flush suit, or 0 if it has under 5 ranks.
+    """
+    ranks = [rank for rank in range(12, -1, -1) if mask & (1 << rank)]
+    if len(ranks) < 5:
+        return 0
+    high = straight_high(mask)
+    if high == 12:
+        return encode(RSF, _straight_kickers(high))
+    if high >= 0:
+        return encode(SF, _straight_kickers(high))
+    return encode(FLUSH, ranks[:5])
+
+
+def _flush_table():
+    """
+    Returns the list of rank mask -> _flush_strength(mask), built
+    without evaluating most masks: dropping the lowest rank of a
+    flush of six or more leaves its best five, so only the five
+    rank masks are encoded, and then every mask holding a straight
+    is overwritten by its best straight flush.
+    """
+    table = [0] * (1 << 13)
+    for mask in range(1, 1 << 13):
+        rest = mask & (mask - 1)
+        if table[rest]:
+            table[mask] = table[rest]
+        elif bin(mask).count("1") == 5:
+            table[mask] = encode(FLUSH, [rank for rank in range(12, -1, -1)
+                                         if mask & (1 << rank)])
+    for high in range(3, 13):
+        run = 31 << (high - 4) if high > 3 else (1 << 12) | 15
+        strength = encode(RSF if high == 12 else SF, _straight_kickers(high))
+        others = ((1 << 13) - 1) & ~run
+        extra = others
+        while True:
+            table[run | extra] = strength
+            if not extra:
+                break
+            extra = (extra - 1) & others
+    return table
+
+
+class _RankTable(dict):
+    """
+    Dict of rank multiset key -> strength that computes and
+    stores missing entries on lookup.
+    """
+    def __missing__(self, key):
+        counts = []
+        rest = key
+        while len(counts) < 13:
+            counts.append(rest % 5)
+            rest //= 5
+        strength = self[key] = _rank_strength(counts)
+        return strength
+
+
+def build_tables():
+    """
+    Fills every entry of the rank multiset table, so that no
+    evaluation has to compute one.
+    """
+    counts = [0] * 13
+
+    def fill(rank, left, key):
+        if rank == 13:
+            if left < 7 and key not in _RANKS:
+                _RANKS[key] = _rank_strength(counts)
+            return
+        for count in range(min(4, left) + 1):
+            counts[rank] = count
+            fill(rank + 1, left - count, key + count * 5 ** rank)
+        counts[rank] = 0
+
+    fill(0, 7, 0)
+
+
+_RANKS = _RankTable()
+_FLUSHES = _flush_table()
+
+
+def tables():
+    """
+    Fills the rank multiset table (see build_tables) and returns
+    (ranks, flushes): the dict of multiset key -> strength and the
+    list of flush rank mask -> strength.  Callers must not modify
+    them.
+    """
+    build_tables()
+    return _RANKS, _FLUSHES
+
+
+def evaluate(cards):
+    """
+    Takes a list of card indexes (Card.index) and returns the
+    strength of the best five card hand they make.
+
+    With seven cards or fewer a flush rules out quads and a full
+    house, so the rank table is only consulted for larger hands
+    holding a flush.
+    """
+    key = 0
+    for card in cards:
+        key += _CARDKEYS[card]
+    suit = _FLUSHSUIT[key & 65535]
+    if suit >= 0:
+        mask = 0
+        for card in cards:
+            if card & 3 == suit:
+                mask |= _RANKBITS[card]
+        if len(cards) < 8:
+            return _FLUSHES[mask]
+        return max(_FLUSHES[mask], _RANKS[key >> _SUITBITS])
+    return _RANKS[key >> _SUITBITS]
+
+
+def evaluate_cards(cards):
+    """
+    Same as evaluate, but takes a list of Card objects.
+    """
+    return evaluate([card.index for card in cards])
@@ -2,7 +2,34 @@
 gamestate.py
 contains all the information essential to a poker game table at any moment.
 """
+import time
+from itertools import combinations
 from handrank import *
+from evaluator import evaluate
+from handrange import HandRange
+from boardcache import board_strengths, combo_arrays, COMBO_INDEX
+from lazyimport import lazy_import
+
+# simulate_games needs NumPy, everything else runs without it; it is
+# imported the first time it's used.
+numpy = lazy_import("numpy")
+batchrank = lazy_import("batchrank")
+
+# Trials dealt and scored per batch by GameState.simulate_games.
+BATCHSIZE = 1 << 16
+# Most cells (rows times opponents) of the table of opponent hand
+# combinations enumerate_outcomes builds, about 8 bytes each to hold
+# and 4 more to score, for BetStrategy to choose enumeration.
+MATCHING_CELLS = 1 << 23
+# Opponents from which simulate_showdown looks hands up in the
+# per-board strengths (once the turn is known) rather than
+# evaluating them; a lookup's fixed cost is about that of scoring
+# three hands.
+TABLE_OPPONENTS = 3
+# Hands a batch must score, with the turn known, before showdown
+# looks them up in the per-board tables of all 48 river cards
+# rather than evaluating them.
+TURN_TABLE_HANDS = 1 << 18
 
 class GameState:
     """
@@ -14,16 +41,44 @@ class GameState:
     Gamestate also provides methods to randomly extrapolate the
     game to its conclusion, i.e. draw random cards to fill out
     the rest of the board and the opponents hands.
+
+    ranges optionally gives each opponent a hand range: a list
+    with one entry per opponent, a handrange.HandRange, range text
+    ("JJ+, AKs, 50% AQo") or None for two random cards.  Ranged
+    opponents' hands are dealt first, each avoiding the cards of
+    the ones before it, then the board and any random hands.
     """
-    def __init__(self, pcards, opponents, board, pot, minbet):
+    def __init__(self, pcards, opponents, board, pot, minbet, ranges=None):
 		self.pcards = pcards
 		self.opponents = opponents
 		self.board = board
 		self.pot = pot
 		self.minbet = minbet
 		self.opcards = []
+		self.set_ranges(ranges)
 		self.reset_deck()
 
+    def set_ranges(self, ranges):
+        """
+        Sets self.ranges, the list of each opponent's HandRange (or
+        None), from a list as described in the class doc, or None
+        for random hands all round.  The ranges are stored without
+        the combinations that hold a known card.
+        """
+        if ranges is None or not [r for r in ranges if r is not None]:
+            self.ranges = None
+            return
+        if len(ranges) != self.opponents:
+            raise Exception, "give one range (or None) per opponent"
+        known = self.pcards + self.board
+        self.ranges = []
+        for handrange in ranges:
+            if isinstance(handrange, basestring):
+                handrange = HandRange(handrange)
+            if handrange is not None:
+                handrange = handrange.without(known)
+            self.ranges.append(handrange)
+
     def update_hands(self):
 		"""
 		Takes the cards given and creates hands for the player and
@@ -42,9 +97,7 @@ class GameState:
         """
         Replaces Gamestate.deck with a new Deck()
         """
-        self.deck = Deck()
-        for card in (self.pcards + self.board):
-            self.deck.cards.remove(card)
+        self.deck = Deck(self.pcards + self.board)
 
     def extrapolate_board(self):
         """
@@ -52,8 +105,8 @@ class GameState:
         to the board cards given in the init call, until all 
         five board cards have been selected
         """
-        self.old_board = []
-        self.old_board.extend(self.board)
+        self.old_board = self.board[:]
+        self._boardmark = self.deck.mark()
         while len(self.board) < 5:
             self.board.append(self.deck.draw())
 
@@ -61,36 +114,51 @@ class GameState:
         """
         Returns Gamestate.board to its original self (spec. in
         the init call), and puts the cards that were added back
-        into the deck.  old_board is then reset to an empty list. 
+        into the deck (rolling it back to before extrapolate_board,
+        so anything drawn after that goes back too).  old_board is
+        then reset to an empty list. 
         """
-        for card in self.board:
-            if card not in self.old_board:
-                self.deck.cards.append(card)
-                self.board.remove(card)
+        del self.board[len(self.old_board):]
+        self.deck.rollback(self._boardmark)
         self.old_board = []
 
     def extrapolate_opponents(self):
 		"""
-		Takes the number of opponents given in self.opponents and draws two random cards for each of them, storing the results list in self.opcards.
+		Takes the number of opponents given in self.opponents and
+		draws two random cards for each of them, storing the results
+		list in self.opcards.
+		Opponents with a range draw from it instead, before any
+		random hand is dealt (as in deal_runouts), so that random
+		hands can't take the cards a range needs.
 		"""
+		if not self.opcards:
+			self._opmark = self.deck.mark()
+		ranged = {}
+		if self.ranges:
+			for seat in range(len(self.opcards), self.opponents):
+				if self.ranges[seat]:
+					ranged[seat] = self.ranges[seat].draw(self.deck)
 		while len(self.opcards) < self.opponents:
-			cards = [self.deck.draw()]
-			cards.append(self.deck.draw())
+			cards = ranged.get(len(self.opcards))
+			if cards is None:
+				cards = [self.deck.draw()]
+				cards.append(self.deck.draw())
 			self.opcards.append(cards)
 
     def reset_opponents(self):
         """
         Returns self.opcards to empty and returns the cards
-        selected for it to the deck.
+        selected for it to the deck (rolling it back to before
+        extrapolate_opponents, so anything drawn after that goes
+        back too).
         """
-        for cards in self.opcards:
-            for card in cards:
-                self.deck.cards.append(card)
+        if self.opcards:
+            self.deck.rollback(self._opmark)
         self.opcards = []
 
     def extrapolate_game(self):
         """
-        Extrapolates opponents and board.
+        Extrapolates opponents, then board.
         See Gamestate.extrapolate_opponents and
         Gamestate.extraoplate_board
         """
@@ -100,25 +168,480 @@ class GameState:
     def reset_game(self):
         """
         Resets opcards, board and the deck to their 
-        original state.
+        original state, undoing extrapolate_game in reverse order.
         """
-        self.reset_opponents()
         self.reset_board()
+        self.reset_opponents()
+
+    def simulate_showdown(self, seconds=None):
+		"""
+		Extrapolates a game (Gamestate.extrapolate_game), scores
+		every hand, resets the game (Gamestate.reset_game) and
+		returns (player, best): the strength of the player's hand
+		and of the best opponent hand (-1 with no opponents).
+		See GameState.simulate_strengths.
+		"""
+		strengths = self.simulate_strengths(seconds)
+		return strengths[0], max(strengths[1:] or [-1])
+
+    def simulate_strengths(self, seconds=None):
+        """
+        Extrapolates a game, scores every hand and resets the game,
+        returning the list of the strengths of the player's hand and
+        then of each opponent's: integers ordered like the hands
+        (see evaluator.py), equal exactly when the hands tie.
+
+        Hands are scored with evaluator.evaluate on card indexes,
+        without building Hand objects.  Once the turn is known few
+        boards are possible, so with TABLE_OPPONENTS or more each
+        hand is instead looked up in its board's strengths (see
+        boardcache).
+
+        If seconds is a dict (see simstats), the time spent in each
+        phase of the trial is added to its entries.
+        """
+        if seconds is not None:
+            started = time.time()
+        known = len(self.board)
+        self.extrapolate_game()
+        if seconds is not None:
+            drawn = time.time()
+        board = [card.index for card in self.board]
+        holes = [self.pcards] + self.opcards
+        if seconds is not None:
+            built = time.time()
+        if known >= 4 and self.opponents >= TABLE_OPPONENTS:
+            table = board_strengths(board)
+            strengths = [table[COMBO_INDEX[cards[0].index][cards[1].index]]
+                         for cards in holes]
+        else:
+            strengths = [evaluate([cards[0].index, cards[1].index] + board)
+                         for cards in holes]
+        if seconds is not None:
+            ranked = time.time()
+        self.reset_game()
+        if seconds is not None:
+            seconds["draw"] += drawn - started
+            seconds["build"] += built - drawn
+            seconds["rank"] += ranked - built
+            seconds["reset"] += time.time() - ranked
+        return strengths
+
+    def simulate_split(self):
+        """
+        Simulates a game (GameState.simulate_strengths) and returns
+        the number of hands the pot is split between if the player
+        holds one of the best: 1 for an outright win, k for a k-way
+        split pot, and 0 if the player lost.
+        """
+        strengths = self.simulate_strengths()
+        if strengths[0] < max(strengths):
+            return 0
+        return strengths.count(strengths[0])
 
-    def simulate_game(self):
+    def simulate_game(self, seconds=None):
 		"""
-		Extrapolates a game (Gamestate.extrapolate_game), then
-		checks to see if the winner is the player's hand, resets
-		the game (Gamestate.reset_game) and returns a 1 if the
-		player won and a zero otherwise.
+		Simulates a game (Gamestate.simulate_showdown) and returns
+		a 1 if the player won (or tied for the best hand) and a
+		zero otherwise.
 		"""
-		self.extrapolate_game()
-		self.update_hands()
-		winner = max(self.ophands + [self.phand])
-		self.reset_game()
-		self.update_hands()
-		if winner == self.phand:
+		pstrength, best = self.simulate_showdown(seconds)
+		if pstrength >= best:
 			return 1
 		else:
 			return 0
-        
+
+    def deal_runouts(self, trials, rng, holes=None, points=None):
+        """
+        Deals trials random runouts at once from the cards left in
+        self.deck, without touching the deck.  Returns (board, holes):
+        a (trials, 5) array of board card indexes (the known board
+        followed by the dealt cards) and a list of self.opponents
+        (trials, 2) arrays of opponent hole card indexes.
+
+        Ranged opponents are dealt first (see HandRange.deal) and
+        their cards taken out of each row of a (trials, len(deck))
+        array.  Each row is then put through a partial Fisher-Yates
+        shuffle, one column at a time across all rows, for as many
+        cards as the rest of the runout needs.
+
+        holes optionally presets some opponents' hole cards: a list
+        with a (trials, 2) array or None per opponent.  Preset
+        opponents are dealt before (and instead of) any range.
+
+        points optionally replaces the shuffle's random picks with
+        a (trials, k) array of numbers in [0, 1), one per card dealt
+        by the shuffle (board cards first, then the random hands),
+        e.g. quasi-random ones (see qmc).
+        """
+        return self._deal(trials, rng, 1, holes, points)[0]
+
+    def deal_complementary_runouts(self, trials, rng):
+        """
+        Deals trials pairs of runouts, each pair from one shuffle:
+        the first runout takes the first cards of the shuffled
+        deck, the second the next ones, so the two share no card.
+        Returns [(board, holes), (board, holes)] as deal_runouts
+        would.  Needs enough cards left for two runouts and no
+        ranged opponents.
+        """
+        if self.ranges:
+            raise Exception, "complementary runouts can't deal ranges"
+        return self._deal(trials, rng, 2)
+
+    def _deal(self, trials, rng, count, preset=None, points=None):
+        """
+        Deals trials rows of count disjoint runouts (see
+        deal_runouts) and returns a list of count (board, holes).
+        """
+        rest = numpy.array([card.index for card in self.deck.remaining()],
+                           dtype=numpy.int8)
+        deck = numpy.tile(rest, (trials, 1))
+        holes = [None] * self.opponents
+        if preset is not None:
+            holes = list(preset)
+        if self.ranges or preset is not None:
+            used = numpy.zeros(trials, dtype=numpy.int64)
+            for hole in holes:
+                if hole is not None:
+                    cards = hole.astype(numpy.int64)
+                    used |= (1 << cards[:, 0]) | (1 << cards[:, 1])
+            for k, handrange in enumerate(self.ranges or []):
+                if handrange is not None and holes[k] is None:
+                    holes[k] = handrange.deal(used, rng)
+                    cards = holes[k].astype(numpy.int64)
+                    used |= (1 << cards[:, 0]) | (1 << cards[:, 1])
+            free = (used[:, None] >> rest.astype(numpy.int64)) & 1 == 0
+            deck = deck[free].reshape(trials, -1)
+        dealt = 5 - len(self.board)
+        needed = dealt + 2 * len([hole for hole in holes if hole is None])
+        if needed * count > deck.shape[1]:
+            raise Exception, "not enough cards left for %d runouts" % count
+        rows = numpy.arange(trials)
+        for column in range(needed * count):
+            if points is None:
+                picks = rng.randint(column, deck.shape[1], size=trials)
+            else:
+                picks = column + (points[:, column] * 
+                                  (deck.shape[1] - column)).astype(numpy.intp)
+            drawn = deck[rows, picks]
+            deck[rows, picks] = deck[:, column]
+            deck[:, column] = drawn
+        known = numpy.tile(numpy.array([card.index for card in self.board],
+                                       dtype=numpy.int8), (trials, 1))
+        runouts = []
+        for start in range(0, needed * count, needed):
+            board = numpy.hstack((known, deck[:, start:start + dealt]))
+            dealtholes = holes[:]
+            column = start + dealt
+            for k in range(self.opponents):
+                if dealtholes[k] is None:
+                    dealtholes[k] = deck[:, column:column + 2]
+                    column += 2
+            runouts.append((board, dealtholes))
+        return runouts
+
+    def showdown(self, board, holes):
+        """
+        Takes the arrays returned by deal_runouts and returns
+        (player, best): the (trials,) strengths of the player's hand
+        and of the best opponent hand in each runout.
+
+        With the board known, or the turn known and enough hands to
+        score, hands are looked up in per-board strengths (see
+        boardcache) instead of evaluated.
+        """
+        strengths = self._strengths(board, holes)
+        player = strengths[0]
+        if len(strengths) > 1:
+            best = numpy.maximum.reduce(strengths[1:])
+        else:
+            best = numpy.zeros_like(player)
+        return player, best
+
+    def _strengths(self, board, holes):
+        """
+        Takes the arrays returned by deal_runouts and returns the
+        (trials,) strengths of the player's hand and then of each
+        opponent's, scored as showdown describes.
+        """
+        pholes = numpy.tile([card.index for card in self.pcards],
+                            (len(board), 1))
+        known = len(self.board)
+        if known == 5 or (known == 4 and len(board) * (self.opponents + 1)
+                          >= TURN_TABLE_HANDS):
+            return self._lookup_strengths(board, [pholes] + holes)
+        return batchrank.evaluate_holes(board, [pholes] + holes)
+
+    def _lookup_strengths(self, board, holes):
+        """
+        evaluate_holes for runouts whose boards differ at most in
+        the river: a row of per-board strengths for each river card
+        dealt, indexed by river and hole card combination.
+        """
+        rivers = board[:, 4].astype(numpy.intp)
+        known = [card.index for card in self.board[:4]]
+        table = numpy.empty((52, 1326), dtype=numpy.int32)
+        for river in numpy.unique(rivers):
+            table[river] = board_strengths(known + [int(river)])
+        index = combo_arrays()[1]
+        return [table[rivers, index[hole[:, 0], hole[:, 1]]]
+                for hole in holes]
+
+    def count_outcomes(self, trials, rng=None, seconds=None):
+        """
+        Vectorized simulate_showdown: plays out trials games at once
+        (in batches of BATCHSIZE) and returns (wins, ties), the
+        number of them the player won outright and the number where
+        the player tied for the best hand.
+
+        rng is a numpy.random.RandomState, a fresh unseeded one by
+        default.  If seconds is a dict (see simstats), the time spent
+        dealing and in the showdowns is added to its "draw" and
+        "rank" entries.  Needs NumPy.
+        """
+        if numpy is None:
+            raise Exception, "GameState.count_outcomes needs numpy"
+        if rng is None:
+            rng = numpy.random.RandomState()
+        wins = ties = 0
+        for start in range(0, trials, BATCHSIZE):
+            if seconds is not None:
+                started = time.time()
+            board, holes = self.deal_runouts(min(BATCHSIZE, trials - start),
+                                             rng)
+            if seconds is not None:
+                dealt = time.time()
+                seconds["draw"] += dealt - started
+            player, best = self.showdown(board, holes)
+            if seconds is not None:
+                seconds["rank"] += time.time() - dealt
+            wins += int(numpy.count_nonzero(player > best))
+            ties += int(numpy.count_nonzero(player == best))
+        return wins, ties
+
+    def simulate_games(self, trials, rng=None, seconds=None):
+        """
+        Vectorized simulate_game: returns the number of trials
+        games the player won or tied for the best hand, i.e. what
+        summing simulate_game over as many trials would give.  
+        See GameState.count_outcomes.
+        """
+        wins, ties = self.count_outcomes(trials, rng, seconds)
+        return wins + ties
+
+    def count_splits(self, trials, rng=None):
+        """
+        Vectorized simulate_split: plays out trials games at once
+        (in batches of BATCHSIZE) and returns a list of
+        self.opponents + 1 counts, the k-th being the number of
+        games the player split the pot k + 1 ways (the first is the
+        games won outright).  Games the player lost aren't counted.
+        Needs NumPy.
+        """
+        if numpy is None:
+            raise Exception, "GameState.count_splits needs numpy"
+        if rng is None:
+            rng = numpy.random.RandomState()
+        splits = numpy.zeros(self.opponents + 1, dtype=numpy.int64)
+        for start in range(0, trials, BATCHSIZE):
+            board, holes = self.deal_runouts(min(BATCHSIZE, trials - start),
+                                             rng)
+            strengths = self._strengths(board, holes)
+            player = strengths[0]
+            tied = numpy.zeros(len(board), dtype=numpy.intp)
+            lost = numpy.zeros(len(board), dtype=bool)
+            for strength in strengths[1:]:
+                tied += strength == player
+                lost |= strength > player
+            splits += numpy.bincount(tied[~lost],
+                                     minlength=self.opponents + 1)
+        return [int(count) for count in splits]
+
+    def enumeration_size(self):
+        """
+        Returns the number of distinct, equally likely runouts:
+        board completions times the unordered ways to give each
+        opponent two of the cards left.  Opponents' hands are
+        interchangeable (only the best one matters), so each set of
+        holdings is counted once rather than once per seating.
+        """
+        dealt = 5 - len(self.board)
+        return choose(len(self.deck), dealt) * self.matching_count()
+
+    def matching_count(self):
+        """
+        Returns the number of ways to give every opponent two of the
+        cards left once the board is complete (the rows _matchings
+        builds for each board completion), or 0 if there are too few.
+        """
+        left = len(self.deck) - (5 - len(self.board))
+        size = 1
+        for k in range(self.opponents):
+            size *= choose(left - 2 * k, 2)
+        for k in range(2, self.opponents + 1):
+            size //= k
+        return size
+
+    def check_enumeration(self):
+        """
+        Raises an Exception if enumerate_outcomes can't enumerate
+        this game state: opponents have ranges, there are too few
+        cards to deal every opponent, or its table of opponent hand
+        combinations would take more than MATCHING_CELLS cells.
+        """
+        if self.ranges:
+            raise Exception, "can't enumerate opponents with ranges"
+        if not self.enumeration_size():
+            raise Exception, "not enough cards left to deal every opponent"
+        cells = self.matching_count() * self.opponents
+        if cells > MATCHING_CELLS:
+            raise Exception, ("too many opponent hands to enumerate: %d "
+                              "cells, over MATCHING_CELLS (%d)" %
+                              (cells, MATCHING_CELLS))
+
+    def enumerate_outcomes(self):
+        """
+        Exact counterpart of count_outcomes: visits every runout
+        counted by enumeration_size once and returns (wins, ties,
+        runouts).  Board completions are looped over; for each, the
+        strengths of all hole card pairs left are scored in one
+        batch and combined into every set of disjoint pairs (see
+        _matchings).  From the turn on there are few completions, so
+        their strengths are taken from (and kept in) the per-board
+        cache instead (see boardcache).  Raises an Exception for a
+        game state it can't enumerate (see check_enumeration).
+        Needs NumPy.
+        """
+        if numpy is None:
+            raise Exception, "GameState.enumerate_outcomes needs numpy"
+        self.check_enumeration()
+        deck = [card.index for card in self.deck.remaining()]
+        known = [card.index for card in self.board]
+        pcards = [card.index for card in self.pcards]
+        dealt = 5 - len(self.board)
+        left = len(deck) - dealt
+        pairs = numpy.array(list(combinations(range(left), 2)), 
+                            dtype=numpy.intp).reshape(-1, 2)
+        matchings = _matchings(pairs, left, self.opponents)
+        index = combo_arrays()[1]
+        wins = ties = runouts = 0
+        for completion in combinations(deck, dealt):
+            board = known + list(completion)
+            player = evaluate(pcards + board)
+            if self.opponents == 0:
+                wins += 1
+                runouts += 1
+                continue
+            rest = numpy.array([card for card in deck 
+                                if card not in completion], dtype=numpy.intp)
+            holes = rest[pairs]
+            if dealt <= 1:
+                strengths = board_strengths(board)[
+                    index[holes[:, 0], holes[:, 1]]]
+            else:
+                strengths = batchrank.evaluate_board(board, holes)
+            best = strengths[matchings].max(axis=1)
+            wins += int(numpy.count_nonzero(best < player))
+            ties += int(numpy.count_nonzero(best == player))
+            runouts += len(best)
+        return wins, ties, runouts
+
+
+def count_outcomes_together(gamestates, trials, rng=None):
+    """
+    count_outcomes for several game states at once: returns the
+    list of their (wins, ties) over trials games each.  Game states
+    with the same number of opponents are dealt one by one but
+    scored together, in batches of about BATCHSIZE hands, so that
+    many small simulations cost about as much as one large one.
+    Over BATCHSIZE trials are played in batches of at most that
+    many, so memory use doesn't grow with trials.
+    Needs NumPy.
+    """
+    if numpy is None:
+        raise Exception, "count_outcomes_together needs numpy"
+    if rng is None:
+        rng = numpy.random.RandomState()
+    results = [[0, 0] for gs in gamestates]
+    groups = {}
+    for number, gs in enumerate(gamestates):
+        groups.setdefault(gs.opponents, []).append(number)
+    for numbers in groups.values():
+        for begin in range(0, trials, BATCHSIZE):
+            size = min(BATCHSIZE, trials - begin)
+            per_batch = max(1, BATCHSIZE // size)
+            for start in range(0, len(numbers), per_batch):
+                batch = numbers[start:start + per_batch]
+                _count_batch([gamestates[number] for number in batch], size,
+                             rng, [results[number] for number in batch])
+    return [tuple(result) for result in results]
+
+
+def _count_batch(gamestates, trials, rng, results):
+    """
+    Plays out trials games of each of gamestates, which have the
+    same number of opponents, scores them together and adds each
+    one's wins and ties into its [wins, ties] list in results.
+    """
+    boards, pholes, holes = [], [], []
+    for gs in gamestates:
+        board, dealt = gs.deal_runouts(trials, rng)
+        boards.append(board)
+        pholes.append(numpy.tile([card.index for card in gs.pcards],
+                                 (trials, 1)))
+        holes.append(dealt)
+    opponents = [numpy.vstack([dealt[k] for dealt in holes])
+                 for k in range(len(holes[0]))]
+    strengths = batchrank.evaluate_holes(
+        numpy.vstack(boards), [numpy.vstack(pholes)] + opponents)
+    player = strengths[0].reshape(len(gamestates), trials)
+    best = numpy.zeros_like(strengths[0])
+    if len(strengths) > 1:
+        best = numpy.maximum.reduce(strengths[1:])
+    best = best.reshape(len(gamestates), trials)
+    wins = numpy.count_nonzero(player > best, axis=1)
+    ties = numpy.count_nonzero(player == best, axis=1)
+    for result, won, tied in zip(results, wins, ties):
+        result[0] += int(won)
+        result[1] += int(tied)
+
+
+def choose(n, k):
+    """
+    Returns the number of ways to pick k of n things.
+    """
+    if k < 0 or k > n: return 0
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def _matchings(pairs, cards, size):
+    """
+    Takes a (P, 2) array of the pairs of positions 0..cards-1 and
+    returns an (M, size) array of pair numbers, one row for each
+    unordered set of size pairs with no position in common, pair
+    numbers increasing along a row.  Rows are grown one pair at a
+    time, tracking the positions used as a bitmask.
+    """
+    if size == 0:
+        return numpy.zeros((1, 0), dtype=numpy.intp)
+    bits = (numpy.int64(1) << pairs[:, 0]) | (numpy.int64(1) << pairs[:, 1])
+    rows = numpy.arange(len(pairs), dtype=numpy.intp).reshape(-1, 1)
+    used = bits.copy()
+    for step in range(1, size):
+        grown = []
+        grownused = []
+        for pair in range(len(pairs)):
+            fits = (rows[:, -1] < pair) & (used & bits[pair] == 0)
+            if fits.any():
+                grown.append(numpy.hstack((rows[fits], 
+                                           numpy.tile(pair, (fits.sum(), 1)))))
+                grownused.append(used[fits] | bits[pair])
+        if not grown:
+            return numpy.zeros((0, size), dtype=numpy.intp)
+        rows = numpy.vstack(grown)
+        used = numpy.concatenate(grownused)
+    return rows
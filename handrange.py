@@ -0,0 +1,268 @@
+"""
+handrange.py
+Weighted hand ranges for opponents, written in the usual notation:
+a comma separated list of
+
+    QQ        a pair                  JJ+    JJ and every higher pair
+    AKs, AKo  suited/offsuit hands    AK     both
+    ATs+      A-T suited up to A-K    KTo-K8o  K-T, K-9, K-8 offsuit
+    AhKh      one combination         random (or any)  every hand
+
+each optionally preceded by a weight, "50% AQo", the probability of
+holding those combinations relative to weight-100% ones.  Ranks are
+23456789TJQKA, suits c h s d.  A hand listed twice gets the last
+weight given.
+
+A HandRange is expanded once into its combinations (pairs of card
+indexes, see handrank.Card) and their weights, with an alias table
+over them so that a combination is drawn in O(1).  Drawing is
+conflict-aware: a combination holding a card already dealt is
+redrawn a few times, and if that keeps failing the draw falls back
+to picking directly among the combinations still possible, so a
+narrow range against a crowded table doesn't spin.
+"""
+import random
+import re
+from handrank import Card, CARDS
+from lazyimport import lazy_import
+
+numpy = lazy_import("numpy")
+
+_RANKCHARS = "23456789TJQKA"
+_SUITCHARS = "chsd"
+# Redraws of a conflicting combination before falling back to an
+# exact draw among the combinations left.
+REDRAWS = 8
+
+_TOKEN = re.compile(r"^(?:(\d+(?:\.\d*)?)%\s*)?(\S+)$")
+_HAND = re.compile(r"^([2-9TJQKA])([2-9TJQKA])([so]?)$")
+
+
+def alias_table(weights):
+    """
+    Builds Vose's alias table for a list of positive weights:
+    returns (probability, alias), lists such that picking i
+    uniformly and then keeping i with probability probability[i]
+    (alias[i] otherwise) picks i in proportion to weights[i].
+    """
+    count = len(weights)
+    total = float(sum(weights))
+    scaled = [weight * count / total for weight in weights]
+    probability = [1.0] * count
+    alias = range(count)
+    small = [i for i in range(count) if scaled[i] < 1]
+    large = [i for i in range(count) if scaled[i] >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        probability[less] = scaled[less]
+        alias[less] = more
+        scaled[more] += scaled[less] - 1
+        if scaled[more] < 1:
+            small.append(more)
+        else:
+            large.append(more)
+    return probability, alias
+
+
+def _rank(char):
+    return _RANKCHARS.index(char.upper())
+
+
+def _class_combos(high, low, kind):
+    """
+    Returns the (index, index) combinations of a hand class: a pair
+    if high == low, else suited ("s"), offsuit ("o") or both ("").
+    """
+    combos = []
+    for first in range(4):
+        for second in range(4):
+            if high == low and second <= first:
+                continue
+            if high != low and kind == "s" and first != second:
+                continue
+            if high != low and kind == "o" and first == second:
+                continue
+            combos.append((Card(high, first).index, Card(low, second).index))
+    return combos
+
+
+def _parse_hands(hand):
+    """
+    Returns the combinations of one range token (without weight).
+    """
+    upper = hand.upper()
+    if upper in ("RANDOM", "ANY"):
+        return [(CARDS[i].index, CARDS[j].index)
+                for i in range(52) for j in range(i + 1, 52)]
+    if len(hand) == 4 and hand[1] in _SUITCHARS and hand[3] in _SUITCHARS:
+        first = Card(_rank(hand[0]), _SUITCHARS.index(hand[1]))
+        second = Card(_rank(hand[2]), _SUITCHARS.index(hand[3]))
+        if first is second:
+            raise Exception, "range hand " + hand + " repeats a card"
+        return [(first.index, second.index)]
+    plus = hand.endswith("+")
+    if plus:
+        hand = hand[:-1]
+    ends = hand.split("-")
+    parsed = []
+    for end in ends:
+        match = _HAND.match(end[:2].upper() + end[2:])
+        if match is None or len(ends) > 2:
+            raise Exception, "can't parse range hand " + hand
+        high, low = _rank(match.group(1)), _rank(match.group(2))
+        parsed.append((max(high, low), min(high, low), match.group(3)))
+    high, low, kind = parsed[0]
+    if len(parsed) == 2:
+        other = parsed[1]
+        if high == low and other[0] == other[1]:
+            classes = [(r, r) for r in range(min(low, other[0]),
+                                             max(low, other[0]) + 1)]
+        elif high == other[0] and kind == other[2] and high != low:
+            classes = [(high, r) for r in range(min(low, other[1]),
+                                                max(low, other[1]) + 1)]
+        else:
+            raise Exception, "can't parse range hand " + hand
+    elif plus and high == low:
+        classes = [(r, r) for r in range(low, 13)]
+    elif plus:
+        classes = [(high, r) for r in range(low, high)]
+    else:
+        classes = [(high, low)]
+    combos = []
+    for high, low in classes:
+        combos += _class_combos(high, low, kind)
+    return combos
+
+
+class HandRange:
+    """
+    A weighted range of two card hands (see the module doc).
+    text is the range as given; combos is a list of (index, index)
+    pairs and weights their weights.  With NumPy, the same are
+    kept as arrays (comboarray, bits: each combination's two cards
+    as a 52 bit mask) for the vectorized draw, deal.
+    """
+    def __init__(self, text, combos=None):
+        self.text = text
+        if combos is None:
+            combos = self._parse(text)
+        if not combos:
+            raise Exception, "hand range " + repr(text) + " holds no hands"
+        self.combos = [combo for combo, weight in combos]
+        self.weights = [weight for combo, weight in combos]
+        self.probability, self.alias = alias_table(self.weights)
+        # Ranges written only in hand classes treat every suit alike.
+        self.symmetric = re.search(r"[2-9tjqka][chsd][2-9tjqka][chsd]",
+                                   text.lower()) is None
+        if numpy is not None:
+            self.comboarray = numpy.array(self.combos, dtype=numpy.int8)
+            cards = self.comboarray.astype(numpy.int64)
+            self.bits = (1 << cards[:, 0]) | (1 << cards[:, 1])
+            self._weightarray = numpy.array(self.weights)
+            self._probarray = numpy.array(self.probability)
+            self._aliasarray = numpy.array(self.alias, dtype=numpy.intp)
+
+    def __len__(self):
+        return len(self.combos)
+
+    def __repr__(self):
+        return "HandRange(%r)" % self.text
+
+    @staticmethod
+    def _parse(text):
+        """
+        Returns the list of (combo, weight) of a range text.
+        """
+        weights = {}
+        for token in text.split(","):
+            token = token.strip()
+            if not token:
+                continue
+            match = _TOKEN.match(token)
+            if match is None:
+                raise Exception, "can't parse range hand " + token
+            weight = 1.0
+            if match.group(1) is not None:
+                weight = float(match.group(1)) / 100
+            for first, second in _parse_hands(match.group(2)):
+                weights[(min(first, second), max(first, second))] = weight
+        return sorted([(combo, weight) for combo, weight
+                       in weights.items() if weight > 0])
+
+    def without(self, cards):
+        """
+        Returns the HandRange of the combinations holding none of
+        cards (a list of Cards), e.g. the hero's and the board's.
+        """
+        dead = set([card.index for card in cards])
+        return HandRange(self.text, [(combo, weight) for combo, weight
+                                     in zip(self.combos, self.weights)
+                                     if combo[0] not in dead and
+                                     combo[1] not in dead])
+
+    def pick(self):
+        """
+        Returns the position of a combination drawn by weight.
+        """
+        position = random.randrange(len(self.combos))
+        if random.random() < self.probability[position]:
+            return position
+        return self.alias[position]
+
+    def draw(self, deck):
+        """
+        Draws a combination whose cards are both in deck (a Deck),
+        takes them from it and returns them as a list of Cards.
+        """
+        left = set([card.index for card in deck.remaining()])
+        for x in range(REDRAWS):
+            combo = self.combos[self.pick()]
+            if combo[0] in left and combo[1] in left:
+                break
+        else:
+            possible = [(combo, weight) for combo, weight
+                        in zip(self.combos, self.weights)
+                        if combo[0] in left and combo[1] in left]
+            if not possible:
+                raise Exception, "no hand in range %r is left" % self.text
+            choice = random.random() * sum([weight for combo, weight
+                                            in possible])
+            for combo, weight in possible:
+                choice -= weight
+                if choice < 0:
+                    break
+        return [deck.take(CARDS[combo[0]]), deck.take(CARDS[combo[1]])]
+
+    def sample(self, size, rng):
+        """
+        Returns an array of size combination positions drawn by
+        weight with the numpy.random.RandomState rng.
+        """
+        positions = rng.randint(0, len(self.combos), size=size)
+        keep = rng.random_sample(size) < self._probarray[positions]
+        return numpy.where(keep, positions, self._aliasarray[positions])
+
+    def deal(self, used, rng):
+        """
+        Vectorized draw: takes an int64 array of 52 bit masks of the
+        cards already dealt in each trial and returns a (trials, 2)
+        array of card indexes drawn from the range, avoiding them.
+        The trials that conflict are redrawn REDRAWS times; the few
+        left after that draw among their possible combinations.
+        """
+        positions = self.sample(len(used), rng)
+        bad = numpy.flatnonzero(used & self.bits[positions])
+        for x in range(REDRAWS):
+            if not len(bad):
+                break
+            positions[bad] = self.sample(len(bad), rng)
+            bad = bad[(used[bad] & self.bits[positions[bad]]) != 0]
+        if len(bad):
+            possible = (used[bad][:, None] & self.bits[None, :]) == 0
+            totals = numpy.cumsum(possible * self._weightarray, axis=1)
+            if not totals[:, -1].all():
+                raise Exception, "no hand in range %r is left" % self.text
+            choice = rng.random_sample(len(bad)) * totals[:, -1]
+            positions[bad] = (totals <= choice[:, None]).sum(axis=1)
+        return self.comboarray[positions]
@@ -1,6 +1,10 @@
-from random import randrange, shuffle
+from random import shuffle
+from random import random as _random
+import evaluator
 
-class Card:
+_SUITS = {"c": 0, "h": 1, "s": 2, "d": 3}
+
+class Card(object):
     """
     Stores a rank and a suit, and defines printing
     and comparison behavior.  Cards are ranked by their
@@ -8,56 +12,164 @@ class Card:
     
     Suits must be in [0,1,2,3], defined as [clubs, hearts,
     spades, diamonds] respectively.
+
+    Cards are interned: there is exactly one Card object for
+    each (rank, suit), so Card(5, 2) is Card("5s").  Each card
+    carries index = rank * 4 + suit, an int in [0,51] for a
+    real card ([-4,-1] for the rank -1 low ace placeholders).
+    Equality and hashing go by that index (i.e. identity), so
+    list.remove and "in" find the exact card, not any card of
+    the same rank.
     """
+    __slots__ = ("rank", "suit", "index")
+
+    _registry = [None] * 56
+    _parsed = {}
+
+    def __new__(cls, *args):
+        if len(args) == 1:
+            card = cls._parsed.get(args[0])
+            if card is None:
+                card = cls._intern(int(args[0][:-1]), 
+                                   _SUITS[args[0][-1:]])
+                cls._parsed[args[0]] = card
+            return card
+        elif len(args) == 2:
+            return cls._intern(int(args[0]), int(args[1]))
+        else:
+            raise Exception, "Either give rank and suit as seperate args or a single string"
+
+    @classmethod
+    def _intern(cls, rank, suit):
+        """
+        Returns the single Card for rank and suit, creating
+        it the first time it is asked for.
+        """
+        if rank < -1 or rank > 12:
+            raise Exception, "Rank must be in range [-1,12] inclusive."
+        if suit < 0 or suit > 3:
+            raise Exception, "Suit must be in range [0,3] inclusive."
+        slot = (rank + 1) * 4 + suit
+        card = cls._registry[slot]
+        if card is None:
+            card = object.__new__(cls)
+            card.rank = rank
+            card.suit = suit
+            card.index = rank * 4 + suit
+            cls._registry[slot] = card
+        return card
+
+    def __reduce__(self):
+        return (Card, (self.rank, self.suit))
 
-    def __init__(self, *args):
-		if len(args) == 1:
-			suits = {"c": 0, "h": 1, "s": 2, "d": 3}
-			self.rank = int(args[0][:-1])
-			self.suit = int(suits[args[0][-1:]])
-		elif len(args) == 2:
-			self.rank = int(args[0])
-			self.suit = int(args[1])
-		else:
-			raise Exception, "Either give rank and suit as seperate args or a single string"
-		if self.rank not in range(-1,13):
-			raise Exception, "Rank must be in range [-1,12] inclusive."
-		if self.suit not in range(0,4):
-			raise Exception, "Suit must be in range [0,3] inclusive."
-		
     def __str__(self):
         return "[" + str(self.rank) + ", " + str(self.suit) + "]"
 
     def __repr__(self):
         return self.__str__()
 
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __hash__(self):
+        return self.index
+
     def __cmp__(self, other):
         return cmp(self.rank, other.rank)
 
 
+# The 52 real cards, ordered so that CARDS[i].index == i.
+CARDS = tuple([Card(index // 4, index % 4) for index in range(52)])
+
+
 class Deck:
     """
     A collection of cards, initialized to contain a full
     standard deck, 52 cards, with 13 of each suit, 4 of each
     rank, by convention.  
+
+    Drawn cards are not removed from self.cards: a draw swaps
+    a random undrawn card to the end of the undrawn part and moves
+    the boundary down by one (a partial Fisher-Yates shuffle), so
+    self.cards always holds every card, the last self.drawn of them
+    drawn.  mark() and rollback() save and restore that boundary,
+    putting back every card drawn in between in O(1).  With
+    nothing drawn, self.cards is exactly the cards in the deck.
     """
-    def __init__(self):
-        self.cards = []
-        for suit in range(0,4):
-            for rank in range(0,13):
-                self.cards.append(Card(rank, suit))
+    def __init__(self, exclude=()):
+        """
+        exclude is an optional collection of Cards to leave
+        out of the deck (e.g. cards already dealt).
+        """
+        if exclude:
+            exclude = set(exclude)
+            self.cards = [card for card in CARDS if card not in exclude]
+        else:
+            self.cards = list(CARDS)
+        self.drawn = 0
 
     def __str__(self):
-        return ",".join([str(card) for card in self.cards])
+        return ",".join([str(card) for card in self.remaining()])
 
     def __repr__(self):
-        return "Deck with " + str(len(self.cards)) + " left."
+        return "Deck with " + str(len(self)) + " left."
+
+    def __len__(self):
+        return len(self.cards) - self.drawn
+
+    def remaining(self):
+        """
+        Returns a list of the cards not drawn.
+        """
+        return self.cards[:len(self.cards) - self.drawn]
 
     def draw(self, numcards=1):
         """
-        Randomly removes a card from self.cards and returns it.
+        Randomly draws a card and returns it.  Raises an Exception
+        if every card has been drawn.
+        """
+        cards = self.cards
+        if self.drawn >= len(cards):
+            raise Exception, "no cards left in the deck"
+        self.drawn += 1
+        last = len(cards) - self.drawn
+        pick = int(_random() * (last + 1))
+        card = cards[pick]
+        cards[pick] = cards[last]
+        cards[last] = card
+        return card
+
+    def take(self, card):
+        """
+        Draws the given card, which must not have been drawn.
+        """
+        cards = self.cards
+        last = len(cards) - self.drawn - 1
+        pick = cards.index(card)
+        if pick > last:
+            raise Exception, str(card) + " has already been drawn"
+        cards[pick] = cards[last]
+        cards[last] = card
+        self.drawn += 1
+        return card
+
+    def mark(self):
+        """
+        Returns a checkpoint for rollback: the number of cards
+        drawn so far.
+        """
+        return self.drawn
+
+    def rollback(self, mark):
+        """
+        Puts back every card drawn since mark() returned mark.
+        Checkpoints nest: rolling back to one discards any taken
+        after it.
         """
-        return self.cards.pop(randrange(0,len(self.cards)))
+        self.drawn = mark
     
     def draw_with_rank(self, rank):
         """
@@ -88,11 +200,11 @@ class Deck:
         """
         try:
             card = None
-            shuffle(self.cards)
-            for card in self.cards:
+            undrawn = self.remaining()
+            shuffle(undrawn)
+            for card in undrawn:
                 if cond(card):
-                    self.cards.remove(card)
-                    return card
+                    return self.take(card)
             return None
         except TypeError:
             print "Error: condition passed to Deck.draw_with_cond \
@@ -102,7 +214,22 @@ class Deck:
 class Hand:
     """
 	Stores a list of cards and attributes for a rank (a number 0-9) and kickers, a list of cards representing the kickers for this hand. If not specified, rank and kickers are initialized to -1 and [] by default, until this Hand is assigned values for them (either directly or through a hand test function.)
+
+    Unranked hands are ranked with the table evaluator (see
+    evaluator.py) the first time they are compared.  Setting
+    Hand.lazy to 1 ranks them through the ranking tests instead
+    (ALLTESTS, or those of Hand.testclass if set; BitHandTests is
+    a drop-in that works on rank bitmasks), running only as many
+    as a comparison needs.  A hand only keeps count of the tests
+    it has run.
+
+    If Hand.stats is set (see simstats.SimulationStats.watch_hands)
+    every comparison and every ranking test run is counted into it.
     """
+    lazy = 0
+    testclass = None
+    stats = None
+
     def __init__(self, cards, rank=-1, kickers=[]):
         for card in cards:
             if card.__class__ != Card:
@@ -110,7 +237,8 @@ class Hand:
         self.cards = cards
         self.rank = rank
         self.kickers = kickers
-        self.reset_test_stack()
+        self._strength = None
+        self._untested = len(ALLTESTS)
         
     def __str__(self):
         ret = "[Hand: {"
@@ -167,21 +295,71 @@ class Hand:
         if self.rank >= 0: return 1
         else: return 0
 
+    def strength(self):
+        """
+        Returns the evaluator strength of this hand (see
+        evaluator.py), computing it on the first call.  Also sets
+        self.rank and self.kickers to match it.  Strengths order
+        hands as comparing them does, category first and then
+        kickers, and are equal exactly when the hands tie.
+        """
+        if self._strength is None:
+            self._strength = evaluator.evaluate_cards(self.cards)
+            self.rank, ranks = evaluator.decode(self._strength)
+            self.kickers = self.kicker_cards(ranks)
+        return self._strength
+
+    def kicker_cards(self, ranks):
+        """
+        Takes a list of kicker ranks (as given by evaluator.decode)
+        and returns the cards of this hand that make them up, with
+        the flush suit preferred when self.rank is a flush.  The
+        low ace of a wheel is returned as Card(-1, ace's suit).
+        """
+        cards = self.cards[:]
+        if self.rank in (evaluator.FLUSH, evaluator.SF, evaluator.RSF):
+            suitcounts = [0, 0, 0, 0]
+            for card in cards:
+                suitcounts[card.suit] += 1
+            flushsuit = suitcounts.index(max(suitcounts))
+            cards = [card for card in cards if card.suit == flushsuit]
+        kickers = []
+        for rank in ranks:
+            for card in cards:
+                if card.rank == rank or (rank == -1 and card.rank == 12):
+                    cards.remove(card)
+                    if rank == -1:
+                        card = Card(-1, card.suit)
+                    kickers.append(card)
+                    break
+        return kickers
+
     def __cmp__(self, other):
-		"""
-		Hand comparison will only run as many tests as needed
-		to determine which hand has a higher rank.  If ranks
-		are equal, kickers are compared by ascending index.
-		"""
-		try:
-			if self.isranked() and other.isranked():
-				return self.cmp_ranked(other)
-			elif self.isranked() or other.isranked():
-				return self.cmp_ranked_unranked(other)
-			else:
-				return self.cmp_unranked(other)
-		except AttributeError:
-			print "comparing hand to something not hand"
+        """
+        Unless Hand.lazy is set, unranked hands are ranked with the
+        table evaluator and hands with strengths compare by them.
+        Hands whose rank was assigned directly compare by rank and
+        then kickers by ascending index.
+
+        With Hand.lazy set, comparison will only run as many tests
+        as needed to determine which hand has a higher rank.
+        """
+        if self.stats is not None:
+            self.stats.comparisons += 1
+        try:
+            if not self.lazy:
+                if not self.isranked(): self.strength()
+                if not other.isranked(): other.strength()
+                if self._strength is not None and other._strength is not None:
+                    return cmp(self._strength, other._strength)
+            if self.isranked() and other.isranked():
+                return self.cmp_ranked(other)
+            elif self.isranked() or other.isranked():
+                return self.cmp_ranked_unranked(other)
+            else:
+                return self.cmp_unranked(other)
+        except AttributeError:
+            print "comparing hand to something not hand"
             
     def cmp_unranked(self, other):
 		"""
@@ -194,19 +372,19 @@ class Hand:
 		the same rank, the return is a call to hand.__cmp__
 		(which will then call Hand.cmp_ranked)
 		"""
-		if len(self.test_stack) != len(other.test_stack):
-			if len(self.test_stack) > len(other.test_stack):
+		if self._untested != other._untested:
+			if self._untested > other._untested:
 				moretestshand = self
 			else:
 				moretestshand = other
-			while len(self.test_stack) != len(other.test_stack):
+			while self._untested != other._untested:
 				(passed, rank, kickers) = moretestshand.run_next_test()
 				if passed:
 					moretestshand.rank = rank
 					moretestshand.kickers = kickers
-					if moretesthand is self: return 1
+					if moretestshand is self: return 1
 					else: return -1
-		while len(self.test_stack) > 0:
+		while self._untested > 0:
 			(selfpass, srank, skickers) = self.run_next_test()
 			(otherpass, orank, okickers) = other.run_next_test()
 			if selfpass:
@@ -235,7 +413,7 @@ class Hand:
         else:
             unranked = self
             ranked = other
-        while len(unranked.test_stack) > ranked.rank:
+        while unranked._untested > ranked.rank:
             (passed, rank, kickers) = unranked.run_next_test()
             if passed:
                 unranked.rank = rank
@@ -246,18 +424,21 @@ class Hand:
 
     def run_next_test(self):
         """
-        Takes the next test function off the stack and returns it.
+        Runs the next ranking test this hand hasn't run, in order
+        of descending rank, and returns its result.
         (see Hand.reset_test_stack)
         """
-        return self.test_stack.pop()(self)
+        tests = _lazy_tests(self.testclass)
+        if self.stats is not None:
+            self.stats.tests += 1
+        self._untested -= 1
+        return tests[len(tests) - 1 - self._untested](self)
 
     def reset_test_stack(self):
         """
-        Creates a new HandTest() object and stores its alltests_inorder
-        attribute locally.
+        Marks every ranking test as not yet run on this hand.
         """
-        self.test_stack = HandTests().alltests_inorder
-        self.test_stack.reverse()
+        self._untested = len(ALLTESTS)
 
     def cmp_ranked(self, other):
         """
@@ -278,191 +459,408 @@ class Hand:
             return 0
         except IndexError:
             print "2 hands with same rank have unequal len(kickers)."
+
+
+def showdown(hands):
+    """
+    Takes a list of Hands and returns the positions in it of the
+    ones holding the best hand: one for an outright win, several
+    for a split pot.  Each hand is scored once (Hand.strength, an
+    integer ordered like the hands), so this takes one pass over
+    the list instead of comparing hands pairwise, and equal hands
+    are told apart from unequal ones exactly.
+    """
+    strengths = [hand.strength() for hand in hands]
+    best = max(strengths)
+    return [number for number, strength in enumerate(strengths)
+            if strength == best]
             
             
             
+# The ranking engine: one shared, stateless set of test functions.
+# Each takes an instance of Hand and returns a 3-tuple consisting of:
+# - An int, 0 or 1 depending on whether the hand passed the test,
+# - An int, the rank of the hand that was found.
+# - A list of Cards, the kickers for that hand.
+# If the hand passes the test, the rank and kickers in the return
+# reflect the newfound rank.  Otherwise the originals are returned
+# unchanged.  None of them keep state between calls or build Hands.
+
+def _flushcards(cards):
+    """
+    Returns the cards of the suit holding five or more of cards,
+    highest first, or None.
+    """
+    suit = evaluator.flush_suit([card.index for card in cards])
+    if suit < 0:
+        return None
+    flushcards = [card for card in cards if card.suit == suit]
+    flushcards.sort(); flushcards.reverse()
+    return flushcards
+
+def _straightcards(cards):
+    """
+    Returns the five cards of the highest straight in cards,
+    highest first (a wheel's ace as Card(-1, suit), last), or None.
+    """
+    cards = cards[:]
+    cards.sort()
+    cards.reverse()
+    prevrank = cards[0].rank
+    straightcards = [cards[0]]
+    for index in range(1, len(cards)):
+        currentrank = cards[index].rank
+        if prevrank - currentrank == 1:
+            straightcards.append(cards[index])
+            if len(straightcards) == 5: break
+        elif prevrank - currentrank > 1:
+            straightcards = [cards[index]]    
+        prevrank = currentrank
+    # A wheel (5-4-3-2-A) plays the ace, sorted first, low.
+    if (len(straightcards) == 4 and straightcards[-1].rank == 0
+        and cards[0].rank == 12):
+        straightcards.append(Card(-1, cards[0].suit))
+    if len(straightcards) == 5:
+        return straightcards
+    return None
+
+def flushtest(hand):
+    """
+    Determines if the hand param has a flush.
+    """
+    flushcards = _flushcards(hand.cards)
+    if flushcards:
+        return 1, 5, flushcards[:5]
+    return 0, hand.rank, hand.kickers
+
+def straighttest(hand):
+    """
+    Determines if the hand param has a straight.
+    """
+    straightcards = _straightcards(hand.cards)
+    if straightcards:
+        return 1, 4, straightcards
+    return 0, hand.rank, hand.kickers
+
+def rsftest(hand, royal=1):
+    """
+    Determines if the hand param has a straight flush, a royal
+    one unless royal is 0.
+    """
+    flushcards = _flushcards(hand.cards)
+    if flushcards:
+        straightcards = _straightcards(flushcards)
+        if straightcards:
+            if not royal:
+                return 1, 8, straightcards
+            if straightcards[0].rank == 12:
+                return 1, 9, straightcards
+    return 0, hand.rank, hand.kickers
+
+def sftest(hand):
+    """
+    Determines if the hand param has a straight flush (royal or
+    not; the lazy comparison runs rsftest first).
+    """
+    return rsftest(hand, royal=0)
+
+def quadstest(hand): 
+    """
+    Determines if the hand param has four of a kind.
+    """
+    return sequencetest(hand, [4], 7)
+
+def boattest(hand): 
+    """
+    Determines if the hand param has a full house/boat.
+    """    
+    return sequencetest(hand, [3, 2], 6)
+
+def tripstest(hand): 
+    """
+    Determines if the hand param has three of a kind.
+    """
+    return sequencetest(hand, [3], 3)
+
+def twopairtest(hand): 
+    """
+    Determines if the hand param has two pair.
+    """
+    return sequencetest(hand, [2, 2], 2)
+
+def pairtest(hand): 
+    """
+    Determines if the hand param has a pair.
+    """        
+    return sequencetest(hand, [2], 1)
+
+def highcard(hand): 
+    """
+    Returns the rank and kickers for the highest
+    cards in order for the hand.
+    """        
+    kickers = hand.cards[:]
+    kickers.sort()
+    kickers.reverse()
+    return 1, 0, kickers[:5]
+
+def sequencetest(hand, sizes, handrank):
+    """
+    Tests if the hand contains the sequences specified
+    in the params. sizes is a list of ints, each one 
+    representing the length of a sequence, longest first.  So,
+    sizes = [3] tests for three-kind, sizes = [3,2]
+    tests for a boat, etc.
+    handrank is the rank that goes to a hand that
+    fulfills the sequence specs.
+    """
+    cards = hand.cards[:]
+    counts = [0] * 13
+    for card in cards:
+        counts[card.rank] += 1
+    kickers = []
+    used = []
+    for size in sizes:
+        maxrank = -1
+        for rank in range(12, -1, -1):
+            if counts[rank] >= size and rank not in used:
+                maxrank = rank
+                break
+        if maxrank < 0:
+            return 0, hand.rank, hand.kickers
+        used.append(maxrank)
+        for card in [card for card in cards if card.rank == maxrank][:size]:
+            kickers.append(card)
+            cards.remove(card)
+    while len(kickers) < 5: 
+        kickers.append(max(cards))
+        cards.remove(kickers[-1])
+    return 1, handrank, kickers[:5]
+
+# The tests in order of descending rank.
+ALLTESTS = (rsftest, sftest, quadstest, boattest, flushtest, 
+            straighttest, tripstest, twopairtest, pairtest, highcard)
+
+# Hand.testclass -> its tests in order of descending rank, taken
+# from one shared instance.
+_classtests = {}
+
+def _lazy_tests(testclass):
+    if testclass is None:
+        return ALLTESTS
+    tests = _classtests.get(testclass)
+    if tests is None:
+        tests = _classtests[testclass] = tuple(testclass().alltests_inorder)
+    return tests
+
+
 class HandTests:
     """
-    A collection of tests to run on hands to determine their
-    rank (and kickers).
+    The ranking tests (see ALLTESTS) gathered as methods, for 
+    callers that pick tests off an instance.  It holds no state,
+    so one instance serves any number of hands.
     
     Has only one data attribute: alltests_inorder, a list of 
-    member functions in order of descending rank (associated
+    the test functions in order of descending rank (associated
     with the hand rank they are testing.)
-    
-    Each function takes an instance of Hand, and returns a 
-    3-tuple consiting of:
-    - An int, 0 or 1 depending on whether the hand passed the test,
-    - An int, the rank of the hand that was found.
-    - A list of Cards, the kickers for that hand.
-    If the hand passes the test, the rank and kickers in the return
-    reflect the newfound rank.  Otherwise the originals are returned
-    unchanged.
     """
+    flushtest = staticmethod(flushtest)
+    straighttest = staticmethod(straighttest)
+    rsftest = staticmethod(rsftest)
+    sftest = staticmethod(sftest)
+    quadstest = staticmethod(quadstest)
+    boattest = staticmethod(boattest)
+    tripstest = staticmethod(tripstest)
+    twopairtest = staticmethod(twopairtest)
+    pairtest = staticmethod(pairtest)
+    highcard = staticmethod(highcard)
+    sequencetest = staticmethod(sequencetest)
 
     def __init__(self):
-        self.sffound = None
         self.alltests_inorder = [self.rsftest, self.sftest, 
                                  self.quadstest, self.boattest,
                                  self.flushtest, self.straighttest,
                                  self.tripstest, self.twopairtest,
                                  self.pairtest, self.highcard]
 
+
+# Number of set bits in each 13 bit rank mask.
+_POPCOUNT = [bin(mask).count("1") for mask in range(1 << 13)]
+
+
+def _ranks_desc(mask):
+    """
+    Returns the ranks set in a rank mask, highest first.
+    """
+    ranks = []
+    while mask:
+        rank = mask.bit_length() - 1
+        ranks.append(rank)
+        mask ^= 1 << rank
+    return ranks
+
+
+def _straight_high(mask):
+    """
+    Returns the highest rank of the best straight in a rank mask
+    (3 for a wheel), or -1.  The mask is shifted up one bit with
+    the ace copied into bit 0, so bit b of run is set when ranks
+    b-1 through b+3 are all held.
+    """
+    low = (mask << 1) | (mask >> 12)
+    run = low & (low >> 1) & (low >> 2) & (low >> 3) & (low >> 4)
+    if run:
+        return run.bit_length() + 2
+    return -1
+
+
+class BitHandTests(HandTests):
+    """
+    A drop-in for HandTests (same tests, same return values, see
+    the comment above ALLTESTS) that works on bitboards instead of sorted
+    Card lists: a 13 bit rank mask per suit plus a 13 bit mask of
+    the ranks held at least once, twice, three and four times.
+    Straights are a mask-and-shift check, flushes a popcount and
+    pairs/trips/quads the top bits of the count masks.  It uses no
+    lookup tables beyond a popcount list, and like HandTests
+    holds no state.
+
+    Use it for the lazy comparison path by setting
+    Hand.testclass = BitHandTests.
+    """
+
+    def bitboard(self, hand):
+        """
+        Returns (suitmasks, countmasks) for the hand param, where
+        suitmasks[suit] has bit r set if the hand holds rank r in
+        that suit and countmasks[n - 1] has bit r set if it holds
+        rank r at least n times.
+        """
+        suitmasks = [0, 0, 0, 0]
+        countmasks = [0, 0, 0, 0]
+        for card in hand.cards:
+            bit = 1 << card.rank
+            suitmasks[card.suit] |= bit
+            for n in range(4):
+                if not countmasks[n] & bit:
+                    countmasks[n] |= bit
+                    break
+        return suitmasks, countmasks
+
+    def cards_of(self, suitmasks, rank, number=1):
+        """
+        Returns number Cards of the given rank from distinct suits
+        held in suitmasks.  Rank -1 (a wheel's low ace) gets the
+        suit of an ace.
+        """
+        bit = 1 << (rank % 13)
+        cards = []
+        for suit in range(4):
+            if suitmasks[suit] & bit:
+                cards.append(Card(rank, suit))
+                if len(cards) == number: break
+        return cards
+
+    def straight_kickers(self, suitmasks, high):
+        kickers = []
+        for rank in range(high, high - 5, -1):
+            kickers += self.cards_of(suitmasks, rank)
+        return kickers
+
     def flushtest(self, hand):
         """
         Determines if the hand param has a flush.
-        (See HandTest.__doc__ for more details.)
+        (See the comment above ALLTESTS for more details.)
         """
-        suitcounts = [0, 0, 0, 0]
-        for card in hand.cards:
-            suitcounts[card.suit] += 1
-        for suit in range(0,4):
-            if suitcounts[suit] >= 5:
-                rank = 5
-                flushcards = [card for card in hand.cards 
-                                if card.suit == suit]
-                kickers = flushcards
-                kickers.sort(); kickers.reverse()
-                kickers = kickers[:5]
-                return 1, rank, kickers
+        suitmasks = self.bitboard(hand)[0]
+        for suit in range(4):
+            if _POPCOUNT[suitmasks[suit]] >= 5:
+                ranks = _ranks_desc(suitmasks[suit])[:5]
+                return 1, 5, [Card(rank, suit) for rank in ranks]
         return 0, hand.rank, hand.kickers
-    
+
     def straighttest(self, hand):
-        """(or cards if numcards is given),
-        
+        """
         Determines if the hand param has a straight.
-        (See HandTest.__doc__ for more details.)
-        """
-        cards = hand.cards[:]
-        cards.sort()
-        cards.reverse()
-        prevrank = cards[0].rank
-        acefound = 0
-        straightcards = [cards[0]]
-        for index in range(1, len(cards)):
-            currentrank = cards[index].rank
-            if currentrank == 12: acefound = 1
-            if (prevrank - currentrank == 1 or 
-                (currentrank == 0 and acefound)):
-                straightcards.append(cards[index])
-                if len(straightcards) == 5: break
-            elif prevrank - currentrank > 1:
-                straightcards = [cards[index]]    
-            prevrank = currentrank
-        if len(straightcards) == 5:
-            rank = 4
-            kickers = straightcards
-            if kickers[1].rank == 0:
-                kickers = straightcards[1:] + [Card(-1, straightcards[0].suit)]
-            return 1, rank, kickers
-        else:
-            return 0, hand.rank, hand.kickers
-        
-    def rsftest(self, hand, royal=1): 
-        """
-        Determines if the hand param has a straight flush.
-        (See HandTest.__doc__ for more details.)
-        """
-        (passed, rank, kickers) = self.flushtest(hand)
-        if passed:
-            flushsuit = kickers[0].suit
-            cards = [c for c in hand.cards if c.suit == flushsuit]
-            (spassed, srank, skickers) = self.straighttest(Hand(cards))
-            if spassed:
-                if not royal:
-                    return 1, 8, skickers
-                else:
-                    self.sffound = 1, 8, skickers 
-                if skickers[0].rank == 12:
-                    return 1, 9, skickers
+        (See the comment above ALLTESTS for more details.)
+        """
+        suitmasks, countmasks = self.bitboard(hand)
+        high = _straight_high(countmasks[0])
+        if high >= 0:
+            return 1, 4, self.straight_kickers(suitmasks, high)
         return 0, hand.rank, hand.kickers
-    
-    def sftest(self, hand):
-        if self.sffound != None: return self.sffound
-        if len(hand.test_stack) == 10:
-            return self.rsftest(hand, royal=0)
+
+    def rsftest(self, hand, royal=1):
+        """
+        Determines if the hand param has a straight flush (a royal
+        one unless royal is 0).
+        (See the comment above ALLTESTS for more details.)
+        """
+        suitmasks = self.bitboard(hand)[0]
+        for suit in range(4):
+            if _POPCOUNT[suitmasks[suit]] >= 5:
+                high = _straight_high(suitmasks[suit])
+                if high == 12 or (high >= 0 and not royal):
+                    kickers = [Card(rank, suit) for rank 
+                               in range(high, high - 5, -1)]
+                    if royal: return 1, 9, kickers
+                    return 1, 8, kickers
         return 0, hand.rank, hand.kickers
-    
-    def boattest(self, hand): 
-        """
-        Determines if the hand param has a full house/boat.
-        (See HandTest.__doc__ for more details.)
-        """    
-        return self.sequencetest(hand, [2, 3], 6)
-        
-    def quadstest(self, hand): 
-        """
-        Determines if the hand param has four of a kind.
-        (See HandTest.__doc__ for more details.)
-        """
+
+    def sftest(self, hand):
+        return self.rsftest(hand, royal=0)
+
+    def quadstest(self, hand):
         return self.sequencetest(hand, [4], 7)
-    
-    def tripstest(self, hand): 
-        """
-        Determines if the hand param has three of a kind.
-        (See HandTest.__doc__ for more details.)
-        """
+
+    def boattest(self, hand):
+        return self.sequencetest(hand, [3, 2], 6)
+
+    def tripstest(self, hand):
         return self.sequencetest(hand, [3], 3)
-    
-    def twopairtest(self, hand): 
-        """
-        Determines if the hand param has two pair.
-        (See HandTest.__doc__ for more details.)
-        """
+
+    def twopairtest(self, hand):
         return self.sequencetest(hand, [2, 2], 2)
-    
-    def pairtest(self, hand): 
-        """
-        Determines if the hand param has a pair.
-        (See HandTest.__doc__ for more details.)
-        """        
+
+    def pairtest(self, hand):
         return self.sequencetest(hand, [2], 1)
-        
-    def highcard(self, hand): 
-        """
-        Returns the rank and kickers for the highest
-        cards in order for the hand.
-        (See HandTest.__doc__ for more details.)
-        """        
-        kickers = hand.cards[:]
-        kickers.sort()
-        kickers.reverse()
-        return 1, 0, kickers[:5]
-    
-    
+
     def sequencetest(self, hand, sizes, handrank):
         """
         Tests if the hand contains the sequences specified
-        in the params. sizes is a list of ints, each one 
-        representing the length of a sequence.  So,
-        sizes = [3] tests for three-kind, sizes = [2,3]
-        tests for a boat, etc.
-        handrank is the rank that goes to a hand that
-        fulfills the sequence specs.
-        """
-        # the reverse ordering of sizes here is so that
-        # we test the long sequences first, which are far
-        # more likely to fail (and we return early).
-        sizes.sort()
-        sizes.reverse()
-        cards = hand.cards[:]
-        counts = Hand(cards).countranks()
+        in the params (see HandTests.sequencetest), taking each
+        sequence from the highest rank in the count mask for its
+        size that is not already used.
+        """
+        suitmasks, countmasks = self.bitboard(hand)
+        sizes = sorted(sizes, reverse=True)
+        used = 0
         kickers = []
         for size in sizes:
-            maxrank = -1
-            for rank, count in zip(range(13), counts):
-                if (count >= size and 
-                (rank not in [card.rank for card in kickers])):
-                    maxrank = rank
-            if maxrank >= 0: 
-                for card in cards[:]:
-                    if card.rank == maxrank:
-                        kickers.append(card)
-                        cards.remove(card)
-            else: return 0, hand.rank, hand.kickers
-        while len(kickers) < 5: kickers.append(max(cards))
-        return 1, handrank, kickers[:5]
-                    
-            
-        
-            
+            mask = countmasks[size - 1] & ~used
+            if not mask: 
+                return 0, hand.rank, hand.kickers
+            rank = mask.bit_length() - 1
+            used |= 1 << rank
+            kickers += self.cards_of(suitmasks, rank, size)
+        for rank in _ranks_desc(countmasks[0] & ~used):
+            if len(kickers) == 5: break
+            kickers += self.cards_of(suitmasks, rank, 5 - len(kickers))
+        if len(kickers) < 5:
+            # Only cards of the sequences' ranks are left.
+            rest = [card for card in hand.cards if card not in kickers]
+            rest.sort(key=lambda card: card.rank, reverse=True)
+            kickers += rest[:5 - len(kickers)]
+        return 1, handrank, kickers
+
+    def highcard(self, hand):
+        """
+        Returns the rank and kickers for the highest
+        cards in order for the hand.
+        (See the comment above ALLTESTS for more details.)
+        """
+        suitmasks, countmasks = self.bitboard(hand)
+        kickers = []
+        for rank in _ranks_desc(countmasks[0])[:5]:
+            kickers += self.cards_of(suitmasks, rank)
+        return 1, 0, kickers
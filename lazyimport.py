@@ -0,0 +1,60 @@
+"""
+lazyimport.py
+Modules imported the first time they are used.  NumPy alone costs
+more to import than the rest of the package, and a process that
+only answers from a table or a store never needs it, so the
+modules that use it bind
+
+    numpy = lazy_import("numpy")
+
+in place of a guarded import: the name is None, as before, when
+the module isn't installed, and otherwise a LazyModule that imports
+it on the first attribute lookup.
+"""
+import imp
+import sys
+
+
+class LazyModule:
+    """
+    Stands in for the module name until one of its attributes is
+    looked up, then imports it and forwards every lookup to it.
+    """
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            __import__(self._name)
+            module = self.__dict__["_module"] = sys.modules[self._name]
+        return module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __repr__(self):
+        return "<lazy module %r%s>" % (self._name, "" if self._module is None
+                                       else " (imported)")
+
+
+def lazy_import(name):
+    """
+    Returns the module name if it is already imported, None if it
+    can't be found, else a LazyModule for it.  Only top level
+    modules can be found this way.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    try:
+        found = imp.find_module(name)
+    except ImportError:
+        return None
+    if found[0] is not None:
+        found[0].close()
+    return LazyModule(name)
+
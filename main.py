@@ -2,16 +2,57 @@ from gamestate import GameState
 from strategy import *
 from handrank import *
 import sys
+import getopt
 
-args = sys.argv[1:]
+if sys.argv[1:2] == ["batch"]:
+    import batch
+    batch.main(sys.argv[2:])
+    sys.exit()
+if sys.argv[1:2] == ["serve"]:
+    import server
+    server.main(sys.argv[2:])
+    sys.exit()
+if sys.argv[1:2] == ["bench"]:
+    import benchmark
+    benchmark.main(sys.argv[2:])
+    sys.exit()
+
+opts, args = getopt.gnu_getopt(sys.argv[1:], "",
+                               ["workers=", "seed=", "store=", "range=",
+                                "estimator=", "stats="])
+ranges = [value for opt, value in opts if opt == "--range"]
+opts = dict(opts)
+workers = int(opts.get("--workers", 1))
+seed = opts.get("--seed")
+if seed is not None: seed = int(seed)
 pcards = [Card(args[0]), Card(args[1])]
 opponents = int(args[2])
 board = [Card(arg) for arg in args[3:-2]]
 pot = float(args[-2])
 minbet = float(args[-1])
-gs = GameState(pcards, opponents, board, pot, minbet)
-strat = BetStrategy(accuracy=1000)
+if (ranges and opts.get("--estimator") and estimators is not None and
+        opts["--estimator"] in estimators.UNRANGED):
+    ranged = [name for name in sorted(estimators.ESTIMATORS)
+              if name not in estimators.UNRANGED]
+    print ("usage: --estimator=%s can't be used with --range; "
+           "use one of %s" % (opts["--estimator"], ", ".join(ranged)))
+    sys.exit(2)
+ranges += [None] * (opponents - len(ranges))
+gs = GameState(pcards, opponents, board, pot, minbet, ranges)
+store = None
+if "--store" in opts:
+    from resultstore import ResultStore
+    store = ResultStore(opts["--store"])
+stats = None
+if "--stats" in opts:
+    from simstats import SimulationStats
+    stats = SimulationStats()
+strat = BetStrategy(accuracy=1000, workers=workers, seed=seed, store=store,
+                    estimator=opts.get("--estimator"), stats=stats)
 strat.analyze_gamestate(gs)
+strat.close()
+if store is not None: store.close()
+if stats is not None: stats.dump(opts["--stats"])
 print "EV = " + str(strat.recommended_bet)
 
 
@@ -0,0 +1,221 @@
+"""
+preflop.py
+Precomputed preflop equities.  Before the flop only the ranks of
+the hole cards and whether they are suited matter, so there are 169
+hole card classes; for each of them and 1-9 opponents the table
+holds the probability of winning or tying (what
+BetStrategy._find_probability_of_win estimates).
+
+The table is built offline, in shards that can run on separate
+machines and resume after being interrupted:
+
+    python preflop.py build --shard 0/4 --games 1000000
+    ...
+    python preflop.py build --shard 3/4 --games 1000000
+    python preflop.py merge --shards 4
+
+Each shard appends one line per finished cell to its own progress
+file (TABLE.shardIofN), skipping cells already there when restarted;
+merge writes the binary table, TABLE, from the progress files.
+
+The table file is a header (magic, version, opponents per class,
+games per cell) followed by 169 * MAXOPPONENTS little-endian
+float32 equities, and is read through mmap, so loading it costs
+nothing up front and a lookup is one unpack.
+"""
+import os
+import sys
+import mmap
+import struct
+from handrank import Card
+
+MAXOPPONENTS = 9
+CLASSES = 169
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "preflop.bin")
+
+_MAGIC = "PFEQ"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+_CELL = struct.Struct("<f")
+
+
+def hand_class(pcards):
+    """
+    Returns the class (0-168) of two hole cards: the cell of a
+    13x13 grid at (high rank, low rank) if they are suited, (low,
+    high) if not, and (rank, rank) for a pair.
+    """
+    first, second = pcards
+    high = max(first.rank, second.rank)
+    low = min(first.rank, second.rank)
+    if first.suit == second.suit:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def class_cards(handclass):
+    """
+    Returns a pair of Cards belonging to the given class.
+    """
+    row, column = divmod(handclass, 13)
+    if row > column:
+        return [Card(row, 0), Card(column, 0)]
+    return [Card(column, 0), Card(row, 1)]
+
+
+def cell(handclass, opponents):
+    """
+    Returns the position of (handclass, opponents) in the table.
+    """
+    return handclass * MAXOPPONENTS + opponents - 1
+
+
+class PreflopTable:
+    """
+    A memory mapped preflop equity table (see the module doc).
+    """
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+        magic, version, maxopponents, games = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != _VERSION:
+            raise Exception, path + " is not a preflop equity table"
+        if len(self._map) != _HEADER.size + CLASSES * maxopponents * 4:
+            raise Exception, path + " is truncated"
+        self.maxopponents = maxopponents
+        self.games = games
+
+    def lookup(self, pcards, opponents):
+        """
+        Returns the table's equity for hole cards pcards against
+        opponents opponents, or None if it has no such entry.
+        """
+        if not 1 <= opponents <= self.maxopponents:
+            return None
+        position = (hand_class(pcards) * self.maxopponents + opponents - 1)
+        return _CELL.unpack_from(self._map, _HEADER.size + 4 * position)[0]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+_default = None
+
+
+def default_table():
+    """
+    Returns the PreflopTable at DEFAULT_PATH, opened on first use,
+    or None if there is no such file.
+    """
+    global _default
+    if _default is None and os.path.exists(DEFAULT_PATH):
+        _default = PreflopTable(DEFAULT_PATH)
+    return _default
+
+
+def write_table(path, equities, games):
+    """
+    Writes a table file from a list of CLASSES * MAXOPPONENTS
+    equities (indexed by cell).  The file is written next to path
+    and renamed over it, so readers never see a partial table.
+    """
+    partial = path + ".partial"
+    out = open(partial, "wb")
+    out.write(_HEADER.pack(_MAGIC, _VERSION, MAXOPPONENTS, games))
+    for equity in equities:
+        out.write(_CELL.pack(equity))
+    out.close()
+    os.rename(partial, path)
+
+
+def _progress_path(path, shard, shards):
+    return "%s.shard%dof%d" % (path, shard, shards)
+
+
+def _read_progress(progress):
+    """
+    Returns {cell: (wins, ties, games)} from a shard progress file,
+    ignoring a last line cut short by an interruption.
+    """
+    done = {}
+    if not os.path.exists(progress):
+        return done
+    for line in open(progress):
+        fields = line.split()
+        if len(fields) == 4 and line.endswith("\n"):
+            done[int(fields[0])] = tuple([int(field) for field in fields[1:]])
+    return done
+
+
+def build_shard(path, shard, shards, games, seed=0):
+    """
+    Computes every cell whose number is shard modulo shards with
+    games vectorized simulations each, appending each result to the
+    shard's progress file as it finishes.  Cells already in the
+    file are skipped, so an interrupted build resumes.  Every cell
+    has its own random stream, seeded from (seed, cell).
+    """
+    import numpy
+    from gamestate import GameState
+    progress = _progress_path(path, shard, shards)
+    done = _read_progress(progress)
+    out = open(progress, "a")
+    for number in range(shard, CLASSES * MAXOPPONENTS, shards):
+        if number in done:
+            continue
+        handclass, opponents = divmod(number, MAXOPPONENTS)
+        gs = GameState(class_cards(handclass), opponents + 1, [], 0, 0)
+        rng = numpy.random.RandomState([seed, number])
+        wins, ties = gs.count_outcomes(games, rng)
+        out.write("%d %d %d %d\n" % (number, wins, ties, games))
+        out.flush()
+    out.close()
+
+
+def merge(path, shards):
+    """
+    Writes the table at path from the progress files of shards
+    shards.  Raises an Exception naming the first missing cell if
+    the shards aren't finished.
+    """
+    results = {}
+    for shard in range(shards):
+        results.update(_read_progress(_progress_path(path, shard, shards)))
+    equities = []
+    for number in range(CLASSES * MAXOPPONENTS):
+        if number not in results:
+            raise Exception, "cell %d has not been computed" % number
+        wins, ties, games = results[number]
+        equities.append(float(wins + ties) / games)
+    write_table(path, equities, min([result[2] for result
+                                     in results.values()]))
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the preflop "
+                                     "equity table.")
+    parser.add_argument("command", choices=["build", "merge"])
+    parser.add_argument("--out", default=DEFAULT_PATH)
+    parser.add_argument("--shard", default="0/1",
+                        help="I/N: build cells I, I+N, I+2N...")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="number of shards to merge")
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        shard, shards = [int(part) for part in args.shard.split("/")]
+        build_shard(args.out, shard, shards, args.games, args.seed)
+        if shards == 1:
+            merge(args.out, 1)
+    else:
+        merge(args.out, args.shards)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
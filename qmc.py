@@ -0,0 +1,131 @@
+"""
+qmc.py
+Randomized quasi-Monte Carlo points: Sobol' sequences, scrambled.
+
+A Sobol' sequence fills the unit cube far more evenly than random
+points (each coordinate of the first 2**k points hits each of 2**k
+equal intervals exactly once, and so do pairs, triples... at
+coarser resolutions), so averages over it converge closer to 1/N
+than to 1/sqrt(N) when the integrand is regular enough.  Each
+SobolSequence is scrambled with a random linear scramble of the
+digits and a random digital shift (Matousek), which keeps those
+properties but makes every point uniformly distributed: averages
+over a sequence are unbiased, and independent scramblings are
+independent replicates whose spread gives the error bar.
+
+Direction numbers are Joe and Kuo's (new-joe-kuo-6.21201) for the
+first MAXDIMENSIONS dimensions.  Needs NumPy.
+"""
+import numpy
+
+BITS = 32
+# (degree, polynomial coefficients, initial direction numbers) of
+# dimensions 2 and up; dimension 1 is the van der Corput sequence.
+_DIRECTIONS = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+    (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]),
+    (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]),
+    (7, 4, [1, 3, 7, 13, 13, 15, 69]),
+    (7, 7, [1, 1, 3, 13, 7, 35, 63]),
+    (7, 8, [1, 3, 5, 9, 1, 25, 53]),
+    (7, 14, [1, 3, 1, 13, 9, 35, 107]),
+    (7, 19, [1, 3, 1, 5, 27, 61, 31]),
+    (7, 21, [1, 1, 5, 11, 19, 41, 61]),
+    (7, 28, [1, 3, 5, 3, 3, 13, 69]),
+    (7, 31, [1, 1, 7, 13, 1, 19, 1]),
+    (7, 32, [1, 3, 7, 5, 13, 19, 59]),
+    (7, 37, [1, 1, 3, 9, 25, 29, 41]),
+    (7, 41, [1, 3, 5, 13, 23, 1, 55]),
+    (7, 42, [1, 3, 7, 3, 13, 59, 17]),
+]
+MAXDIMENSIONS = len(_DIRECTIONS) + 1
+
+
+def direction_numbers(dimension):
+    """
+    Returns the BITS direction numbers of a dimension (0-based) as
+    ints, the first digit in the most significant bit.
+    """
+    if dimension == 0:
+        return [1 << (BITS - 1 - bit) for bit in range(BITS)]
+    degree, coefficients, initial = _DIRECTIONS[dimension - 1]
+    numbers = list(initial)
+    for bit in range(degree, BITS):
+        number = numbers[bit - degree] ^ (numbers[bit - degree] << degree)
+        for k in range(1, degree):
+            if (coefficients >> (degree - 1 - k)) & 1:
+                number ^= numbers[bit - k] << k
+        numbers.append(number)
+    return [number << (BITS - 1 - bit) for bit, number in enumerate(numbers)]
+
+
+def _scramble(numbers, rng):
+    """
+    Multiplies each direction number, as a column of digits, by a
+    random lower triangular binary matrix with a unit diagonal:
+    digit i of the result is digit i xor a random subset of the
+    digits before it.
+    """
+    rows = [(1 << (BITS - 1 - i)) |
+            (int(rng.randint(0, 1 << i)) << (BITS - i) if i else 0)
+            for i in range(BITS)]
+    scrambled = []
+    for number in numbers:
+        result = 0
+        for i, row in enumerate(rows):
+            if bin(row & number).count("1") & 1:
+                result |= 1 << (BITS - 1 - i)
+        scrambled.append(result)
+    return scrambled
+
+
+class SobolSequence:
+    """
+    A scrambled Sobol' sequence in dimensions dimensions (at most
+    MAXDIMENSIONS), its randomization drawn from the
+    numpy.random.RandomState rng.  points(start, count) returns
+    points start to start + count - 1, so a long sequence can be
+    used in batches.
+    """
+    def __init__(self, dimensions, rng):
+        if dimensions > MAXDIMENSIONS:
+            raise Exception, "Sobol' points have at most %d dimensions" % (
+                MAXDIMENSIONS)
+        self.dimensions = dimensions
+        self.directions = numpy.array(
+            [_scramble(direction_numbers(dimension), rng)
+             for dimension in range(dimensions)], dtype=numpy.uint64)
+        self.shift = rng.randint(0, 1 << 16, size=(dimensions, 2)).astype(
+            numpy.uint64)
+        self.shift = (self.shift[:, 0] << numpy.uint64(16)) | self.shift[:, 1]
+
+    def points(self, start, count):
+        """
+        Returns a (count, dimensions) float array of points in
+        [0, 1).  Point i is the xor of the direction numbers of the
+        bits set in i, xor the shift.
+        """
+        index = numpy.arange(start, start + count, dtype=numpy.uint64)
+        digits = numpy.tile(self.shift, (count, 1))
+        bit = 0
+        while (start + count - 1) >> bit:
+            has = ((index >> numpy.uint64(bit)) & numpy.uint64(1)).astype(bool)
+            digits[has] ^= self.directions[:, bit]
+            bit += 1
+        return digits.astype(numpy.float64) / float(1 << BITS)
@@ -0,0 +1,194 @@
+"""
+resultstore.py
+A persistent store of equity results, kept in an SQLite file so
+that results outlive the process that simulated them and can be
+shared by every process on the machine.
+
+Results are stored under the suit-canonical key of the game state
+(see equitycache.canonical_key) as (successes, games, enumerated):
+the wins plus ties counted over games games (or runouts, if the
+result was enumerated).  A result is only replaced by one with more
+games, so the store keeps the best estimate any run has made.
+
+Concurrent use: the file is opened in write-ahead-log mode, so
+readers never block; writes take the database lock with BEGIN
+IMMEDIATE and wait up to timeout seconds for other writers.  Reads
+don't write: the results a process looks up are marked used in
+memory, and the marks are written along with its next write (or
+when it closes the store).
+
+Size: with a maxbytes limit, the least recently used results are
+deleted whenever the file outgrows it, and the freed pages are
+returned to the file system (see compact).
+"""
+import time
+import sqlite3
+from equitycache import canonical_key
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    successes INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    enumerated INTEGER NOT NULL,
+    used REAL NOT NULL
+)"""
+_USED_INDEX = "CREATE INDEX IF NOT EXISTS results_used ON results (used)"
+
+
+def store_key(gamestate):
+    """
+    Returns the text key a game state's result is stored under.
+    """
+    return repr(canonical_key(gamestate))
+
+
+class ResultStore:
+    """
+    An SQLite backed store of equity results (see the module doc).
+    maxbytes, if not None, bounds the size of the file; compaction
+    brings it down to low_water times maxbytes, so that it doesn't
+    run on every write.
+
+    hits, misses, writes and evictions count lookups that found a
+    result, lookups that didn't, results written and results
+    deleted to make room, by this process.
+    """
+    def __init__(self, path, maxbytes=None, low_water=0.75, timeout=30.0):
+        self.path = path
+        self.maxbytes = maxbytes
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._used = {}
+        self._db = sqlite3.connect(path, timeout=timeout,
+                                   isolation_level=None)
+        # auto_vacuum only takes effect before the first table is
+        # created, so a new file is set up for incremental vacuums.
+        self._db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute(_SCHEMA)
+        self._db.execute(_USED_INDEX)
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, key):
+        """
+        Returns the (successes, games, enumerated) stored for key,
+        marking it used (see the module doc), or None.
+        """
+        row = self._db.execute("SELECT successes, games, enumerated "
+                               "FROM results WHERE key = ?",
+                               (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used[key] = time.time()
+        return tuple(row)
+
+    def _write_used(self):
+        """
+        Writes the use times of the results looked up since the
+        last write.  Called inside a write transaction.
+        """
+        if self._used:
+            self._db.executemany("UPDATE results SET used = ? WHERE key = ?",
+                                 [(used, key) for key, used
+                                  in self._used.items()])
+
+    def put(self, key, successes, games, enumerated=0):
+        """
+        Stores a result for key unless the store already has one
+        over at least as many games (an enumerated result is never
+        replaced by a simulated one).  Returns 1 if it was stored.
+        Compacts the file afterwards if it has outgrown maxbytes.
+        """
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT games, enumerated FROM results "
+                             "WHERE key = ?", (key,)).fetchone()
+            stored = row is None or (not row[1] and
+                                     (enumerated or games > row[0]))
+            if stored:
+                db.execute("INSERT OR REPLACE INTO results VALUES "
+                           "(?, ?, ?, ?, ?)", (key, successes, games,
+                                               enumerated, time.time()))
+            self._write_used()
+            db.execute("COMMIT")
+        except:
+            db.execute("ROLLBACK")
+            raise
+        self._used.clear()
+        if stored:
+            self.writes += 1
+            if self.maxbytes is not None and self.size() > self.maxbytes:
+                self.compact()
+        return int(stored)
+
+    def size(self):
+        """
+        Returns the size in bytes of the database (not counting its
+        write-ahead log).
+        """
+        pages = self._db.execute("PRAGMA page_count").fetchone()[0]
+        pagesize = self._db.execute("PRAGMA page_size").fetchone()[0]
+        freepages = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - freepages) * pagesize
+
+    def compact(self, maxbytes=None):
+        """
+        Deletes the least recently used results until the store
+        should fit in low_water * maxbytes (self.maxbytes by default),
+        estimating the size of a result from the current average,
+        then returns the freed pages to the file system.
+        """
+        if maxbytes is None:
+            maxbytes = self.maxbytes
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_used()
+            count = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            size = self.size()
+            if count and size > maxbytes * self.low_water:
+                keep = int(count * maxbytes * self.low_water / size)
+                deleted = db.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM "
+                    "results ORDER BY used LIMIT ?)", (count - keep,))
+                self.evictions += deleted.rowcount
+            db.execute("COMMIT")
+        except:
+            db.execute("ROLLBACK")
+            raise
+        self._used.clear()
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.execute("PRAGMA incremental_vacuum")
+
+    def clear(self):
+        """
+        Deletes every result.
+        """
+        self._db.execute("DELETE FROM results")
+        self._db.execute("PRAGMA incremental_vacuum")
+
+    def close(self):
+        """
+        Writes the use times of the results looked up since the
+        last write, unless other writers keep the database busy past
+        timeout, and closes it.
+        """
+        if self._used:
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                pass
+            else:
+                self._write_used()
+                self._db.execute("COMMIT")
+        self._db.close()
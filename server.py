@@ -0,0 +1,314 @@
+"""
+server.py
+A long-running equity server.  python main.py serve --socket PATH
+(or --port N, on 127.0.0.1) keeps one process, with its imports,
+tables and caches warm, answering queries over a socket, so a query
+costs only its own simulation rather than a process start.
+
+Protocol: newline-delimited JSON.  A client sends game state records
+(as in batch.py's JSONL input), one per line, and gets a result
+record (as in batch.py's JSONL output) back for each, in order, for
+as long as it keeps the connection open.  A query that can't be
+answered gets {"id": ..., "error": message} instead.
+
+Each connection is served by a thread that hands its queries to one
+EquityEngine thread.  The engine collects the queries that arrive
+within batch_wait seconds of the first (up to batch_max), answers
+repeated game states once, and simulates all those that need plain
+simulation together (see gamestate.count_outcomes_together); the
+rest (cache hits, preflop lookups, exact enumeration, estimators,
+a result store) go through the shared BetStrategy one at a time.
+"""
+import os
+import sys
+import json
+import time
+import Queue
+import socket
+import argparse
+import threading
+import SocketServer
+import gamestate
+from strategy import wilson_interval
+from batch import parse_record, result_record, make_strategy
+
+# Seconds the engine waits for more queries after the first of a
+# batch, and the most queries it answers together.
+BATCH_WAIT = 0.002
+BATCH_MAX = 256
+# Seconds between the checks a waiting query makes that the engine
+# thread is still running.
+ENGINE_CHECK = 0.5
+
+
+class _Query:
+    """
+    A game state waiting for its result.
+    """
+    def __init__(self, name, gs):
+        self.name = name
+        self.gs = gs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EquityEngine(threading.Thread):
+    """
+    The thread that answers every query, in batches (see the module
+    doc).  settings are BetStrategy keyword arguments, as for
+    batch.evaluate; the strategy (with an EquityCache) is built in
+    the engine's own thread, which is the only one that uses it.
+
+    batches and queries count the batches run and the queries
+    answered.  If the strategy can't be built, the thread stops
+    with error set to why (ready is set either way), as it does
+    if anything escapes a batch; queries waiting on a stopped
+    engine fail rather than block.  Without NumPy every query goes
+    through the strategy on its own.
+    """
+    def __init__(self, settings=None, batch_wait=BATCH_WAIT,
+                 batch_max=BATCH_MAX):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.settings = settings or {}
+        self.batch_wait = batch_wait
+        self.batch_max = batch_max
+        self.queue = Queue.Queue()
+        self.strategy = None
+        self.ready = threading.Event()
+        self.error = None
+        self._rng = None
+        self.batches = 0
+        self.queries = 0
+
+    def submit(self, name, gs):
+        """
+        Queues a game state and waits for it to be answered; returns
+        its _Query, holding the result (or error).
+        """
+        query = _Query(name, gs)
+        self.queue.put(query)
+        while not query.done.wait(ENGINE_CHECK):
+            if not self.is_alive() and not query.done.is_set():
+                query.error = "equity engine stopped: %s" % self.error
+                break
+        return query
+
+    def run(self):
+        try:
+            self.strategy = make_strategy(self.settings)
+            if gamestate.numpy is not None:
+                self._rng = gamestate.numpy.random.RandomState()
+        except Exception, error:
+            self.error = error
+            return
+        finally:
+            self.ready.set()
+        try:
+            self._serve()
+        except BaseException, error:
+            self.error = error
+            raise
+
+    def _serve(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.time() + self.batch_wait
+            while len(batch) < self.batch_max:
+                left = deadline - time.time()
+                if left <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=left))
+                except Queue.Empty:
+                    break
+            try:
+                self.evaluate(batch)
+            except Exception, error:
+                self._fail([query for query in batch
+                            if not query.done.is_set()], error)
+
+    def evaluate(self, batch):
+        """
+        Answers a list of _Querys.
+        """
+        strategy = self.strategy
+        queries = {}
+        keys = []
+        for query in batch:
+            key = strategy.cache_key(query.gs)
+            if key not in queries:
+                queries[key] = []
+                keys.append(key)
+            queries[key].append(query)
+        together = []
+        for key in keys:
+            gs = queries[key][0].gs
+            try:
+                if not self._shareable(gs):
+                    strategy.analyze_gamestate(gs)
+                    self._answer(queries[key], strategy.cache_entry())
+                    continue
+                cached = strategy.cache.get(key)
+                if cached is None:
+                    together.append(key)
+                else:
+                    self._answer(queries[key], cached)
+            except Exception, error:
+                self._fail(queries[key], error)
+        if together:
+            try:
+                counts = gamestate.count_outcomes_together(
+                    [queries[key][0].gs for key in together],
+                    strategy.accuracy, self._rng)
+            except Exception, error:
+                for key in together:
+                    self._fail(queries[key], error)
+                counts = []
+            for key, (wins, ties) in zip(together, counts):
+                games = strategy.accuracy
+                equity = float(wins + ties) / games
+                entry = (equity, wilson_interval(wins + ties, games,
+                                                 strategy.confidence),
+                         games, 0, equity * (1 - equity) / games)
+                strategy.cache.put(key, entry)
+                self._answer(queries[key], entry)
+        self.batches += 1
+        self.queries += len(batch)
+
+    def _shareable(self, gs):
+        """
+        Returns 1 if gs needs the plain vectorized simulation that
+        count_outcomes_together does.
+        """
+        strategy = self.strategy
+        if (self._rng is None or not strategy.vectorized or
+            strategy.estimator is not None or strategy.target is not None or strategy.seed is not None or
+            strategy.store is not None or strategy.workers > 1 or
+            strategy.use_exact(strategy.accuracy, gs)):
+            return 0
+        return int(bool(gs.board or gs.ranges or not strategy.preflop_table
+                        or strategy.preflop_table.lookup(
+                            gs.pcards, gs.opponents) is None))
+
+    def _answer(self, queries, entry):
+        equity, (low, high), games = entry[:3]
+        for query in queries:
+            query.result = (equity, low, high, games, equity * query.gs.pot)
+            query.done.set()
+
+    def _fail(self, queries, error):
+        for query in queries:
+            query.error = str(error)
+            query.done.set()
+
+
+class _Handler(SocketServer.StreamRequestHandler):
+    """
+    Reads a connection's queries one line at a time and writes
+    back each answer.
+    """
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.strip():
+                continue
+            name = None
+            try:
+                record = json.loads(line)
+                name = record.get("id")
+                query = self.server.engine.submit(*parse_record(record))
+                if query.error is not None:
+                    raise Exception, query.error
+                reply = result_record(name, query.result)
+            except Exception, error:
+                reply = {"id": name, "error": str(error)}
+            self.wfile.write(json.dumps(reply) + "\n")
+
+
+class _UnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(address, engine):
+    """
+    Returns a server (call its serve_forever) answering queries
+    through engine, started if it isn't yet, on a Unix socket if
+    address is a path, else on a (host, port) TCP address.  Raises
+    an Exception if the engine failed to start.
+    """
+    if not engine.is_alive() and not engine.ready.is_set():
+        engine.start()
+    engine.ready.wait()
+    if engine.error is not None:
+        raise Exception, "equity engine failed to start: %s" % engine.error
+    if isinstance(address, basestring):
+        if os.path.exists(address):
+            os.remove(address)
+        server = _UnixServer(address, _Handler)
+    else:
+        server = _TCPServer(address, _Handler)
+    server.engine = engine
+    return server
+
+
+def query(address, records):
+    """
+    Sends game state records (dicts) to the server at address and
+    returns the list of its replies.
+    """
+    if isinstance(address, basestring):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    connection.connect(address)
+    stream = connection.makefile("rw", 0)
+    replies = []
+    try:
+        for record in records:
+            stream.write(json.dumps(record) + "\n")
+            replies.append(json.loads(stream.readline()))
+    finally:
+        stream.close()
+        connection.close()
+    return replies
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Serve equity queries.")
+    parser.add_argument("--socket", help="Unix socket path")
+    parser.add_argument("--port", type=int, help="TCP port on 127.0.0.1")
+    parser.add_argument("--accuracy", type=int, default=1000)
+    parser.add_argument("--store")
+    parser.add_argument("--estimator")
+    parser.add_argument("--batch-wait", type=float, default=BATCH_WAIT)
+    parser.add_argument("--batch-max", type=int, default=BATCH_MAX)
+    args = parser.parse_args(argv)
+    if (args.socket is None) == (args.port is None):
+        parser.error("give one of --socket and --port")
+    address = args.socket or ("127.0.0.1", args.port)
+    engine = EquityEngine(dict(accuracy=args.accuracy, store_path=args.store,
+                               estimator=args.estimator),
+                          args.batch_wait, args.batch_max)
+    server = make_server(address, engine)
+    sys.stderr.write("serving on %s\n" % (address,))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket is not None and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
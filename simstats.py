@@ -0,0 +1,158 @@
+"""
+simstats.py
+Opt-in counters and timers for where analysis time goes.  A
+BetStrategy made with stats=SimulationStats() adds every analysis
+into it: how each was answered (cache, store, preflop table, exact
+enumeration or simulation), the trials simulated and the time they
+took, split by phase when the simulation runs in process:
+
+- scalar (simulate_game) trials: draw (dealing opponents and board
+  from the deck), build (the card index lists of every hand), rank
+  (evaluating them) and reset (putting the cards back);
+- vectorized trials: draw (dealing the runouts) and rank (the
+  showdown).
+
+Seeded, multi-worker, target and estimator runs are only timed as
+a whole.  watch_hands() also counts every Hand.__cmp__ and the
+ranking tests the lazy path runs for it (Hand.lazy), wherever hands
+are compared.
+
+A strategy without stats doesn't check for them per trial, only per
+analysis, so leaving the support in costs nothing.  text() and
+prometheus() render the counters, and dump writes either to a file
+(e.g. for a Prometheus textfile collector).
+"""
+import os
+
+PHASES = ("draw", "build", "rank", "reset")
+# Ways an analysis can be answered, in the order they are tried.
+SOURCES = ("cache", "store", "preflop", "exact", "simulated")
+
+
+class SimulationStats:
+    """
+    Running totals: seconds[phase] for each of PHASES, answers[source]
+    for each of SOURCES, analyses, trials, elapsed (seconds simulating
+    trials), cache_misses, comparisons and tests (see watch_hands).
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Sets every counter back to zero.
+        """
+        self.seconds = dict([(phase, 0.0) for phase in PHASES])
+        self.answers = dict([(source, 0) for source in SOURCES])
+        self.analyses = 0
+        self.trials = 0
+        self.elapsed = 0.0
+        self.cache_misses = 0
+        self.comparisons = 0
+        self.tests = 0
+
+    def trials_per_second(self):
+        """
+        Returns the trials simulated per second spent simulating.
+        """
+        if not self.elapsed:
+            return 0.0
+        return self.trials / self.elapsed
+
+    def tests_per_comparison(self):
+        """
+        Returns the mean number of ranking tests run per watched
+        Hand comparison.
+        """
+        if not self.comparisons:
+            return 0.0
+        return float(self.tests) / self.comparisons
+
+    def add_trials(self, trials, seconds):
+        """
+        Counts trials simulated in seconds.
+        """
+        self.trials += trials
+        self.elapsed += seconds
+
+    def watch_hands(self, watch=1):
+        """
+        Makes every Hand comparison count into these stats (or, with
+        watch=0, stops it).  Hand.stats is shared by all hands, so
+        only one stats object can watch at a time.
+        """
+        import handrank
+        handrank.Hand.stats = self if watch else None
+
+    def text(self):
+        """
+        Returns a human readable summary.
+        """
+        lines = ["analyses: %d (%s)" % (self.analyses, ", ".join([
+                    "%s %d" % (source, self.answers[source])
+                    for source in SOURCES])),
+                 "cache misses: %d" % self.cache_misses,
+                 "trials: %d in %.3fs, %.0f/s" % (
+                    self.trials, self.elapsed, self.trials_per_second())]
+        timed = sum(self.seconds.values())
+        for phase in PHASES:
+            if self.seconds[phase]:
+                lines.append("  %-6s %.3fs (%.0f%%)" % (
+                    phase, self.seconds[phase],
+                    100 * self.seconds[phase] / timed))
+        if self.comparisons:
+            lines.append("hand comparisons: %d, %.2f tests each" % (
+                self.comparisons, self.tests_per_comparison()))
+        return "\n".join(lines) + "\n"
+
+    def prometheus(self, prefix="poker_"):
+        """
+        Returns the counters in the Prometheus text exposition
+        format, each name starting with prefix.
+        """
+        lines = []
+        def metric(name, kind, text, samples):
+            lines.append("# HELP %s%s %s" % (prefix, name, text))
+            lines.append("# TYPE %s%s %s" % (prefix, name, kind))
+            for labels, value in samples:
+                lines.append("%s%s%s %r" % (prefix, name, labels, value))
+        metric("analyses_total", "counter", "Analyses run, by answer source.",
+               [('{source="%s"}' % source, self.answers[source])
+                for source in SOURCES])
+        metric("cache_misses_total", "counter", "Equity cache misses.",
+               [("", self.cache_misses)])
+        metric("trials_total", "counter", "Trials simulated.",
+               [("", self.trials)])
+        metric("simulation_seconds_total", "counter",
+               "Seconds spent simulating trials.", [("", self.elapsed)])
+        metric("phase_seconds_total", "counter",
+               "Seconds spent per phase of in-process simulation.",
+               [('{phase="%s"}' % phase, self.seconds[phase])
+                for phase in PHASES])
+        metric("trials_per_second", "gauge",
+               "Trials simulated per second spent simulating.",
+               [("", self.trials_per_second())])
+        metric("hand_comparisons_total", "counter",
+               "Watched Hand comparisons.", [("", self.comparisons)])
+        metric("hand_tests_total", "counter",
+               "Ranking tests run by watched Hand comparisons.",
+               [("", self.tests)])
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, format="prometheus"):
+        """
+        Writes text() or prometheus() (format "text" or
+        "prometheus") to path, through a file renamed over it so
+        readers never see a partial one.
+        """
+        if format == "text":
+            data = self.text()
+        elif format == "prometheus":
+            data = self.prometheus()
+        else:
+            raise Exception, "unknown stats format " + repr(format)
+        partial = path + ".partial"
+        out = open(partial, "w")
+        out.write(data)
+        out.close()
+        os.rename(partial, path)
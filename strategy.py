@@ -1,12 +1,207 @@
+import copy
+import math
+import time
+import random
+import gamestate
+from gamestate import MATCHING_CELLS
+import preflop
+from equitycache import canonical_key
+from resultstore import store_key
+from lazyimport import lazy_import
+
+# Imported the first time a worker pool or an estimator is used.
+multiprocessing = lazy_import("multiprocessing")
+estimators = None
+if gamestate.numpy is not None:
+    estimators = lazy_import("estimators")
+
+# Games per chunk when BetStrategy simulates in seeded chunks.
+CHUNKSIZE = 1 << 14
+# Games per chunk when simulating to a target interval width, so
+# that easy spots can stop early.
+TARGET_CHUNKSIZE = 1 << 11
+# Games per chunk of BetStrategy.estimates; smaller chunks report
+# more often but pay a visible share of per-chunk setup.
+ESTIMATE_CHUNKSIZE = 1 << 13
+
+
+_QUANTILES = {}
+
+
+def normal_quantile(confidence):
+    """
+    Returns z such that a standard normal falls within [-z, z] with
+    the given probability (e.g. 1.96 for 0.95).  Found by bisection
+    on math.erf, once per confidence.
+    """
+    if confidence not in _QUANTILES:
+        _QUANTILES[confidence] = _bisect_quantile(confidence)
+    return _QUANTILES[confidence]
+
+
+def _bisect_quantile(confidence):
+    low, high = 0.0, 40.0
+    for x in range(100):
+        middle = (low + high) / 2
+        if math.erf(middle / math.sqrt(2)) < confidence:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def wilson_interval(successes, trials, confidence=0.95):
+    """
+    Returns the (low, high) Wilson score interval for a binomial
+    proportion observed as successes out of trials.
+    """
+    if trials == 0:
+        return 0.0, 1.0
+    z = normal_quantile(confidence)
+    p = float(successes) / trials
+    scale = 1 + z * z / trials
+    center = (p + z * z / (2 * trials)) / scale
+    half = z * math.sqrt(p * (1 - p) / trials + 
+                         z * z / (4 * trials * trials)) / scale
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def _binomial_variance(p, trials):
+    """
+    Returns the variance of a proportion p observed over trials.
+    """
+    return p * (1 - p) / max(trials, 1)
+
+
+def simulate_chunk(task):
+    """
+    Simulates one chunk of games and returns (wins, ties).  task is
+    a tuple (gamestate, games, seed, index, vectorized); the chunk's
+    random numbers depend only on seed and index, so it gives the
+    same counts whichever process runs it.  Module level so that
+    multiprocessing can pickle it.
+    """
+    state, games, seed, index, vectorized = task
+    if vectorized:
+        rng = gamestate.numpy.random.RandomState([seed, index])
+        return state.count_outcomes(games, rng)
+    # Scalar draws index into the deck list, whose order drifts as
+    # cards are swapped in and out, so start every chunk from a 
+    # fresh deck.
+    state.reset_deck()
+    saved = random.getstate()
+    random.seed((seed << 32) | index)
+    wins = ties = 0
+    for x in range(games):
+        player, best = state.simulate_showdown()
+        if player > best: wins += 1
+        elif player == best: ties += 1
+    random.setstate(saved)
+    return wins, ties
+
+
 class BetStrategy():
     """
     Defines a strategy for a poker game via the method analyze_gamestate,
     which modifies instance variables of this class to reflect the recommended
     bet for the current GameState (passed to analyze_gamestate)
     """	       
-    def __init__(self, accuracy=100):
+    def __init__(self, accuracy=100, vectorized=None, workers=1, seed=None,
+                 exact=None, target=None, confidence=0.95, cache=None,
+                 preflop_table=None, store=None, estimator=None,
+                 stats=None):
+		"""
+		accuracy is the number of games simulated per analysis.
+		vectorized picks GameState.simulate_games (all games dealt
+		and scored as NumPy arrays) over a simulate_game loop; by
+		default it is used whenever NumPy is available.
+
+		With workers > 1 or a seed, games are simulated in chunks of
+		CHUNKSIZE, each with its own random stream seeded from seed
+		and the chunk's number, and spread over a pool of workers
+		processes (see close).  The result for a given seed is the
+		same for any number of workers.
+
+		exact picks exhaustive enumeration of every runout (see
+		GameState.enumerate_outcomes), which gives the exact
+		probability.  By default it is used, when NumPy is available,
+		whenever there are no more distinct runouts than accuracy
+		(e.g. heads-up on the river).  self.enumerated tells whether
+		the last analysis was exact.
+
+		With a target, games are simulated in seeded chunks of
+		TARGET_CHUNKSIZE until the Wilson interval at the given
+		confidence has a half-width of at most target, or accuracy
+		games have been played.  (For a target standard error, pass
+		confidence=0.6827.)
+
+		Every analysis sets self.equity, the probability of win, 
+		self.interval, its (low, high) Wilson interval (a point for
+		exact results) and self.games, the games (or runouts) it took.
+
+		cache is an optional equitycache.EquityCache (it may be shared
+		between strategies).  Results are stored in it under the
+		game state's suit-canonical key (see 
+		equitycache.canonical_key) and the settings that change
+		them, and reused for any game state with the same key by
+		any strategy with the same settings; its hits and misses
+		count how often.
+
+		preflop_table is a preflop.PreflopTable that answers game
+		states with an empty board in one lookup.  By default the
+		table at preflop.DEFAULT_PATH is used if it has been built;
+		pass 0 to always simulate.
+
+		store is an optional resultstore.ResultStore, a file of
+		results shared across runs and processes.  A stored result
+		is used if it is exact, has at least accuracy games or is as
+		narrow as target; otherwise the game is simulated and the
+		new result stored (replacing the old one if it has more
+		games).  Estimator runs don't use the store: it holds
+		binomial counts, which don't describe their variance.
+
+		estimator names a variance-reduced estimator from
+		estimators.ESTIMATORS ("card", "class", "antithetic",
+		"control", "qmc" or "iid"), or is such a function, used in place of
+		plain simulation when the result isn't exact (the seed, if
+		any, seeds it; workers and target don't apply).  Its
+		interval is the normal one from the variance it reports.
+		Every analysis sets self.variance, the estimated variance of
+		self.equity.
+
+		stats is an optional simstats.SimulationStats that every
+		analysis is counted and timed into (see simstats.py); without
+		one nothing is measured.
+		"""
 		self.recommended_bet = -1
 		self.accuracy = accuracy
+		if vectorized is None:
+			vectorized = gamestate.numpy is not None
+		self.vectorized = vectorized
+		self.workers = workers
+		self.seed = seed
+		self.exact = exact
+		self.target = target
+		self.confidence = confidence
+		self.enumerated = 0
+		self.equity = -1
+		self.interval = (0.0, 1.0)
+		self.games = 0
+		self.cache = cache
+		if preflop_table is None:
+			preflop_table = preflop.default_table()
+		self.preflop_table = preflop_table
+		self.store = store
+		if estimator is not None and estimators is None:
+			raise Exception, "estimator %r requires numpy" % (estimator,)
+		if isinstance(estimator, basestring):
+			if estimator not in estimators.ESTIMATORS:
+				raise Exception, "unknown estimator " + repr(estimator)
+			estimator = estimators.ESTIMATORS[estimator]
+		self.estimator = estimator
+		self.variance = 0.0
+		self.stats = stats
+		self._pool = None
     
     def analyze_gamestate(self, gamestate):
 		"""
@@ -17,7 +212,12 @@ class BetStrategy():
 		@param gamestate: The current table layout.
 		@type gamestate: a Gamestate object.
 		"""
-		probability = self._find_probability_of_win(self.accuracy, gamestate)
+		if self.stats is not None:
+			self.stats.analyses += 1
+		if self.cache is not None:
+			probability = self._cached_probability_of_win(gamestate)
+		else:
+			probability = self._stored_probability_of_win(gamestate)
 		value = gamestate.pot
 		expected_value = probability * value
 		self.recommended_bet = expected_value
@@ -26,16 +226,349 @@ class BetStrategy():
     def _find_probability_of_win(self, number_of_games, gamestate):
 		"""
 		Takes a GameState object and simulates the provided number of games
-		with it, then divides the player wins by the total and returns that
+		with it (or looks its equity up, or enumerates it), then divides
+		the games the player won or tied by the total and returns that
 		result.
 
-        @param number_of_games: The number of games to be simulated
+		@param number_of_games: The number of games to be simulated
 		@type number_of_games: an int object.
 		@param gamestate: The game to be simulated.
 		@type gamestate: a Gamestate object.
 		"""
-		wins = 0
-		for x in range(0, number_of_games):
-			wins += gamestate.simulate_game()
-		return float(wins) / number_of_games
-	
+		stats = self.stats
+		if self.lookup_preflop(gamestate):
+			if stats is not None:
+				stats.answers["preflop"] += 1
+			return self.equity
+		self.enumerated = self.use_exact(number_of_games, gamestate)
+		if self.enumerated:
+			if stats is not None:
+				stats.answers["exact"] += 1
+			wins, ties, runouts = gamestate.enumerate_outcomes()
+			return self.set_enumerated(wins + ties, runouts)
+		if stats is not None:
+			stats.answers["simulated"] += 1
+		started = time.time()
+		self._simulate(number_of_games, gamestate)
+		if stats is not None:
+			stats.add_trials(self.games, time.time() - started)
+		return self.equity
+
+    def _simulate(self, number_of_games, gamestate):
+		"""
+		The simulation part of _find_probability_of_win: runs the
+		estimator or simulates number_of_games games, sets the
+		result and returns the equity.
+		"""
+		if self.estimator is not None:
+			return self._estimate(number_of_games, gamestate)
+		seconds = None
+		if self.stats is not None:
+			seconds = self.stats.seconds
+		if self.target is not None:
+			wins, ties, number_of_games = self._simulate_to_target(
+				number_of_games, gamestate)
+			wins += ties
+		elif self.workers > 1 or self.seed is not None:
+			wins, ties = self._simulate_chunks(number_of_games, gamestate)
+			wins += ties
+		elif self.vectorized:
+			wins = gamestate.simulate_games(number_of_games, None, seconds)
+		else:
+			wins = 0
+			for x in range(0, number_of_games):
+				wins += gamestate.simulate_game(seconds)
+		return self.set_simulated(wins, number_of_games)
+
+    def set_enumerated(self, successes, runouts):
+        """
+        Sets self.equity, interval, games and variance from an
+        exact count of the runouts won or tied, and returns the
+        equity.
+        """
+        self.games = runouts
+        self.equity = float(successes) / runouts
+        self.interval = (self.equity, self.equity)
+        self.variance = 0.0
+        return self.equity
+
+    def set_simulated(self, successes, games):
+        """
+        Sets self.equity, interval, games and variance from the
+        games won or tied out of games simulated, and returns the
+        equity.
+        """
+        self.games = games
+        self.equity = float(successes) / games
+        self.interval = wilson_interval(successes, games, self.confidence)
+        self.variance = _binomial_variance(self.equity, games)
+        return self.equity
+
+    def _estimate(self, number_of_games, gamestate):
+        """
+        Runs self.estimator for number_of_games and sets self.equity,
+        variance, games and a normal interval from the variance.
+        """
+        rng = estimators.numpy.random.RandomState(self.seed)
+        return self.set_estimated(*self.estimator(gamestate, number_of_games,
+                                                   rng))
+
+    def set_estimated(self, equity, variance, games):
+        """
+        Sets self.equity, variance, games and the normal interval
+        from an estimator's result, and returns the equity.
+        """
+        self.equity, self.variance, self.games = equity, variance, games
+        half = normal_quantile(self.confidence) * math.sqrt(self.variance)
+        self.interval = (max(0.0, self.equity - half),
+                         min(1.0, self.equity + half))
+        return self.equity
+
+    def _cached_probability_of_win(self, gamestate):
+        """
+        _find_probability_of_win(self.accuracy, gamestate) through
+        self.cache.  The key includes the settings that change the
+        result, so strategies with different settings can share a
+        cache.
+        """
+        key = self.cache_key(gamestate)
+        result = self.cache.get(key)
+        if result is None:
+            if self.stats is not None:
+                self.stats.cache_misses += 1
+            self._stored_probability_of_win(gamestate)
+            self.cache.put(key, self.cache_entry())
+        else:
+            if self.stats is not None:
+                self.stats.answers["cache"] += 1
+            (self.equity, self.interval, self.games, self.enumerated,
+             self.variance) = result
+        return self.equity
+
+    def cache_entry(self):
+        """
+        Returns the value self.cache keeps for the last result.
+        """
+        return (self.equity, self.interval, self.games, self.enumerated,
+                self.variance)
+
+    def cache_key(self, gamestate):
+        """
+        Returns the key of gamestate's result in self.cache: the
+        game state's canonical key and every setting that changes
+        how the result is found (a seeded result isn't reused by an
+        unseeded strategy, nor a simulated one by an exact one).
+        """
+        return (canonical_key(gamestate), self.accuracy, self.target, 
+                self.confidence, self.estimator, self.exact,
+                self.vectorized, self.seed, bool(self.preflop_table))
+
+    def _stored_probability_of_win(self, gamestate):
+        """
+        _find_probability_of_win(self.accuracy, gamestate) through
+        self.store, if there is one and there is no estimator (the
+        store keeps binomial counts, which would misstate an
+        estimator's variance).
+        """
+        if (self.store is None or self.estimator is not None or
+            self.lookup_preflop(gamestate)):
+            return self._find_probability_of_win(self.accuracy, gamestate)
+        key = store_key(gamestate)
+        result = self.store.get(key)
+        if result is not None and self._good_enough(result):
+            if self.stats is not None:
+                self.stats.answers["store"] += 1
+            successes, self.games, self.enumerated = result
+            self.equity = float(successes) / self.games
+            if self.enumerated:
+                self.interval = (self.equity, self.equity)
+                self.variance = 0.0
+            else:
+                self.interval = wilson_interval(successes, self.games,
+                                                self.confidence)
+                self.variance = _binomial_variance(self.equity, self.games)
+            return self.equity
+        self._find_probability_of_win(self.accuracy, gamestate)
+        self.store.put(key, int(round(self.equity * self.games)),
+                       self.games, self.enumerated)
+        return self.equity
+
+    def _good_enough(self, result):
+        """
+        Returns 1 if a stored (successes, games, enumerated) result
+        is at least as accurate as this strategy's own would be.
+        """
+        successes, games, enumerated = result
+        if enumerated or games >= self.accuracy:
+            return 1
+        if self.target is None:
+            return 0
+        low, high = wilson_interval(successes, games, self.confidence)
+        return int((high - low) / 2 <= self.target)
+
+    def lookup_preflop(self, gamestate):
+        """
+        Sets self.equity, interval and games from the preflop table
+        and returns 1 if gamestate is preflop and in the table, 
+        returns 0 otherwise.
+        """
+        if gamestate.board or gamestate.ranges or not self.preflop_table:
+            return 0
+        equity = self.preflop_table.lookup(gamestate.pcards, 
+                                           gamestate.opponents)
+        if equity is None:
+            return 0
+        self.enumerated = 0
+        self.games = self.preflop_table.games
+        self.equity = equity
+        self.interval = wilson_interval(int(round(equity * self.games)),
+                                        self.games, self.confidence)
+        self.variance = _binomial_variance(equity, self.games)
+        return 1
+
+    def use_exact(self, number_of_games, gamestate):
+        """
+        Returns 1 if the probability should be found by enumeration
+        rather than by simulating number_of_games games: there are
+        no more runouts than that (and some), and the table of
+        opponent hands enumeration builds fits in MATCHING_CELLS.
+        With exact set to 1, raises an Exception up front if the
+        game state can't be enumerated (GameState.check_enumeration).
+        """
+        if self.exact is not None:
+            if self.exact:
+                gamestate.check_enumeration()
+            return self.exact
+        if not self.vectorized or gamestate.ranges:
+            return 0
+        size = gamestate.enumeration_size()
+        return int(0 < size <= number_of_games and gamestate.matching_count()
+                   * gamestate.opponents <= MATCHING_CELLS)
+
+    def chunk_tasks(self, number_of_games, gamestate, chunksize):
+        """
+        Returns the list of simulate_chunk tasks covering
+        number_of_games in chunks of chunksize, seeded with self.seed
+        (or a random seed if it is None).
+        """
+        seed = self.seed
+        if seed is None:
+            seed = random.getrandbits(32)
+        tasks = []
+        for start in range(0, number_of_games, chunksize):
+            games = min(chunksize, number_of_games - start)
+            tasks.append((gamestate, games, seed, len(tasks), 
+                          self.vectorized))
+        return tasks
+
+    def _run_tasks(self, tasks):
+        """
+        Runs simulate_chunk tasks (on the worker pool if 
+        self.workers > 1) and returns their results in order.
+        """
+        if self.workers > 1 and len(tasks) > 1:
+            return self.pool().map(simulate_chunk, tasks, 1)
+        return map(simulate_chunk, tasks)
+
+    def _simulate_chunks(self, number_of_games, gamestate):
+        """
+        Splits number_of_games into chunks of CHUNKSIZE, runs them
+        and returns the summed (wins, ties).
+        """
+        results = self._run_tasks(self.chunk_tasks(number_of_games,
+                                                    gamestate, CHUNKSIZE))
+        wins = sum([result[0] for result in results])
+        ties = sum([result[1] for result in results])
+        return wins, ties
+
+    def _simulate_to_target(self, number_of_games, gamestate):
+        """
+        Runs chunks of TARGET_CHUNKSIZE games, self.workers at a time,
+        until the interval is as narrow as self.target or 
+        number_of_games have been played.  Returns (wins, ties, games).
+
+        Chunks are checked in order and any run past the stopping
+        point are dropped, so where it stops depends only on the 
+        seed, not on the number of workers.
+        """
+        wins = ties = games = 0
+        for wins, ties, games in self._running_counts(
+                number_of_games, gamestate, TARGET_CHUNKSIZE):
+            low, high = wilson_interval(wins + ties, games, self.confidence)
+            if (high - low) / 2 <= self.target:
+                break
+        return wins, ties, games
+
+    def _running_counts(self, number_of_games, gamestate, chunksize):
+        """
+        Runs number_of_games in seeded chunks of chunksize games,
+        self.workers at a time, and yields the (wins, ties, games)
+        totals after each chunk, in order.
+        """
+        tasks = self.chunk_tasks(number_of_games, gamestate, chunksize)
+        wins = ties = games = 0
+        for start in range(0, len(tasks), self.workers):
+            batch = tasks[start:start + self.workers]
+            for task, (chunkwins, chunkties) in zip(batch, 
+                                                    self._run_tasks(batch)):
+                wins += chunkwins
+                ties += chunkties
+                games += task[1]
+                yield wins, ties, games
+
+    def estimates(self, gamestate, chunksize=ESTIMATE_CHUNKSIZE):
+        """
+        Simulates gamestate in chunks of chunksize games (up to
+        self.accuracy games, or until self.target is reached) and
+        yields a running (games, wins, ties, equity, interval) after
+        each, so a caller can act on an early estimate and stop
+        iterating once it is good enough; self.equity, interval,
+        games and variance follow the latest one.  A preflop table
+        or exact answer is yielded once (a table entry as wins
+        only).  The cache, store and estimator aren't used.
+        """
+        if self.lookup_preflop(gamestate):
+            yield (self.games, int(round(self.equity * self.games)), 0,
+                   self.equity, self.interval)
+            return
+        self.enumerated = self.use_exact(self.accuracy, gamestate)
+        if self.enumerated:
+            wins, ties, runouts = gamestate.enumerate_outcomes()
+            self.set_enumerated(wins + ties, runouts)
+            yield runouts, wins, ties, self.equity, self.interval
+            return
+        for wins, ties, games in self._running_counts(self.accuracy,
+                                                      gamestate, chunksize):
+            self.set_simulated(wins + ties, games)
+            yield games, wins, ties, self.equity, self.interval
+            if (self.target is not None and
+                (self.interval[1] - self.interval[0]) / 2 <= self.target):
+                return
+
+    def copy(self):
+        """
+        Returns a copy of this strategy with the same settings,
+        cache and store but no worker pool of its own, to analyze
+        with apart from it (see analyzer.py).
+        """
+        other = copy.copy(self)
+        other._pool = None
+        return other
+
+    def pool(self):
+        """
+        Returns the multiprocessing pool of self.workers processes,
+        starting it on first use.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+        return self._pool
+
+    def close(self):
+        """
+        Shuts down the worker pool, if one was started.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
@@ -0,0 +1,105 @@
+import time
+import unittest
+from gamestate import *
+from strategy import *
+from equitycache import EquityCache
+from analyzer import *
+
+
+class AnalyzerTest(unittest.TestCase):
+    """
+    Tests for the non-blocking analyses on a shared pool.
+    """
+    def setUp(self):
+        self.analyzer = Analyzer(2)
+        self.flop = GameState([Card("12h"), Card("11h")], 4,
+                              [Card("2c"), Card("7d"), Card("9s")], 100, 1)
+
+    def tearDown(self):
+        self.analyzer.close()
+
+    def test_main(self):
+        self.test_result()
+        self.test_sharing()
+        self.test_cancel()
+        self.test_paths()
+
+    def test_result(self):
+        """ An analysis gives the equity analyze_gamestate would,
+        repeats for a seed, and fills the strategy's cache.
+        """
+        strat = BetStrategy(accuracy=10000, seed=5, cache=EquityCache(),
+                            preflop_table=0)
+        done = []
+        analysis = self.analyzer.submit(strat, self.flop)
+        analysis.add_done_callback(done.append)
+        result = analysis.result(30)
+        assert done == [analysis] and analysis.done()
+        assert result is not strat and strat.equity == -1
+        assert result.games == analysis.games == 10000
+        assert abs(result.recommended_bet - result.equity * 100) < 1e-9
+        again = self.analyzer.submit(BetStrategy(accuracy=10000, seed=5,
+                                                 preflop_table=0), self.flop)
+        assert again.result(30).equity == result.equity
+        plain = BetStrategy(accuracy=10000, preflop_table=0)
+        plain.analyze_gamestate(self.flop)
+        assert abs(plain.equity - result.equity) < 0.05
+        start = time.time()
+        self.analyzer.submit(strat, self.flop).result(30)
+        assert strat.cache.hits == 1 and time.time() - start < 0.1
+
+    def test_sharing(self):
+        """ A short analysis finishes while a long one is still
+        running on the same pool.
+        """
+        long = self.analyzer.submit(BetStrategy(accuracy=1 << 22),
+                                    self.flop)
+        short = self.analyzer.submit(BetStrategy(accuracy=4000), GameState(
+            [Card("3c"), Card("3d")], 1, [Card("2c"), Card("7d")], 10, 1))
+        assert 0.5 < short.result(30).equity < 0.8
+        assert not long.done() and long.games < 1 << 22
+        long.cancel()
+
+    def test_cancel(self):
+        analysis = self.analyzer.submit(BetStrategy(accuracy=1 << 22),
+                                        self.flop)
+        assert analysis.cancel() and analysis.cancelled()
+        assert not analysis.cancel()
+        self.assertRaises(Cancelled, analysis.result)
+        analysis = self.analyzer.submit(BetStrategy(accuracy=1 << 22),
+                                        self.flop, timeout=0.1)
+        self.assertRaises(TimedOut, analysis.result, 30)
+        assert analysis.cancelled() and analysis.games < 1 << 22
+        analysis = self.analyzer.submit(BetStrategy(accuracy=1 << 22),
+                                        self.flop)
+        self.assertRaises(TimedOut, analysis.result, 0.05)
+        assert not analysis.done()
+        self.analyzer.close()
+        assert analysis.cancelled()
+
+    def test_paths(self):
+        """ Exact enumeration, estimators and targets run on the
+        pool too, and errors there reach result.
+        """
+        river = GameState([Card("12h"), Card("11h")], 1,
+                          [Card("2c"), Card("7d"), Card("9s"), Card("3c"),
+                           Card("4c")], 100, 1)
+        strat = BetStrategy(accuracy=1000)
+        strat.analyze_gamestate(river)
+        result = self.analyzer.submit(BetStrategy(accuracy=1000),
+                                      river).result(30)
+        assert result.enumerated and result.equity == strat.equity
+        result = self.analyzer.submit(BetStrategy(accuracy=2000, seed=1,
+                                                  estimator="control"),
+                                      self.flop).result(30)
+        assert result.variance > 0 and result.games >= 2000
+        result = self.analyzer.submit(BetStrategy(accuracy=1 << 20,
+                                                  target=0.02, seed=1),
+                                      self.flop).result(30)
+        low, high = result.interval
+        assert (high - low) / 2 <= 0.02 and result.games < 1 << 20
+        broken = GameState([Card("12h"), Card("11h")], 30, [], 100, 1)
+        analysis = self.analyzer.submit(BetStrategy(
+            accuracy=1000, preflop_table=0, exact=0), broken)
+        self.assertRaises(Exception, analysis.result, 30)
+        assert analysis.done() and not analysis.cancelled()
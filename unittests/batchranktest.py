@@ -0,0 +1,46 @@
+import unittest
+import numpy
+from random import sample
+from handrank import *
+import evaluator
+import batchrank
+
+
+class BatchRankTest(unittest.TestCase):
+    """
+    Tests for the NumPy batch evaluator in batchrank.py.
+    """
+    def setUp(self):
+        self.hands = 2000
+
+    def test_main(self):
+        self.test_matches_evaluator()
+        self.test_from_cards()
+        self.test_holes()
+        self.test_badshape()
+
+    def test_matches_evaluator(self):
+        for size in range(5, 8):
+            cards = numpy.array([sample(range(52), size)
+                                 for x in range(self.hands)])
+            strengths = batchrank.evaluate(cards)
+            assert strengths.shape == (self.hands,)
+            for row, strength in zip(cards, strengths):
+                assert evaluator.evaluate(list(row)) == strength
+
+    def test_from_cards(self):
+        hands = [sample(CARDS, 7) for x in range(10)]
+        strengths = batchrank.evaluate(batchrank.from_cards(hands))
+        for cards, strength in zip(hands, strengths):
+            assert evaluator.evaluate_cards(cards) == strength
+
+    def test_holes(self):
+        cards = numpy.array([sample(range(52), 9) for x in range(self.hands)])
+        first, second = batchrank.evaluate_holes(cards[:, :5],
+                                                 [cards[:, 5:7], cards[:, 7:]])
+        assert (first == batchrank.evaluate(cards[:, :7])).all()
+        river = cards[:, [0, 1, 2, 3, 4, 7, 8]]
+        assert (second == batchrank.evaluate(river)).all()
+
+    def test_badshape(self):
+        self.assertRaises(ValueError, batchrank.evaluate, [[1, 2, 3]])
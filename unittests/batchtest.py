@@ -0,0 +1,99 @@
+import os
+import json
+import unittest
+import tempfile
+from StringIO import StringIO
+from gamestate import *
+from strategy import *
+from batch import *
+from resultstore import ResultStore
+
+
+def _states(count):
+    """
+    Yields count distinct (id, GameState) records, counting how
+    many have been taken in _states.taken.
+    """
+    for number in range(count):
+        _states.taken = number + 1
+        left = [card for card in CARDS if card.rank != 12]
+        board = [left[number % 48], left[(number + 17) % 48],
+                 left[(number + 33) % 48]]
+        yield number, GameState([Card("12h"), Card("12s")], 1 + number % 3,
+                                board, 10, 1)
+
+
+class BatchTest(unittest.TestCase):
+    """
+    Tests for streaming batch evaluation.
+    """
+    def test_main(self):
+        self.test_jsonl()
+        self.test_binary()
+        self.test_streaming()
+        self.test_workers()
+
+    def test_jsonl(self):
+        lines = [{"pcards": ["12h", "11h"], "opponents": 2, "board": 
+                  ["2h", "7h", "9c"], "pot": 100, "minbet": 1, "id": "a"},
+                 {"pcards": ["5d", "5s"], "opponents": 2, "pot": 10,
+                  "minbet": 1, "ranges": [None, "JJ+, AK"], "id": 7}]
+        source = StringIO("\n".join([json.dumps(line) for line in lines]) +
+                          "\n\n")
+        out = StringIO()
+        write_jsonl(out, evaluate(read_jsonl(source), accuracy=2000, seed=3))
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [result["id"] for result in results] == ["a", 7]
+        for result, line in zip(results, lines):
+            assert result["low"] <= result["equity"] <= result["high"]
+            assert result["games"] == 2000
+            assert abs(result["bet"] - result["equity"] * line["pot"]) < 1e-6
+        strat = BetStrategy(accuracy=2000, seed=3)
+        strat.analyze_gamestate(GameState([Card("12h"), Card("11h")], 2,
+                                          [Card("2h"), Card("7h"),
+                                           Card("9c")], 100, 1))
+        assert results[0]["equity"] == strat.equity
+
+    def test_binary(self):
+        states = [gs for number, gs in _states(20)]
+        data = StringIO()
+        write_binary(data, states)
+        assert len(data.getvalue()) == 6 + 20 * 24
+        data.seek(0)
+        read = list(read_binary(data))
+        assert [number for number, gs in read] == range(20)
+        for (number, gs), original in zip(read, states):
+            assert gs.pcards == original.pcards
+            assert gs.board == original.board
+            assert gs.opponents == original.opponents
+            assert gs.pot == original.pot and gs.minbet == original.minbet
+        out = StringIO()
+        write_binary_results(out, evaluate(read, accuracy=500, seed=1))
+        out.seek(0)
+        results = list(read_binary_results(out))
+        assert len(results) == 20
+        for equity, low, high, games, bet in results:
+            assert 0 <= low <= equity <= high <= 1 and games == 500
+
+    def test_streaming(self):
+        """ Records are read a window at a time, not all at once. """
+        results = evaluate(_states(100), window=8, accuracy=100)
+        results.next()
+        assert _states.taken == 8
+        assert len(list(results)) == 99
+
+    def test_workers(self):
+        """ Seeded results don't depend on the worker count, and 
+        each worker process opens the result store.
+        """
+        path = tempfile.mktemp(suffix=".db")
+        try:
+            one = list(evaluate(_states(30), accuracy=400, seed=2))
+            three = list(evaluate(_states(30), workers=3, window=16,
+                                  accuracy=400, seed=2, store_path=path))
+            assert one == three
+            assert len(ResultStore(path)) == 30
+        finally:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+import evaluator
+from benchmark import *
+
+
+class BenchmarkTest(unittest.TestCase):
+    """
+    Tests for the benchmark suite's fixtures, baselines and
+    comparison.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_main(self):
+        self.test_hands_of()
+        self.test_run()
+        self.test_compare()
+
+    def test_hands_of(self):
+        for category in range(len(CATEGORIES)):
+            hands = hands_of(category, 20, category)
+            assert len(hands) == 20
+            for cards in hands:
+                assert len(set(cards)) == 7
+                assert evaluator.category(
+                    evaluator.evaluate_cards(cards)) == category
+
+    def test_run(self):
+        names = [name for name, unit, make in benchmarks(0.01)]
+        assert len(names) == len(set(names)) == 2 * 10 + 5 + 2 * 4 * 9
+        results = run_benchmarks("simulate_game.river", 0.01, 1)
+        assert sorted(results) == ["simulate_game.river.%d" % opponents
+                                   for opponents in range(1, 10)]
+        path = os.path.join(self.dir, "baseline.json")
+        save(path, results)
+        assert load(path) == results
+
+    def test_compare(self):
+        baseline = {"a": {"rate": 100.0, "unit": "hands/s"},
+                    "b": {"rate": 100.0, "unit": "hands/s"},
+                    "gone": {"rate": 1.0, "unit": "hands/s"}}
+        results = {"a": {"rate": 95.0, "unit": "hands/s"},
+                   "b": {"rate": 80.0, "unit": "hands/s"},
+                   "new": {"rate": 1.0, "unit": "hands/s"}}
+        rows = compare(baseline, results, 0.1)
+        assert [(name, regressed) for name, o, n, c, regressed in rows] == [
+            ("a", 0), ("b", 1)]
+        assert abs(rows[1][3] + 0.2) < 1e-9
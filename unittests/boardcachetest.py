@@ -0,0 +1,65 @@
+import random
+import unittest
+import numpy
+import batchrank
+import gamestate
+from gamestate import *
+from boardcache import *
+from evaluator import evaluate
+
+
+class BoardCacheTest(unittest.TestCase):
+    """
+    Tests for the per-board hole card strengths.
+    """
+    def test_main(self):
+        self.test_strengths()
+        self.test_eviction()
+        self.test_showdown()
+
+    def test_strengths(self):
+        board = [Card(c).index for c in ("3c", "4d", "9s", "10h", "2c")]
+        strengths = BoardCache().strengths(board)
+        assert len(strengths) == len(COMBOS) == 1326
+        for number, (first, second) in enumerate(COMBOS):
+            assert COMBO_INDEX[second][first] == number
+            if first in board or second in board:
+                assert strengths[number] == -1
+            else:
+                assert strengths[number] == evaluate([first, second] + board)
+        flushes = [Card(c).index for c in ("3c", "4c", "9c", "10c", "2d")]
+        holes = numpy.array([[0, 4], [1, 5], [48, 49]])
+        assert (BoardCache().strengths(flushes)[
+            combo_arrays()[1][holes[:, 0], holes[:, 1]]] ==
+                batchrank.evaluate_board(flushes, holes)).all()
+
+    def test_eviction(self):
+        cache = BoardCache(maxboards=8)
+        for river in range(5, 15):
+            cache.strengths([0, 1, 2, 3, river])
+        assert len(cache) <= 8 and cache.evictions == 2
+        cache.strengths([14, 0, 1, 2, 3])
+        assert (cache.hits, cache.misses) == (1, 10)
+        cache.strengths([0, 1, 2, 3, 5])
+        assert cache.misses == 11
+
+    def test_showdown(self):
+        """ Looked up showdowns match evaluated ones. """
+        gs = GameState([Card("12h"), Card("12s")], 6, 
+                       [Card("3c"), Card("4d"), Card("9s"), Card("10h")], 
+                       10, 1)
+        board, holes = gs.deal_runouts(2000, numpy.random.RandomState(2))
+        pholes = numpy.tile([Card("12h").index, Card("12s").index], 
+                            (2000, 1))
+        looked = gs._lookup_strengths(board, [pholes] + holes)
+        evaluated = batchrank.evaluate_holes(board, [pholes] + holes)
+        for first, second in zip(looked, evaluated):
+            assert (first == second).all()
+        results = []
+        for opponents in (3, 10):
+            gamestate.TABLE_OPPONENTS = opponents
+            gs.reset_deck()
+            random.seed(7)
+            results.append([gs.simulate_showdown() for x in range(300)])
+        gamestate.TABLE_OPPONENTS = 3
+        assert results[0] == results[1]
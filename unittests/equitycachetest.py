@@ -0,0 +1,67 @@
+import unittest
+from gamestate import *
+from strategy import *
+from equitycache import *
+
+
+class EquityCacheTest(unittest.TestCase):
+    """
+    Tests for suit canonicalization and the equity LRU cache.
+    """
+    def test_main(self):
+        self.test_canonical_key()
+        self.test_eviction()
+        self.test_strategy_cache()
+
+    def test_canonical_key(self):
+        gs1 = GameState([Card("12h"), Card("11h")], 3, 
+                        [Card("0c"), Card("5d"), Card("7s")], 10, 1)
+        gs2 = GameState([Card("11s"), Card("12s")], 3, 
+                        [Card("7h"), Card("0d"), Card("5c")], 20, 1)
+        gs3 = GameState([Card("12h"), Card("11s")], 3, 
+                        [Card("0c"), Card("5d"), Card("7s")], 10, 1)
+        gs4 = GameState([Card("12h"), Card("11h")], 2, 
+                        [Card("0c"), Card("5d"), Card("7s")], 10, 1)
+        assert canonical_key(gs1) == canonical_key(gs2)
+        assert canonical_key(gs1) != canonical_key(gs3)
+        assert canonical_key(gs1) != canonical_key(gs4)
+
+    def test_eviction(self):
+        cache = EquityCache(maxentries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+        cache = EquityCache(maxentries=None, maxbytes=1000)
+        for x in range(100):
+            cache.put(x, (0.5, (0.4, 0.6), 1000, 0))
+        assert 0 < len(cache) < 100
+        assert cache.bytes <= 1000
+
+    def test_strategy_cache(self):
+        cache = EquityCache()
+        strat = BetStrategy(accuracy=2000, cache=cache)
+        strat.analyze_gamestate(GameState([Card("12h"), Card("11h")], 1, 
+                                          [], 10, 1))
+        equity = strat.equity
+        strat.analyze_gamestate(GameState([Card("12c"), Card("11c")], 1, 
+                                          [], 20, 1))
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert strat.equity == equity
+        assert strat.recommended_bet == equity * 20
+        flop = GameState([Card("12h"), Card("11h")], 2,
+                         [Card("2c"), Card("7d"), Card("9s")], 10, 1)
+        BetStrategy(accuracy=2000, seed=3, cache=cache).analyze_gamestate(flop)
+        for strat in [BetStrategy(accuracy=2000, cache=cache),
+                      BetStrategy(accuracy=2000, seed=4, cache=cache),
+                      BetStrategy(accuracy=2000, seed=3, vectorized=0,
+                                  cache=cache),
+                      BetStrategy(accuracy=2000, seed=3, exact=0,
+                                  cache=cache)]:
+            strat.analyze_gamestate(flop)
+        assert (cache.hits, cache.misses) == (1, 6)
+        BetStrategy(accuracy=2000, seed=3, cache=cache).analyze_gamestate(flop)
+        assert cache.hits == 2
@@ -0,0 +1,97 @@
+import unittest
+import numpy
+from gamestate import *
+from strategy import *
+from estimators import *
+import strategy
+
+
+class EstimatorsTest(unittest.TestCase):
+    """
+    Tests for the variance-reduced equity estimators.
+    """
+    def setUp(self):
+        self.turn = GameState([Card("5d"), Card("5s")], 1,
+                              [Card("12c"), Card("3h"), Card("9d"),
+                               Card("10s")], 100, 1)
+        self.flop = GameState([Card("8c"), Card("9c")], 3,
+                              [Card("10c"), Card("11d"), Card("2s")], 100, 1)
+
+    def test_main(self):
+        self.test_unbiased()
+        self.test_variance_reduction()
+        self.test_preset_holes()
+        self.test_ranges()
+        self.test_strategy()
+
+    def test_unbiased(self):
+        """ Every estimator lands within a few of its own standard
+        deviations of the enumerated equity.
+        """
+        wins, ties, runouts = self.turn.enumerate_outcomes()
+        exact = float(wins + ties) / runouts
+        for name, estimator in sorted(ESTIMATORS.items()):
+            rng = numpy.random.RandomState(3)
+            equity, variance, games = estimator(self.turn, 20000, rng)
+            assert 20000 <= games < 21000
+            assert abs(equity - exact) < 4 * variance ** 0.5, name
+
+    def test_variance_reduction(self):
+        """ At equal games, the class strata and the controls beat
+        plain sampling by well over 2x on the turn, the controls
+        on a multiway flop too.
+        """
+        rng = numpy.random.RandomState(4)
+        plain = iid(self.turn, 20000, rng)[1]
+        assert stratified_by_class(self.turn, 20000, rng)[1] < plain / 2
+        assert control_variate(self.turn, 20000, rng)[1] < plain / 2
+        plain = iid(self.flop, 20000, rng)[1]
+        assert control_variate(self.flop, 20000, rng)[1] < plain / 2
+
+    def test_preset_holes(self):
+        holes = numpy.tile([Card("12h").index, Card("12s").index], (500, 1))
+        board, dealt = self.flop.deal_runouts(500, numpy.random.RandomState(1),
+                                              [None, holes, None])
+        assert (dealt[1] == holes).all()
+        cards = numpy.hstack([board] + dealt + [
+            numpy.tile([Card("8c").index, Card("9c").index], (500, 1))])
+        for row in cards:
+            assert len(set(row)) == len(row)
+
+    def test_ranges(self):
+        gs = GameState([Card("5d"), Card("5s")], 2,
+                       [Card("12c"), Card("3h"), Card("9d"), Card("10s")],
+                       100, 1, [None, "JJ+, AK"])
+        equity, variance, games = stratified_by_class(
+            gs, 5000, numpy.random.RandomState(2))
+        assert 0 < equity < 0.2
+        for name in UNRANGED:
+            self.assertRaises(Exception, ESTIMATORS[name], gs, 1000,
+                              numpy.random.RandomState(2))
+
+    def test_strategy(self):
+        """ A strategy with an estimator reports its variance and a
+        normal interval around the equity; the seed repeats it.
+        Unknown estimators, and any without NumPy, are rejected.
+        """
+        results = []
+        for x in range(2):
+            strat = BetStrategy(accuracy=5000, seed=8, exact=0,
+                                estimator="control")
+            strat.analyze_gamestate(self.flop)
+            low, high = strat.interval
+            assert low < strat.equity < high
+            assert abs((high - low) / 2 -
+                       1.96 * strat.variance ** 0.5) < 1e-3
+            results.append(strat.equity)
+        assert results[0] == results[1]
+        strat = BetStrategy(accuracy=5000, exact=0)
+        strat.analyze_gamestate(self.flop)
+        assert 0 < strat.variance < 1e-3
+        self.assertRaises(Exception, BetStrategy, estimator="median")
+        saved, strategy.estimators = strategy.estimators, None
+        try:
+            self.assertRaises(Exception, BetStrategy, estimator="qmc")
+            assert BetStrategy().estimator is None
+        finally:
+            strategy.estimators = saved
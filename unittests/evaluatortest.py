@@ -0,0 +1,73 @@
+import unittest
+import itertools
+from random import sample
+from handrank import *
+from handgen import *
+import evaluator
+
+
+class EvaluatorTest(unittest.TestCase):
+    """
+    Tests for the table-driven evaluator in evaluator.py.
+    """
+    def setUp(self):
+        self.iterations = 300
+
+    def test_main(self):
+        self.test_categories()
+        self.test_bestfive()
+        self.test_decode()
+        self.test_handcmp()
+
+    def test_categories(self):
+        """ Checks the evaluator against the hand generators
+        in handgen, each of which makes a hand of known rank.
+        """
+        for rank in range(10):
+            for x in range(10):
+                hand = generate_only(rank)
+                strength = evaluator.evaluate_cards(hand.cards)
+                assert evaluator.category(strength) >= rank
+
+    def test_bestfive(self):
+        """ The strength of 7 cards is the best strength over
+        their 5 card subsets.
+        """
+        for x in range(self.iterations):
+            cards = sample(range(52), 7)
+            best = max([evaluator.evaluate(list(five)) for five
+                        in itertools.combinations(cards, 5)])
+            assert evaluator.evaluate(cards) == best
+
+    def test_decode(self):
+        wheel = [Card("12c"), Card("0h"), Card("1h"), Card("2s"), 
+                 Card("3d"), Card("8d"), Card("10c")]
+        rank, kickers = evaluator.decode(evaluator.evaluate_cards(wheel))
+        assert rank == evaluator.STRAIGHT
+        assert kickers == [3, 2, 1, 0, -1]
+        royal = [Card(rank, 2) for rank in range(8, 13)]
+        assert (evaluator.category(evaluator.evaluate_cards(royal)) == 
+                evaluator.RSF)
+        trips = [Card("5c"), Card("5h"), Card("5s"), Card("11d"), 
+                 Card("9d"), Card("2c"), Card("0h")]
+        strength = evaluator.evaluate_cards(trips)
+        assert evaluator.decode(strength) == (evaluator.TRIPS, 
+                                              [5, 5, 5, 11, 9])
+        assert evaluator.encode(*evaluator.decode(strength)) == strength
+        assert evaluator.flush_suit([card.index for card in royal]) == 2
+        assert evaluator.flush_suit([card.index for card in trips]) == -1
+
+    def test_handcmp(self):
+        """ Unranked hands compare by strength and get kickers
+        consistent with it.
+        """
+        for x in range(self.iterations):
+            h1 = Hand(sample(CARDS, 7))
+            h2 = Hand(sample(CARDS, 7))
+            result = cmp(h1, h2)
+            assert result == cmp(evaluator.evaluate_cards(h1.cards),
+                                 evaluator.evaluate_cards(h2.cards))
+            assert len(h1.kickers) == 5
+            assert (result == 0) == ([k.rank for k in h1.kickers] == 
+                                     [k.rank for k in h2.kickers] and
+                                     h1.rank == h2.rank)
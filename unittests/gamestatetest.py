@@ -0,0 +1,96 @@
+import unittest
+import numpy
+from gamestate import *
+
+
+class GameStateTest(unittest.TestCase):
+    """
+    Tests for GameState simulation, scalar and vectorized.
+    """
+    def setUp(self):
+        self.pcards = [Card("12h"), Card("12s")]
+        self.board = [Card("3c"), Card("4d"), Card("9s")]
+
+    def test_main(self):
+        self.test_simulate_game()
+        self.test_deal_runouts()
+        self.test_simulate_games()
+        self.test_enumerate_outcomes()
+        self.test_splits()
+
+    def test_simulate_game(self):
+        """ simulate_game leaves the deck and board as it found
+        them.
+        """
+        gs = GameState(self.pcards, 3, self.board[:], 10, 1)
+        for x in range(200):
+            gs.simulate_game()
+            assert gs.board == self.board
+            assert len(gs.deck.cards) == 47
+            assert gs.deck.drawn == 0
+            assert gs.opcards == []
+        assert len(set(gs.deck.cards)) == 47
+
+    def test_deal_runouts(self):
+        gs = GameState(self.pcards, 3, self.board[:], 10, 1)
+        board, holes = gs.deal_runouts(1000, numpy.random.RandomState(0))
+        assert board.shape == (1000, 5)
+        assert len(holes) == 3
+        dealt = numpy.hstack([board] + holes)
+        known = [card.index for card in self.pcards + self.board]
+        for row in dealt:
+            assert len(set(row)) == 11
+            assert list(row[:3]) == known[2:]
+            assert not set(row[3:]) & set(known)
+
+    def test_simulate_games(self):
+        """ Pocket aces win about 85% heads up preflop, and the 
+        vectorized and scalar simulations agree.
+        """
+        gs = GameState(self.pcards, 1, [], 10, 1)
+        rng = numpy.random.RandomState(0)
+        wins = gs.simulate_games(200000, rng)
+        assert abs(wins / 200000.0 - 0.852) < 0.005
+        assert len(gs.deck.cards) == 50
+        gs = GameState(self.pcards, 2, self.board[:], 10, 1)
+        vectorized = gs.simulate_games(100000, rng) / 100000.0
+        scalar = sum([gs.simulate_game() for x in range(20000)]) / 20000.0
+        assert abs(vectorized - scalar) < 0.02
+
+    def test_enumerate_outcomes(self):
+        """ Enumeration visits enumeration_size runouts and agrees
+        with sampling.
+        """
+        rng = numpy.random.RandomState(0)
+        for opponents, board in [(0, self.board + [Card("10h")]),
+                                 (1, self.board + [Card("10h")]),
+                                 (2, self.board + [Card("10h"), Card("2c")])]:
+            gs = GameState(self.pcards, opponents, board, 10, 1)
+            wins, ties, runouts = gs.enumerate_outcomes()
+            assert runouts == gs.enumeration_size()
+            wins2, ties2 = gs.count_outcomes(100000, rng)
+            assert abs((wins + ties) / float(runouts) - 
+                       (wins2 + ties2) / 100000.0) < 0.01
+        gs = GameState(self.pcards, 3, self.board, 10, 1)
+        assert (gs.enumeration_size() ==
+                47 * 46 / 2 * 45 * 44 * 43 * 42 * 41 * 40 / 48)
+
+    def test_splits(self):
+        """ Split pots are counted by the number of hands sharing
+        them, and add up to the wins and ties of count_outcomes.
+        """
+        board = [Card("12c"), Card("11c"), Card("10c"), Card("9c"),
+                 Card("8c")]
+        gs = GameState([Card("2h"), Card("3d")], 3, board, 10, 1)
+        assert gs.simulate_split() == 4
+        assert gs.count_splits(1000) == [0, 0, 0, 1000]
+        gs = GameState(self.pcards, 2, self.board[:], 10, 1)
+        splits = gs.count_splits(100000, numpy.random.RandomState(1))
+        wins, ties = gs.count_outcomes(100000, numpy.random.RandomState(1))
+        assert splits[0] == wins and sum(splits[1:]) == ties
+        assert len(splits) == 3 and ties > 0
+        scalar = [0] * 4
+        for x in range(20000):
+            scalar[gs.simulate_split()] += 1
+        assert abs(scalar[1] / 20000.0 - splits[0] / 100000.0) < 0.02
+        assert scalar[0] + sum(scalar[1:]) == 20000
@@ -1,6 +1,6 @@
 import random
 from handrank import *
-from random import shuffle
+from random import randrange, shuffle
 
 __doc__ = \
 """
@@ -0,0 +1,102 @@
+import random
+import unittest
+import numpy
+import handrange
+from gamestate import *
+from handrange import *
+from equitycache import canonical_key
+
+
+class HandRangeTest(unittest.TestCase):
+    """
+    Tests for parsing and drawing from weighted hand ranges.
+    """
+    def test_main(self):
+        self.test_parse()
+        self.test_alias_table()
+        self.test_deal()
+        self.test_gamestate()
+        self.test_ranged_after_random()
+
+    def test_parse(self):
+        sizes = {"JJ+": 24, "AKs": 4, "AKo": 12, "AK": 16, "ATs+": 16,
+                 "KTo-K8o": 36, "88-JJ": 24, "AhKh": 1, "random": 1326,
+                 "JJ+, AKs, 50% AQo": 40, "AK, 0% AKo": 4}
+        for text, size in sizes.items():
+            assert len(HandRange(text)) == size
+        weighted = HandRange("JJ+, AKs, 50% AQo")
+        assert sum(weighted.weights) == 34
+        assert weighted.symmetric and not HandRange("AhKh, QQ").symmetric
+        for text in ("AKx", "AK-QJ", "AhAh", "JJ+-22", "0% AA"):
+            self.assertRaises(Exception, HandRange, text)
+        assert len(weighted.without([Card("12h"), Card("9c")])) == 30
+
+    def test_alias_table(self):
+        weights = [1, 2, 3, 0.5, 3.5]
+        probability, alias = alias_table(weights)
+        picks = [0.0] * 5
+        for i in range(5):
+            picks[i] += probability[i] / 5
+            picks[alias[i]] += (1 - probability[i]) / 5
+        for i in range(5):
+            assert abs(picks[i] - weights[i] / 10.0) < 1e-9
+
+    def test_deal(self):
+        """ Dealt hands avoid the used cards, by redraws or by the
+        exact fallback, and follow the weights.
+        """
+        rng = numpy.random.RandomState(4)
+        kings = HandRange("KK, 25% QQ")
+        used = numpy.zeros(40000, dtype=numpy.int64)
+        used[::2] = 1 << Card("11h").index
+        for redraws in (8, 0):
+            handrange.REDRAWS = redraws
+            hands = kings.deal(used, rng).astype(numpy.int64)
+            assert not ((used >> hands[:, 0]) & 1).any()
+            assert not ((used >> hands[:, 1]) & 1).any()
+            share = (hands[:, 0] // 4 == 11).mean()
+            # 6 KK to 1.5 QQ, or 3 KK to 1.5 QQ with the Kh gone
+            assert abs(share - (0.5 * 6 / 7.5 + 0.5 * 3 / 4.5)) < 0.02
+        handrange.REDRAWS = 8
+        used[:] = (1 << Card("11h").index) | (1 << Card("11s").index)
+        used[1] |= 1 << Card("11c").index
+        self.assertRaises(Exception, HandRange("KK").deal, used, rng)
+
+    def test_gamestate(self):
+        """ Scalar and vectorized play agree with ranged opponents,
+        and ranges go into the cache key.
+        """
+        ranges = ["QQ+, AKs", "50% KK, 22-55"]
+        gs = GameState([Card("12h"), Card("12s")], 2, 
+                       [Card("3c"), Card("4d"), Card("9s")], 10, 1, ranges)
+        random.seed(3)
+        scalar = sum([gs.simulate_game() for x in range(20000)]) / 20000.0
+        vectorized = gs.simulate_games(100000, 
+                                       numpy.random.RandomState(3)) / 1e5
+        assert abs(scalar - vectorized) < 0.02
+        assert len(gs.deck.cards) == 47
+        board, holes = gs.deal_runouts(1000, numpy.random.RandomState(3))
+        cards = numpy.sort(numpy.hstack([board] + holes), axis=1)
+        assert not (cards[:, 1:] == cards[:, :-1]).any()
+        assert (holes[0] // 4 >= 10).all()
+        plain = GameState([Card("12h"), Card("12s")], 2, 
+                          [Card("3c"), Card("4d"), Card("9s")], 10, 1)
+        other = GameState([Card("12c"), Card("12d")], 2, 
+                          [Card("3h"), Card("4s"), Card("9d")], 10, 1, ranges)
+        assert canonical_key(gs) != canonical_key(plain)
+        assert canonical_key(gs) == canonical_key(other)
+
+    def test_ranged_after_random(self):
+        """ A ranged seat after a random one still gets its hand:
+        ranged hands are dealt first in scalar play too, so it
+        agrees with vectorized play.
+        """
+        gs = GameState([Card("12h"), Card("12s")], 2,
+                       [Card("3c"), Card("4d"), Card("9s")], 10, 1,
+                       [None, "AcAd"])
+        random.seed(4)
+        scalar = sum([gs.simulate_game() for x in range(20000)]) / 20000.0
+        vectorized = gs.simulate_games(100000,
+                                       numpy.random.RandomState(4)) / 1e5
+        assert abs(scalar - vectorized) < 0.02
+        assert len(gs.deck.cards) == 47
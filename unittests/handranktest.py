@@ -1,5 +1,7 @@
 import unittest
+import random
 from handrank import *
+import evaluator
 from random import randrange, shuffle
 from handgen import *
 
@@ -28,43 +30,44 @@ class HandRankingTest(unittest.TestCase):
     to check the rank and kickers results from a HandTests function
     to ensure they are correct.
     """    
+    testclass = HandTests
     
     def setUp(self):
         self.iterations = 30 #Number of times each test repeats for new inputs
         self.testfuncs = []
-        self.testfuncs.append(HandTestFunctions(HandTests().flushtest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().flushtest, 
                                             generate_random_flush,
                                             generate_notflush,
                                             self.test_flushtest))
-        self.testfuncs.append(HandTestFunctions(HandTests().straighttest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().straighttest, 
                                             generate_random_straight,
                                             generate_notstraight,
                                             self.test_straighttest))
-        self.testfuncs.append(HandTestFunctions(HandTests().boattest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().boattest, 
                                             generate_random_boat,
                                             generate_notboat,
                                             self.test_boattest))
-        self.testfuncs.append(HandTestFunctions(HandTests().quadstest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().quadstest, 
                                             generate_random_quads,
                                             generate_notquads,
                                             self.test_quadstest))
-        self.testfuncs.append(HandTestFunctions(HandTests().tripstest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().tripstest, 
                                             generate_random_trips,
                                             generate_nottrips,
                                             self.test_tripstest))
-        self.testfuncs.append(HandTestFunctions(HandTests().twopairtest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().twopairtest, 
                                             generate_random_twopair,
                                             generate_nottwopair,
                                             self.test_twopairtest))
-        self.testfuncs.append(HandTestFunctions(HandTests().pairtest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().pairtest, 
                                             generate_random_pair,
                                             generate_notpair,
                                             self.test_pairtest))
-        self.testfuncs.append(HandTestFunctions(HandTests().rsftest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().rsftest, 
                                             generate_random_rsf,
                                             generate_notrsf,
                                             self.test_rsftest))
-        self.testfuncs.append(HandTestFunctions(HandTests().sftest, 
+        self.testfuncs.append(HandTestFunctions(self.testclass().sftest, 
                                             generate_random_sf,
                                             generate_notsf,
                                             self.test_sftest))
@@ -169,6 +172,79 @@ class HandRankingTest(unittest.TestCase):
             testfunctions.resulttest(passhand, nopasshand, rank1, kickers1, 
                                      rank2, kickers2)
 
+class BitHandRankingTest(HandRankingTest):
+    """
+    Runs HandRankingTest against the bitboard tests in 
+    BitHandTests.
+    """
+    testclass = BitHandTests
+
+
+class CardTest(unittest.TestCase):
+    """
+    Tests for the interned Card registry and Deck construction.
+    """
+    def test_main(self):
+        self.test_interned()
+        self.test_equality()
+        self.test_deck()
+        self.test_draw_rollback()
+
+    def test_interned(self):
+        assert Card(10, 2) is Card("10s")
+        assert Card("10s") is Card("10s")
+        assert Card(-1, 3) is Card(-1, 3)
+        for index, card in enumerate(CARDS):
+            assert card.index == index
+            assert Card(card.rank, card.suit) is card
+
+    def test_equality(self):
+        assert Card(4, 0) != Card(4, 1)
+        assert cmp(Card(4, 0), Card(4, 1)) == 0
+        assert Card(4, 0) < Card(5, 3)
+        assert len(set(CARDS)) == 52
+
+    def test_deck(self):
+        deck = Deck()
+        assert len(deck.cards) == 52
+        deck.cards.remove(Card(4, 1))
+        assert Card(4, 1) not in deck.cards
+        assert Card(4, 0) in deck.cards
+        deck = Deck([Card(4, 1), Card("12s")])
+        assert len(deck.cards) == 50
+        assert Card(12, 2) not in deck.cards
+
+    def test_draw_rollback(self):
+        """ Draws never repeat a card, drawing from an empty deck
+        raises, and rollback puts back exactly the cards drawn since
+        its mark.
+        """
+        deck = Deck([Card("12s")])
+        start = deck.mark()
+        drawn = [deck.draw() for x in range(10)]
+        middle = deck.mark()
+        later = [deck.draw() for x in range(20)]
+        if Card("0c") in deck.remaining():
+            later.append(deck.take(Card("0c")))
+        assert len(set(drawn + later)) == len(drawn + later)
+        assert len(deck) == 51 - len(drawn + later)
+        deck.rollback(middle)
+        assert set(deck.remaining()) == set(CARDS) - set(drawn + [Card("12s")])
+        self.assertRaises(Exception, deck.take, drawn[0])
+        deck.rollback(start)
+        assert set(deck.remaining()) == set(Deck([Card("12s")]).cards)
+        for x in range(10000):
+            mark = deck.mark()
+            deck.draw(); deck.draw(); deck.draw()
+            deck.rollback(mark)
+        assert set(deck.remaining()) == set(CARDS) - set([Card("12s")])
+        deck = Deck()
+        drawn = [deck.draw() for x in range(52)]
+        assert len(set(drawn)) == 52 and len(deck) == 0
+        self.assertRaises(Exception, deck.draw)
+        assert len(deck) == 0
+
+
 class HandCompareTest(unittest.TestCase):
     """
     Tests for the cmp functionality in Hand.
@@ -186,6 +262,7 @@ class HandCompareTest(unittest.TestCase):
         self.test_equalhands(ranked=0)
         self.test_equalhands(ranked=1)
         self.test_equalhands(ranked=2)
+        self.test_showdown()
 #        
     def test_unequal_unranked(self):
         """ Tests a hand compare between two hands, both
@@ -272,26 +349,69 @@ class HandCompareTest(unittest.TestCase):
                     break
             else:
                 assert h1 == h2
-    
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
-         
\ No newline at end of file
+
+    def test_showdown(self):
+        """ showdown picks the hands that no other beats, so a
+        split pot is reported whole, whatever the order.
+        """
+        for x in range(self.precision):
+            hands = [generate_only(randrange(0, 10)) for y in range(6)]
+            hands.append(Hand(hands[randrange(0, 6)].cards[::-1]))
+            shuffle(hands)
+            winners = showdown(hands)
+            for number, hand in enumerate(hands):
+                beaten = [other for other in hands if other > hand]
+                assert (number in winners) == (not beaten)
+            assert len(winners) >= 2 or winners[0] == hands.index(
+                max(hands))
+        board = [Card(card) for card in ("12c", "12d", "12s", "5h", "5c")]
+        hands = [Hand([Card("2h"), Card("3d")] + board),
+                 Hand([Card("4h"), Card("3c")] + board),
+                 Hand([Card("12h"), Card("3s")] + board)]
+        assert showdown(hands) == [2]
+        assert showdown(hands[:2]) == [0, 1]
+
+
+class LazyBitHandCompareTest(HandCompareTest):
+    """
+    Runs HandCompareTest with hands ranked lazily through the
+    BitHandTests stack.
+    """
+    def setUp(self):
+        HandCompareTest.setUp(self)
+        Hand.lazy = 1
+        Hand.testclass = BitHandTests
+
+    def tearDown(self):
+        Hand.lazy = 0
+        Hand.testclass = None
+
+
+class LazyHandCompareTest(HandCompareTest):
+    """
+    Runs HandCompareTest with hands ranked lazily through the
+    shared ranking tests, and checks those against the evaluator.
+    """
+    def setUp(self):
+        HandCompareTest.setUp(self)
+        Hand.lazy = 1
+
+    def tearDown(self):
+        Hand.lazy = 0
+
+    def test_main(self):
+        HandCompareTest.test_main(self)
+        self.test_matches_evaluator()
+
+    def test_matches_evaluator(self):
+        """ The first test a hand passes gives the evaluator's
+        rank and kickers, whatever ran on other hands before.
+        """
+        for x in range(2000):
+            hand = Hand(random.sample(CARDS, 7))
+            while True:
+                passed, rank, kickers = hand.run_next_test()
+                if passed: break
+            strength = evaluator.evaluate_cards(hand.cards)
+            assert (rank, [card.rank for card in kickers]) == \
+                evaluator.decode(strength)
@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+from gamestate import *
+from strategy import *
+import preflop
+
+
+class PreflopTest(unittest.TestCase):
+    """
+    Tests for the preflop equity table and its builder.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "preflop.bin")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_main(self):
+        self.test_classes()
+        self.test_lookup()
+        self.test_build_resume()
+
+    def test_classes(self):
+        classes = set()
+        for first in CARDS:
+            for second in CARDS:
+                if first is not second:
+                    handclass = preflop.hand_class([first, second])
+                    classes.add(handclass)
+                    cards = preflop.class_cards(handclass)
+                    assert preflop.hand_class(cards) == handclass
+                    assert preflop.hand_class([second, first]) == handclass
+        assert classes == set(range(preflop.CLASSES))
+
+    def test_lookup(self):
+        equities = [cell / 10000.0 for cell in range(preflop.CLASSES * 
+                                                     preflop.MAXOPPONENTS)]
+        preflop.write_table(self.path, equities, 5000)
+        table = preflop.PreflopTable(self.path)
+        pcards = [Card("12h"), Card("11h")]
+        cell = preflop.cell(preflop.hand_class(pcards), 3)
+        assert abs(table.lookup(pcards, 3) - cell / 10000.0) < 1e-6
+        assert table.lookup(pcards, 10) is None
+        strat = BetStrategy(accuracy=1000, preflop_table=table)
+        strat.analyze_gamestate(GameState(pcards, 3, [], 10, 1))
+        assert strat.games == 5000
+        assert abs(strat.recommended_bet - cell / 1000.0) < 1e-5
+        strat.analyze_gamestate(GameState(pcards, 3, [Card("0c"), Card("1c"),
+                                                      Card("2d")], 10, 1))
+        assert strat.games == 1000
+        table.close()
+
+    def test_build_resume(self):
+        preflop.build_shard(self.path, 0, 500, 2000)
+        progress = self.path + ".shard0of500"
+        lines = open(progress).readlines()
+        assert len(lines) == 4
+        open(progress, "w").writelines(lines[:2] + [lines[2][:3]])
+        preflop.build_shard(self.path, 0, 500, 2000)
+        assert open(progress).readlines()[:2] == lines[:2]
+        assert len(preflop._read_progress(progress)) == 4
+        self.assertRaises(Exception, preflop.merge, self.path, 500)
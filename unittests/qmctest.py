@@ -0,0 +1,52 @@
+import unittest
+import numpy
+from qmc import *
+from gamestate import *
+
+
+class QMCTest(unittest.TestCase):
+    """
+    Tests for the scrambled Sobol' points.
+    """
+    def test_main(self):
+        self.test_stratified()
+        self.test_batches()
+        self.test_deal()
+
+    def test_stratified(self):
+        """ Scrambled or not, each coordinate of the first 2**k
+        points falls once in each of 2**k equal intervals.
+        """
+        points = SobolSequence(MAXDIMENSIONS,
+                               numpy.random.RandomState(0)).points(0, 1024)
+        for dimension in range(MAXDIMENSIONS):
+            cells = sorted((points[:, dimension] * 1024).astype(int))
+            assert cells == range(1024)
+        first = [direction_numbers(dimension)[0] 
+                 for dimension in range(MAXDIMENSIONS)]
+        assert first == [1 << (BITS - 1)] * MAXDIMENSIONS
+
+    def test_batches(self):
+        sequence = SobolSequence(5, numpy.random.RandomState(1))
+        whole = sequence.points(0, 1000)
+        parts = numpy.vstack((sequence.points(0, 300),
+                              sequence.points(300, 700)))
+        assert (whole == parts).all()
+        other = SobolSequence(5, numpy.random.RandomState(2)).points(0, 1000)
+        assert not (whole == other).all()
+
+    def test_deal(self):
+        """ Runouts dealt from the points use every card left
+        equally often, and no card twice.
+        """
+        gs = GameState([Card("12h"), Card("12s")], 1, [Card("3c")], 10, 1)
+        sequence = SobolSequence(6, numpy.random.RandomState(3))
+        board, holes = gs.deal_runouts(4096, None,
+                                       points=sequence.points(0, 4096))
+        cards = numpy.hstack([board] + holes)
+        for row in cards[:200]:
+            assert len(set(row)) == 7
+        counts = numpy.bincount(cards[:, 1:].ravel(), minlength=52)
+        left = [card.index for card in gs.deck.remaining()]
+        assert counts[left].min() > 0.8 * counts[left].mean()
+        assert counts.sum() == counts[left].sum()
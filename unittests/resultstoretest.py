@@ -0,0 +1,115 @@
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import multiprocessing
+from gamestate import *
+from strategy import *
+from resultstore import *
+
+
+def _write_results(task):
+    path, writer = task
+    store = ResultStore(path)
+    for x in range(50):
+        store.put("key%d" % x, writer, 100 + writer)
+    store.close()
+
+
+class ResultStoreTest(unittest.TestCase):
+    """
+    Tests for the persistent result store.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "results.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_main(self):
+        self.test_upgrade()
+        self.test_eviction()
+        self.test_reads_dont_write()
+        self.test_processes()
+        self.test_strategy_store()
+
+    def test_upgrade(self):
+        """ A result is only replaced by one with more games. """
+        store = ResultStore(self.path)
+        assert store.get("a") is None
+        assert store.put("a", 60, 100)
+        assert store.put("a", 500, 1000)
+        assert store.get("a") == (500, 1000, 0)
+        assert not store.put("a", 30, 50)
+        assert store.put("a", 7, 10, 1)
+        assert not store.put("a", 9000, 10000)
+        assert store.get("a") == (7, 10, 1)
+        store.close()
+        assert ResultStore(self.path).get("a") == (7, 10, 1)
+
+    def test_eviction(self):
+        store = ResultStore(self.path, maxbytes=64 * 1024)
+        for x in range(5000):
+            store.put("eviction key %d" % x, x, 1000)
+        assert store.evictions > 0
+        assert store.size() <= 64 * 1024
+        assert os.path.getsize(self.path) <= 2 * 64 * 1024
+        assert store.get("eviction key 4999") == (4999, 1000, 0)
+        assert store.get("eviction key 0") is None
+        store.close()
+
+    def test_reads_dont_write(self):
+        """ Lookups work while another process holds the write lock,
+        and their use times are written with the next write.
+        """
+        store = ResultStore(self.path)
+        store.put("a", 1, 10)
+        store.put("b", 2, 10)
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        writer.execute("BEGIN IMMEDIATE")
+        start = time.time()
+        assert store.get("a") == (1, 10, 0)
+        assert time.time() - start < 1
+        writer.execute("ROLLBACK")
+        writer.close()
+        store.put("c", 3, 10)
+        used = dict(store._db.execute("SELECT key, used FROM results"))
+        assert used["a"] > used["b"]
+        store.close()
+
+    def test_processes(self):
+        """ Concurrent writers from several processes all land. """
+        pool = multiprocessing.Pool(3)
+        pool.map(_write_results, [(self.path, writer) 
+                                  for writer in range(3)])
+        pool.close()
+        pool.join()
+        store = ResultStore(self.path)
+        assert store.get("key49") == (2, 102, 0)
+
+    def test_strategy_store(self):
+        gs = GameState([Card("12h"), Card("12s")], 2, 
+                       [Card("3c"), Card("4d"), Card("9s")], 100, 1)
+        store = ResultStore(self.path)
+        strat = BetStrategy(accuracy=2000, store=store)
+        strat.analyze_gamestate(gs)
+        equity, games = strat.equity, strat.games
+        strat = BetStrategy(accuracy=1000, store=ResultStore(self.path))
+        strat.analyze_gamestate(GameState([Card("12d"), Card("12c")], 2, 
+                                          [Card("3s"), Card("4h"), 
+                                           Card("9c")], 100, 1))
+        assert (strat.equity, strat.games) == (equity, games)
+        assert strat.store.hits == 1
+        strat = BetStrategy(accuracy=4000, store=store)
+        strat.analyze_gamestate(gs)
+        assert strat.games == 4000
+        assert store.get(store_key(gs))[1] == 4000
+        hits, writes = store.hits, store.writes
+        strat = BetStrategy(accuracy=8000, exact=0, estimator="control",
+                            store=store)
+        strat.analyze_gamestate(gs)
+        assert (store.hits, store.writes) == (hits, writes)
+        assert store.get(store_key(gs))[1] == 4000
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import threading
+import unittest
+import numpy
+from gamestate import *
+from server import *
+
+
+class ServerTest(unittest.TestCase):
+    """
+    Tests for the equity server.
+    """
+    def test_main(self):
+        self.test_engine()
+        self.test_unix_socket()
+        self.test_tcp()
+
+    def test_engine(self):
+        """ Queries arriving together are answered in one batch,
+        repeated game states once; large simulations are split into
+        batches, and an engine that can't start says so.
+        """
+        engine = EquityEngine(dict(accuracy=2000, preflop_table=0),
+                              batch_wait=0.2)
+        engine.start()
+        engine.ready.wait()
+        board = [Card("2h"), Card("7h"), Card("9c")]
+        states = [GameState([Card("12h"), Card("11h")], 2, board[:], 100, 1),
+                  GameState([Card("12s"), Card("11s")], 2,
+                            [Card("2s"), Card("7s"), Card("9c")], 10, 1),
+                  GameState([Card("3c"), Card("3d")], 1, [], 10, 1),
+                  GameState([Card("3c"), Card("3d")], 1, board[:], 10, 1,
+                            ["JJ+"])]
+        queries = [None] * len(states)
+        def ask(number):
+            queries[number] = engine.submit(number, states[number])
+        threads = [threading.Thread(target=ask, args=(number,))
+                   for number in range(len(states))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert engine.batches == 1 and engine.queries == 4
+        assert engine.strategy.cache.misses == 3
+        for query in queries:
+            equity, low, high, games, bet = query.result
+            assert low <= equity <= high and games == 2000
+            assert abs(bet - equity * query.gs.pot) < 1e-9
+        assert queries[0].result[0] == queries[1].result[0]
+        assert 0.5 < queries[0].result[0] < 0.7
+        assert queries[3].result[0] < 0.2
+        engine.submit(0, states[0])
+        assert engine.strategy.cache.hits == 1
+        broken = EquityEngine(dict(estimator="median"))
+        self.assertRaises(Exception, make_server, tempfile.mktemp(), broken)
+        assert broken.ready.is_set() and broken.error is not None
+        stopped = broken.submit(0, states[0])
+        assert stopped.result is None and "stopped" in stopped.error
+        many = BATCHSIZE + 1000
+        counts = count_outcomes_together(states[:2], many,
+                                          numpy.random.RandomState(1))
+        for wins, ties in counts:
+            assert 0.5 < (wins + ties) / float(many) < 0.7
+
+    def test_unix_socket(self):
+        path = tempfile.mktemp(suffix=".sock")
+        server = make_server(path, EquityEngine(dict(accuracy=1000)))
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            replies = query(path, [
+                {"pcards": ["12h", "11h"], "opponents": 1, "board":
+                 ["2h", "7h", "9c"], "pot": 100, "minbet": 1, "id": "a"},
+                {"pcards": ["12h", "12h"], "opponents": 1, "pot": 1,
+                 "minbet": 1, "id": "b"},
+                {"pcards": ["12h", "11h"], "opponents": 1, "board":
+                 ["2h", "7h", "9c", "3d", "4s"], "pot": 100, "minbet": 1}])
+            assert replies[0]["id"] == "a" and replies[0]["games"] == 1000
+            assert replies[1]["id"] == "b" and "error" in replies[1]
+            assert replies[2]["id"] is None and replies[2]["games"] == 990
+        finally:
+            server.shutdown()
+            server.server_close()
+            os.remove(path)
+
+    def test_tcp(self):
+        server = make_server(("127.0.0.1", 0), EquityEngine())
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            replies = query(server.server_address, [
+                {"pcards": ["5d", "5s"], "opponents": 3, "board": 
+                 ["12c", "3h", "9d", "10s"], "pot": 10, "minbet": 1}])
+            assert 0 < replies[0]["equity"] < 1
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+from gamestate import *
+from strategy import *
+from equitycache import EquityCache
+from simstats import *
+
+
+class SimulationStatsTest(unittest.TestCase):
+    """
+    Tests for the opt-in analysis counters and timers.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.flop = GameState([Card("12h"), Card("11h")], 3,
+                              [Card("2c"), Card("7d"), Card("9s")], 100, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_main(self):
+        self.test_sources()
+        self.test_phases()
+        self.test_hands()
+        self.test_dump()
+
+    def test_sources(self):
+        stats = SimulationStats()
+        strat = BetStrategy(accuracy=2000, cache=EquityCache(), stats=stats,
+                            exact=0)
+        strat.analyze_gamestate(self.flop)
+        strat.analyze_gamestate(self.flop)
+        river = GameState([Card("12h"), Card("11h")], 1,
+                          [Card("2c"), Card("7d"), Card("9s"), Card("3c"),
+                           Card("4c")], 100, 1)
+        BetStrategy(accuracy=1000, stats=stats).analyze_gamestate(river)
+        assert stats.analyses == 3 and stats.cache_misses == 1
+        assert stats.answers == {"cache": 1, "store": 0, "preflop": 0,
+                                 "exact": 1, "simulated": 1}
+        assert stats.trials == 2000 and stats.trials_per_second() > 0
+        strat = BetStrategy(accuracy=2000)
+        strat.analyze_gamestate(self.flop)
+        assert strat.stats is None
+
+    def test_phases(self):
+        """ Scalar trials are timed in every phase, vectorized ones
+        in dealing and ranking, and the phases fit in the total.
+        """
+        stats = SimulationStats()
+        BetStrategy(accuracy=3000, vectorized=0, exact=0,
+                    stats=stats).analyze_gamestate(self.flop)
+        assert min(stats.seconds.values()) > 0
+        assert sum(stats.seconds.values()) <= stats.elapsed
+        stats.reset()
+        strat = BetStrategy(accuracy=3000, vectorized=1, exact=0,
+                            stats=stats)
+        strat.analyze_gamestate(self.flop)
+        assert stats.seconds["draw"] > 0 and stats.seconds["rank"] > 0
+        assert stats.seconds["build"] == stats.seconds["reset"] == 0
+        assert 0.18 < strat.equity < 0.29
+
+    def test_hands(self):
+        stats = SimulationStats()
+        stats.watch_hands()
+        Hand.lazy = 1
+        try:
+            cmp(Hand([Card(c) for c in ("12h", "12s", "3c", "5d", "9h")]),
+                Hand([Card(c) for c in ("2h", "3h", "4h", "5h", "6h")]))
+        finally:
+            Hand.lazy = 0
+            stats.watch_hands(0)
+        assert stats.comparisons == 1 and stats.tests == 4
+        cmp(Hand([Card("2h")]), Hand([Card("3h")]))
+        assert stats.comparisons == 1
+
+    def test_dump(self):
+        stats = SimulationStats()
+        BetStrategy(accuracy=1000, exact=0,
+                    stats=stats).analyze_gamestate(self.flop)
+        path = os.path.join(self.dir, "stats.prom")
+        stats.dump(path)
+        lines = open(path).read().splitlines()
+        assert "poker_trials_total 1000" in lines
+        assert 'poker_analyses_total{source="simulated"} 1' in lines
+        for line in lines:
+            assert line.startswith("# ") or line.startswith("poker_")
+        stats.dump(path, "text")
+        assert open(path).read() == stats.text()
+        self.assertRaises(Exception, stats.dump, path, "xml")
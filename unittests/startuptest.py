@@ -0,0 +1,97 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+import numpy
+import batchrank
+import preflop
+from lazyimport import lazy_import, LazyModule
+
+PACKAGE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds the imports main.py makes may take in a fresh process.
+BUDGET = 0.25
+# Modules a preflop table lookup must not load.
+HEAVY = ["numpy", "batchrank", "estimators", "multiprocessing"]
+# Imports main.py's modules, answers a preflop spot from the table
+# at argv[1], and prints the import time and the heavy modules
+# loaded.
+_SCRIPT = """
+import sys
+import time
+start = time.time()
+from gamestate import GameState
+from strategy import *
+from handrank import *
+elapsed = time.time() - start
+strat = BetStrategy(accuracy=1000, preflop_table=preflop.PreflopTable(
+    sys.argv[1]))
+strat.analyze_gamestate(GameState([Card("12h"), Card("11h")], 3, [], 10, 1))
+print elapsed, strat.games
+print " ".join([name for name in %r if name in sys.modules])
+""" % HEAVY
+
+
+class StartupTest(unittest.TestCase):
+    """
+    Tests for the cold start cost of the command line path.
+    """
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_main(self):
+        self.test_lazy_import()
+        self.test_budget()
+        self.test_table_file()
+
+    def test_lazy_import(self):
+        assert lazy_import("no_such_module_here") is None
+        assert lazy_import("numpy") is numpy
+        lazy = LazyModule("colorsys")
+        assert lazy.hls_to_rgb(0, 1, 0) == (1, 1, 1)
+
+    def test_budget(self):
+        """ The imports main.py makes fit in BUDGET, and a preflop
+        table answer loads none of the HEAVY modules.
+        """
+        path = os.path.join(self.dir, "preflop.bin")
+        preflop.write_table(path, [0.5] * (preflop.CLASSES *
+                                           preflop.MAXOPPONENTS), 5000)
+        process = subprocess.Popen([sys.executable, "-c", _SCRIPT, path],
+                                   cwd=PACKAGE, stdout=subprocess.PIPE)
+        output = process.communicate()[0].split("\n")
+        assert process.returncode == 0
+        elapsed, games = output[0].split()
+        assert float(elapsed) < BUDGET, elapsed
+        assert games == "5000"
+        assert output[1] == "", output[1]
+
+    def test_table_file(self):
+        """ The batchrank tables round trip through a table file, and
+        a file that is cut short, of another layout or built from
+        another evaluator is ignored.
+        """
+        path = os.path.join(self.dir, "batchrank.bin")
+        saved = batchrank.TABLE_PATH
+        batchrank.TABLE_PATH = path
+        try:
+            tables = batchrank.load_tables()
+        finally:
+            batchrank.TABLE_PATH = saved
+        assert os.path.exists(path)
+        batchrank.write_tables(path, tables)
+        for mapped, table in zip(batchrank.map_tables(path), tables):
+            assert (mapped == table).all()
+            assert not mapped.flags.writeable
+        data = open(path, "rb").read()
+        open(path, "wb").write(data[:-1])
+        assert batchrank.map_tables(path) is None
+        open(path, "wb").write("XXXX" + data[4:])
+        assert batchrank.map_tables(path) is None
+        open(path, "wb").write(data[:8] + "X" * 20 + data[28:])
+        assert batchrank.map_tables(path) is None
+        assert batchrank.map_tables(path + ".missing") is None
@@ -0,0 +1,111 @@
+import unittest
+from gamestate import *
+from strategy import *
+
+
+class BetStrategyTest(unittest.TestCase):
+    """
+    Tests for BetStrategy's simulation modes.
+    """
+    def setUp(self):
+        self.gs = GameState([Card("12h"), Card("12s")], 2, 
+                            [Card("3c"), Card("4d"), Card("9s")], 100, 1)
+
+    def test_main(self):
+        self.test_seeded_workers()
+        self.test_exact()
+        self.test_target()
+        self.test_estimates()
+
+    def test_seeded_workers(self):
+        """ A seeded result doesn't depend on the worker count,
+        vectorized or not.
+        """
+        for vectorized, games in [(1, 3 * CHUNKSIZE), (0, 2 * CHUNKSIZE)]:
+            bets = []
+            for workers in (1, 2, 3):
+                strat = BetStrategy(accuracy=games, vectorized=vectorized,
+                                    workers=workers, seed=11)
+                strat.analyze_gamestate(self.gs)
+                strat.close()
+                bets.append(strat.recommended_bet)
+            assert bets[0] == bets[1] == bets[2]
+            assert 60 < bets[0] < 80
+
+    def test_exact(self):
+        """ Heads-up on the river there are fewer runouts than
+        games asked for, so the result is exact and repeatable.
+        Runouts that can't be dealt, or that need too large a
+        table of opponent hands, are never enumerated.
+        """
+        gs = GameState([Card("12h"), Card("12s")], 1, 
+                       [Card("3c"), Card("4d"), Card("9s"), Card("10h"), 
+                        Card("2c")], 100, 1)
+        strat = BetStrategy(accuracy=1000)
+        strat.analyze_gamestate(gs)
+        assert strat.enumerated
+        bet = strat.recommended_bet
+        strat.analyze_gamestate(gs)
+        assert strat.recommended_bet == bet
+        strat = BetStrategy(accuracy=500)
+        strat.analyze_gamestate(gs)
+        assert not strat.enumerated
+        gs.opponents = 3
+        assert not BetStrategy().use_exact(2 * 10 ** 8, gs)
+        self.assertRaises(Exception, gs.enumerate_outcomes)
+        self.assertRaises(Exception, BetStrategy(exact=1).analyze_gamestate,
+                          gs)
+        gs.opponents = 24
+        assert gs.enumeration_size() == 0
+        assert not BetStrategy().use_exact(10 ** 9, gs)
+        self.assertRaises(Exception, gs.enumerate_outcomes)
+
+    def test_target(self):
+        """ Simulation stops once the interval is narrow enough,
+        sooner for a lopsided spot, at the same point for any 
+        number of workers.
+        """
+        results = []
+        for workers in (1, 2):
+            strat = BetStrategy(accuracy=10 ** 6, target=0.01, seed=5,
+                                workers=workers)
+            strat.analyze_gamestate(self.gs)
+            strat.close()
+            low, high = strat.interval
+            assert (high - low) / 2 <= 0.01
+            assert low <= strat.equity <= high
+            assert strat.games < 10 ** 6
+            results.append((strat.equity, strat.games))
+        assert results[0] == results[1]
+        lock = GameState([Card("12h"), Card("12s")], 1, 
+                         [Card("12c"), Card("12d"), Card("9s")], 100, 1)
+        strat = BetStrategy(accuracy=10 ** 6, target=0.01, seed=5)
+        strat.analyze_gamestate(lock)
+        assert strat.games < results[0][1]
+
+    def test_estimates(self):
+        """ Running estimates come a chunk at a time, can be
+        abandoned early, and stop at a target where analyze_gamestate
+        does.
+        """
+        strat = BetStrategy(accuracy=5 * 4096, seed=3, preflop_table=0)
+        snapshots = list(strat.estimates(self.gs, 4096))
+        assert [games for games, w, t, e, i in snapshots] == [
+            4096, 8192, 12288, 16384, 20480]
+        for games, wins, ties, equity, (low, high) in snapshots:
+            assert equity == float(wins + ties) / games
+            assert low <= equity <= high
+        widths = [high - low for g, w, t, e, (low, high) in snapshots]
+        assert widths == sorted(widths, reverse=True)
+        assert strat.games == 20480 and strat.equity == snapshots[-1][3]
+        first = strat.estimates(self.gs, 4096).next()
+        assert first == snapshots[0] and strat.games == 4096
+        strat = BetStrategy(accuracy=10 ** 6, target=0.01, seed=5)
+        snapshots = list(strat.estimates(self.gs, TARGET_CHUNKSIZE))
+        strat.analyze_gamestate(self.gs)
+        assert snapshots[-1][0] == strat.games
+        river = GameState([Card("12h"), Card("11h")], 1,
+                          [Card("2c"), Card("7d"), Card("9s"), Card("3c"),
+                           Card("4c")], 100, 1)
+        snapshots = list(BetStrategy(accuracy=1000).estimates(river))
+        assert len(snapshots) == 1 and snapshots[0][0] == 990
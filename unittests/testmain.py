@@ -1,12 +1,50 @@
 import unittest
 import testpyimage
 import handranktest
+import evaluatortest
+import batchranktest
+import gamestatetest
+import strategytest
+import equitycachetest
+import prefloptest
+import resultstoretest
+import handrangetest
+import boardcachetest
+import estimatorstest
+import qmctest
+import batchtest
+import servertest
+import startuptest
+import analyzertest
+import benchmarktest
+import simstatstest
 from handrank import *
 from handgen import *
 
 suite = unittest.TestSuite()
 suite.addTest(handranktest.HandRankingTest("test_main"))
 suite.addTest(handranktest.HandCompareTest("test_main"))
+suite.addTest(handranktest.CardTest("test_main"))
+suite.addTest(handranktest.BitHandRankingTest("test_main"))
+suite.addTest(handranktest.LazyBitHandCompareTest("test_main"))
+suite.addTest(handranktest.LazyHandCompareTest("test_main"))
+suite.addTest(evaluatortest.EvaluatorTest("test_main"))
+suite.addTest(batchranktest.BatchRankTest("test_main"))
+suite.addTest(gamestatetest.GameStateTest("test_main"))
+suite.addTest(strategytest.BetStrategyTest("test_main"))
+suite.addTest(equitycachetest.EquityCacheTest("test_main"))
+suite.addTest(prefloptest.PreflopTest("test_main"))
+suite.addTest(resultstoretest.ResultStoreTest("test_main"))
+suite.addTest(handrangetest.HandRangeTest("test_main"))
+suite.addTest(boardcachetest.BoardCacheTest("test_main"))
+suite.addTest(estimatorstest.EstimatorsTest("test_main"))
+suite.addTest(qmctest.QMCTest("test_main"))
+suite.addTest(batchtest.BatchTest("test_main"))
+suite.addTest(servertest.ServerTest("test_main"))
+suite.addTest(startuptest.StartupTest("test_main"))
+suite.addTest(analyzertest.AnalyzerTest("test_main"))
+suite.addTest(benchmarktest.BenchmarkTest("test_main"))
+suite.addTest(simstatstest.SimulationStatsTest("test_main"))
 #suite.addTest(testpyimage.PyImageTest("testmain"))
 runner = unittest.TextTestRunner()
 runner.run(suite)